@@ -2,9 +2,11 @@
 # Code is using Python 3
 
 import sys
-import json
 import datetime
 import random
+import itertools
+import concurrent.futures
+import numpy as np
 import modules.unf_utils as unfutils
 
 LATTICE_SQUARE = "square"
@@ -21,10 +23,11 @@ CADNANO_PREV_BID = 1
 CADNANO_NEXT_VID = 2
 CADNANO_NEXT_BID = 3
 
-globalIdGenerator = 0
-
 # Strand part corresponds to a number of nucleotides being located at a particular location in a strand
 class StrandPart:
+    __slots__ = ("globalId", "vhelixId", "baseId", "prevVid", "prevBid", "nextVid", "nextBid", "nuclToRepresent",
+     "insertedNuclIds", "prevPart", "nextPart", "prevPartPos", "nextPartPos", "arrPos")
+
     def __init__(self, globalId, vhelixId, baseId, prevVid, prevBid, nextVid, nextBid, nuclToRepresent, insIds):
         self.globalId = globalId
         self.vhelixId = vhelixId
@@ -73,6 +76,47 @@ class StrandPart:
         else:
             return "n"
 
+# Struct-of-arrays storage of the strand parts of one strand type (scaffold/staple).
+# Rows are appended per virtual helix and the StrandPart objects are created at the end.
+class StrandPartTable:
+    def __init__(self):
+        self.chunks = []
+
+    # Appends rows for the valid records of one virtual helix, assigning
+    # the IDs (including the inserted nucleotides' IDs) as one contiguous block
+    def append_vhelix_records(self, vhelixId, records, nuclToRepr, validMask, idGenerator):
+        baseIds = np.flatnonzero(validMask)
+        if len(baseIds) == 0:
+            return
+        partNuclToRepr = nuclToRepr[baseIds]
+        idsPerPart = np.maximum(partNuclToRepr, 1)
+        firstId = idGenerator.reserve_block(int(idsPerPart.sum()))
+        globalIds = firstId + np.cumsum(idsPerPart) - idsPerPart
+        vhelixIds = np.full(len(baseIds), vhelixId, dtype=np.int64)
+        self.chunks.append((globalIds, vhelixIds, baseIds, records[baseIds], partNuclToRepr))
+
+    def to_strand_parts(self):
+        if len(self.chunks) == 0:
+            return []
+        globalIds, vhelixIds, baseIds, records, nuclToRepr = (np.concatenate(column).tolist() for column in zip(*self.chunks))
+        return [StrandPart(gId, vId, bId, rec[CADNANO_PREV_VID], rec[CADNANO_PREV_BID], rec[CADNANO_NEXT_VID],
+         rec[CADNANO_NEXT_BID], ntr, list(range(gId + 1, gId + ntr)))
+         for gId, vId, bId, rec, ntr in zip(globalIds, vhelixIds, baseIds, records, nuclToRepr)]
+
+# Loads the strand arrays of a cadnano vstrand as (n, 4) integer arrays
+# and computes the number of nucleotides represented by each cell
+def load_vstrand_arrays(vstr):
+    scaf = np.asarray(vstr['scaf'], dtype=np.int64).reshape(-1, 4)
+    stap = np.asarray(vstr['stap'], dtype=np.int64).reshape(-1, 4)
+    cellsCount = max(len(scaf), len(stap))
+    skip = np.asarray(vstr['skip'][:cellsCount], dtype=np.int64)
+    loop = np.asarray(vstr['loop'][:cellsCount], dtype=np.int64)
+    nuclToRepr = np.where(skip < 0, skip, np.where(loop > 0, loop + 1, 1))
+    return (scaf, stap, nuclToRepr)
+
+def get_valid_records_mask(records):
+    return (records[:, CADNANO_PREV_VID] >= 0) | (records[:, CADNANO_NEXT_VID] >= 0)
+
 class Vhelix:
     def __init__(self, id, row, col, latticeType, firstActiveCell, lastActiveCell, lastCell, stapColors):
         self.id = id
@@ -89,326 +133,449 @@ class Vhelix:
          "] fac " + str(self.firstActiveCell) + ", lac " + 
          str(self.lastActiveCell) + ", lc " + str(self.lastCell))
 
+# Collects the parts following the start part until the 3' end is reached
+# or the strand returns to an already processed part (i.e., it is circular)
 def generate_component(startPart, components, partsProcessed):
     partsProcessed[startPart.arrPos] = True
     newComponent = []
     currPart = startPart
     newComponent.append(currPart)
-    while currPart.nextPart != None:
+    while currPart.nextPart != None and not partsProcessed[currPart.nextPart.arrPos]:
         currPart = currPart.nextPart
         partsProcessed[currPart.arrPos] = True
         newComponent.append(currPart)
     components.append(newComponent)
 
+def create_strand_part_index(strandArray):
+    # Maps (vhelixId, baseId) to the index of the (first) part located there
+    posToIdx = {}
+    for i, strandPart in enumerate(strandArray):
+        posToIdx.setdefault((strandPart.vhelixId, strandPart.baseId), i)
+    return posToIdx
+
+# Maps (vhelixId, baseId) to the list of (component index, strand part) tuples
+# occupying that cell, in the order of the strand components
+def create_cell_occupancy_index(strandComponents):
+    occupancy = {}
+    for compIdx, component in enumerate(strandComponents):
+        for strandPart in component:
+            occupancy.setdefault((strandPart.vhelixId, strandPart.baseId), []).append((compIdx, strandPart))
+    return occupancy
+
 def create_strand_components(strandArray):
     # Connect the parts together
+    posToIdx = create_strand_part_index(strandArray)
     i = 0
     for strandPart in strandArray:
-        prevIdx = next((i for i, x in enumerate(strandArray) if x.vhelixId == strandPart.prevVid and x.baseId == strandPart.prevBid), None)
-        nextIdx = next((i for i, x in enumerate(strandArray) if x.vhelixId == strandPart.nextVid and x.baseId == strandPart.nextBid), None)
+        prevIdx = posToIdx.get((strandPart.prevVid, strandPart.prevBid))
+        nextIdx = posToIdx.get((strandPart.nextVid, strandPart.nextBid))
 
         prevPart = strandArray[prevIdx] if prevIdx != None else None
         nextPart = strandArray[nextIdx] if nextIdx != None else None
-        
+
         strandPart.set_prev_next_arr_pos(prevIdx, nextIdx)
         strandPart.set_prev_next(prevPart, nextPart)
         strandPart.set_arr_pos(i)
         i += 1
     
-    i = 0
     circCount = 0
     components = []
     partsProcessed = [False] * len(strandArray)
+    # Stores the arrPos of the part which started the backwards walk visiting the given part
+    partsVisitedFrom = [-1] * len(strandArray)
 
     for strandPart in strandArray:
         if partsProcessed[strandPart.arrPos] == True:
             continue
 
-        # If this part has no previous part, then it is 5' nucleotide
-        # and we can generate the whole strand component starting from it
-        if strandPart.prevPart == None:
-            generate_component(strandPart, components, partsProcessed)
-        # If this part has a previous part, we need to check for circularity
-        else:
-            start = strandPart
-            currPart = start
-            isCirc = False
-            while currPart.prevPart != None:
-                currPart = currPart.prevPart
-                if currPart == start:
-                    isCirc = True
-                    break
-                elif currPart.prevPart == None:
-                    generate_component(currPart, components, partsProcessed)
-            # If circularity was detected, we need to process this component separately
-            if isCirc:
-                newComponent = []
-                currPart = start
-                partsProcessed[currPart.arrPos] = True
-                newComponent.append(currPart)
-                while currPart.nextPart != start:
-                    currPart = currPart.nextPart
-                    partsProcessed[currPart.arrPos] = True
-                    newComponent.append(currPart)
-                components.append(newComponent)
-                circCount += 1                
-        i += 1
+        # Walk backwards to find the 5' nucleotide from which the whole strand
+        # component can be generated. If the walk returns to an already visited part,
+        # the strand is circular and the component is generated starting from that part.
+        currPart = strandPart
+        partsVisitedFrom[currPart.arrPos] = strandPart.arrPos
+        isCirc = False
+        while currPart.prevPart != None and not partsProcessed[currPart.prevPart.arrPos]:
+            currPart = currPart.prevPart
+            if partsVisitedFrom[currPart.arrPos] == strandPart.arrPos:
+                isCirc = True
+                break
+            partsVisitedFrom[currPart.arrPos] = strandPart.arrPos
+
+        generate_component(currPart, components, partsProcessed)
+        if isCirc:
+            circCount += 1
 
     return (components, circCount)
 
-def process_cadnano_file(file_path, lattice_type):
-    print("Loading structure '" + file_path + "' with " + lattice_type + " lattice.\n")
+# Processes the cadnano design given as a path, text stream or already parsed JSON dict
+def process_cadnano_file(file_path, lattice_type, idGenerator, stats):
+    stats.log("Loading structure '" + unfutils.describe_source(file_path) + "' with " + lattice_type + " lattice.\n")
     
-    file = open(file_path, "r")
-    parsedData = json.loads(file.read())
-
-    processedVhelices = []
-    allScaffoldRecords = []
-    allStapleRecords = []
-    global globalIdGenerator
-
-    for vstr in parsedData['vstrands']: 
-        firstActiveCell = max(len(vstr['stap']), len(vstr['scaf']))
-        lastActiveCell = 0
-        lastCell = 0
+    with stats.phase("parse"):
+        parsedData = unfutils.load_json_input(file_path)
+        processedVhelices, allScaffoldRecords, allStapleRecords = load_cadnano_vstrands(parsedData, lattice_type, idGenerator, stats)
 
-        arrToProcess = [(vstr['scaf'], allScaffoldRecords, "scaffold"), (vstr['stap'], allStapleRecords, "staple")]
+    with stats.phase("link"):
+        individualScaffoldStrands = create_strand_components(allScaffoldRecords)
+        individualStapleStrands = create_strand_components(allStapleRecords)
 
-        for arrDestPair in arrToProcess:
-            for idx, strRec in enumerate(arrDestPair[0]):
-                isValidRecord = strRec[CADNANO_PREV_VID] >= 0 or strRec[CADNANO_NEXT_VID] >= 0
-                nuclToRepr = vstr['skip'][idx] if vstr['skip'][idx] < 0 else ((vstr['loop'][idx] + 1) if vstr['loop'][idx] > 0 else 1)
-                if isValidRecord:
-                    thisId = globalIdGenerator
-                    globalIdGenerator += 1
-                    insIds = []
-                    for lId in range(nuclToRepr - 1):
-                        insIds.append(globalIdGenerator)
-                        globalIdGenerator += 1
-                    arrDestPair[1].append(StrandPart(thisId, vstr['num'], idx, strRec[CADNANO_PREV_VID], 
-                    strRec[CADNANO_PREV_BID], strRec[CADNANO_NEXT_VID], strRec[CADNANO_NEXT_BID], nuclToRepr, insIds))
-                lastCell = max(lastCell, idx)
-                if nuclToRepr < 0 or nuclToRepr > 1:
-                    print("Found", arrDestPair[2], arrDestPair[1][-1].get_strand_type())
-
-                firstActiveCell = min(firstActiveCell, idx if isValidRecord else firstActiveCell)
-                lastActiveCell = max(lastActiveCell, idx if isValidRecord else lastActiveCell)
-        
-        processedVhelices.append(Vhelix(vstr['num'], vstr['row'], vstr['col'], lattice_type, firstActiveCell, lastActiveCell, lastCell, vstr['stap_colors']))
+    stats.count("virtualHelices", len(processedVhelices))
+    stats.count("strandParts", len(allScaffoldRecords) + len(allStapleRecords))
+    stats.count("scaffoldStrands", len(individualScaffoldStrands[0]))
+    stats.count("stapleStrands", len(individualStapleStrands[0]))
+    stats.count("circularStrands", individualScaffoldStrands[1] + individualStapleStrands[1])
 
-    individualScaffoldStrands = create_strand_components(allScaffoldRecords)
-    individualStapleStrands = create_strand_components(allStapleRecords)
-
-    print("Found:", len(processedVhelices), "virtual helices,", len(individualScaffoldStrands[0]),
+    stats.log("Found:", len(processedVhelices), "virtual helices,", len(individualScaffoldStrands[0]),
     "scaffolds (", individualScaffoldStrands[1], " circular ),", len(individualStapleStrands[0]),
      "staples (", individualStapleStrands[1], " circular ).")
 
     for vhelix in processedVhelices:
-        print(" Virtual helix: ", str(vhelix))
+        stats.log_detail(" Virtual helix: ", str(vhelix))
     
     for strandComp in individualScaffoldStrands[0]:
-        print(" Scaffold strand routed via", len(strandComp), "cells")
+        stats.log_detail(" Scaffold strand routed via", len(strandComp), "cells")
 
     for strandComp in individualStapleStrands[0]:
-        print(" Staple strand routed via", len(strandComp), "cells")     
+        stats.log_detail(" Staple strand routed via", len(strandComp), "cells")     
     
-    print()
-
-    file.close()
+    stats.log()
 
     return (processedVhelices, individualScaffoldStrands[0], individualStapleStrands[0])
 
-def strands_to_unf_data(unfFileData, thisStructure, strandsList, allStrandParts, areScaffolds, stapleStartToColor):
-    resultingObjects = []
+# Creates virtual helices and (unlinked) scaffold and staple strand parts from the parsed cadnano file
+def load_cadnano_vstrands(parsedData, lattice_type, idGenerator, stats):
+    processedVhelices = []
+    scaffoldTable = StrandPartTable()
+    stapleTable = StrandPartTable()
+
+    for vstr in parsedData['vstrands']: 
+        scaf, stap, nuclToRepr = load_vstrand_arrays(vstr)
+        firstActiveCell = max(len(stap), len(scaf))
+        lastActiveCell = 0
+        lastCell = max(firstActiveCell - 1, 0)
+
+        arrToProcess = [(scaf, scaffoldTable, "scaffold"), (stap, stapleTable, "staple")]
+
+        for arrDestPair in arrToProcess:
+            validMask = get_valid_records_mask(arrDestPair[0])
+            arrDestPair[1].append_vhelix_records(vstr['num'], arrDestPair[0], nuclToRepr, validMask, idGenerator)
+
+            for idx in np.flatnonzero(validMask & (nuclToRepr[:len(validMask)] != 1)).tolist():
+                stats.count("deletions" if nuclToRepr[idx] < 0 else "insertions")
+                stats.log_detail("Found", arrDestPair[2], "deletion" if nuclToRepr[idx] < 0 else "insertion of size " + str(nuclToRepr[idx] - 1))
+
+            validIdx = np.flatnonzero(validMask)
+            if len(validIdx) > 0:
+                firstActiveCell = min(firstActiveCell, int(validIdx[0]))
+                lastActiveCell = max(lastActiveCell, int(validIdx[-1]))
+        
+        processedVhelices.append(Vhelix(vstr['num'], vstr['row'], vstr['col'], lattice_type, firstActiveCell, lastActiveCell, lastCell, vstr['stap_colors']))
+
+    return (processedVhelices, scaffoldTable.to_strand_parts(), stapleTable.to_strand_parts())
+
+# Replaces prev/next part references with None so that the strand components
+# can be pickled without deep recursion. The array positions are kept.
+def detach_strand_links(strandComponents):
+    for component in strandComponents:
+        for strandPart in component:
+            strandPart.set_prev_next(None, None)
+
+# Restores prev/next part references from the stored array positions
+def attach_strand_links(strandComponents):
+    strandArray = [None] * sum(len(component) for component in strandComponents)
+    for component in strandComponents:
+        for strandPart in component:
+            strandArray[strandPart.arrPos] = strandPart
+    for strandPart in strandArray:
+        strandPart.set_prev_next(
+            strandArray[strandPart.prevPartPos] if strandPart.prevPartPos != None else None,
+            strandArray[strandPart.nextPartPos] if strandPart.nextPartPos != None else None)
+
+# Shifts all IDs assigned during the processing of the file by the given offset
+def renumber_cadnano_file_data(fileData, idOffset):
+    for strandComponents in fileData[1:]:
+        for component in strandComponents:
+            for strandPart in component:
+                strandPart.globalId += idOffset
+                strandPart.insertedNuclIds = [x + idOffset for x in strandPart.insertedNuclIds]
+
+# Processes the file with its own ID generator (starting at zero) and stats so that it can
+# be run in a separate process. Returns the processed data without links
+# between strand parts, the number of IDs used and the gathered stats.
+def process_cadnano_file_isolated(file_path, lattice_type, verbosity, traceMemory):
+    idGenerator = unfutils.IdGenerator()
+    stats = unfutils.ConversionStats("cadnano_to_unf", verbosity, traceMemory)
+    fileData = process_cadnano_file(file_path, lattice_type, idGenerator, stats)
+    detach_strand_links(fileData[1])
+    detach_strand_links(fileData[2])
+    return (fileData, idGenerator.get_id_counter(), stats)
+
+# Processes all the files, possibly in parallel (in such case, the files must be given
+# as paths or dicts, not as streams). The files are always renumbered
+# in the order in which they were provided, so the resulting IDs are identical
+# to the ones assigned when processing the files one after another.
+def process_cadnano_files(filePaths, latticeTypes, idGenerator, stats, jobs = 1):
+    if jobs <= 1 or len(filePaths) < 2:
+        return [process_cadnano_file(filePaths[i], latticeTypes[i], idGenerator, stats) for i in range(len(filePaths))]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = jobs) as executor:
+        results = list(executor.map(process_cadnano_file_isolated, filePaths, latticeTypes,
+         [stats.verbosity] * len(filePaths), [stats.traceMemory] * len(filePaths)))
+
+    processedFilesData = []
+    for fileData, idsUsed, workerStats in results:
+        stats.merge(workerStats)
+        renumber_cadnano_file_data(fileData, idGenerator.reserve_block(idsUsed))
+        attach_strand_links(fileData[1])
+        attach_strand_links(fileData[2])
+        processedFilesData.append(fileData)
+    return processedFilesData
+
+# Returns the first other strand part located in the same cell as the given one
+def find_pair_part(cellOccupancy, strandPart):
+    for compIdx, x in cellOccupancy.get((strandPart.vhelixId, strandPart.baseId), []):
+        if x.globalId != strandPart.globalId:
+            return x
+    return None
+
+# Generates UNF strand objects for the given strand components.
+# Nucleotides of each strand are generated only when the strand is being written.
+def generate_unf_strands(strandsList, cellOccupancy, areScaffolds, stapleStartToColor, idGenerator, stats):
     r = lambda: random.randint(0, 230)
-    global globalIdGenerator
 
     for strand in strandsList:
-        # Each strand is an array of strand parts (StrandPart).
-        # Since one strand part may represent different number of nucleotides
-        # or possibly none at all, the parts will be preprocessed to work
-        # with a consecutive sequence of nucleotides where deleted ones are omitted
-        # and insertions are "expanded".
-        
-        # Index i refers to i-th nucleotide of a strand
-        # Its next/prev nucleotides have neighboring IDs in the ntIds array
-        ntIds = []
-        ntPairs = []
-        
-        strandColor = ""
-
-        for strandPart in strand:
-            cellType = strandPart.get_unf_cell_type()
-            if cellType == "n":
-                ntIds.append(strandPart.globalId)
-                ntPairs.append(next((x.globalId for y in allStrandParts for x in y if x.vhelixId == strandPart.vhelixId and
-                 x.baseId == strandPart.baseId and x.globalId != strandPart.globalId), -1))
-            elif cellType == "i":
-                idsToAdd = [strandPart.globalId] + strandPart.insertedNuclIds
-                pairPart = next((x for y in allStrandParts for x in y if x.vhelixId == strandPart.vhelixId and
-                 x.baseId == strandPart.baseId and x.globalId != strandPart.globalId), None)
-
-                pairsToAdd = []
-                if pairPart != None:
-                    pairsToAdd = pairPart.insertedNuclIds[::-1] + [pairPart.globalId]
-                else:
-                    pairsToAdd = [-1] * len(idsToAdd)
-                
-                ntIds += idsToAdd
-                ntPairs += pairsToAdd
+        with stats.phase("strand emission"):
+            strandObject = create_unf_strand(strand, cellOccupancy, areScaffolds, stapleStartToColor, idGenerator, r, stats)
+        yield strandObject
+
+def create_unf_strand(strand, cellOccupancy, areScaffolds, stapleStartToColor, idGenerator, r, stats):
+    # Each strand is an array of strand parts (StrandPart).
+    # Since one strand part may represent different number of nucleotides
+    # or possibly none at all, the parts will be preprocessed to work
+    # with a consecutive sequence of nucleotides where deleted ones are omitted
+    # and insertions are "expanded".
+    
+    # Index i refers to i-th nucleotide of a strand
+    # Its next/prev nucleotides have neighboring IDs in the ntIds array
+    ntIds = []
+    ntPairs = []
+    
+    strandColor = ""
+
+    for strandPart in strand:
+        cellType = strandPart.get_unf_cell_type()
+        if cellType == "n":
+            pairPart = find_pair_part(cellOccupancy, strandPart)
+            ntIds.append(strandPart.globalId)
+            ntPairs.append(pairPart.globalId if pairPart != None else -1)
+        elif cellType == "i":
+            idsToAdd = [strandPart.globalId] + strandPart.insertedNuclIds
+            pairPart = find_pair_part(cellOccupancy, strandPart)
+
+            pairsToAdd = []
+            if pairPart != None:
+                pairsToAdd = pairPart.insertedNuclIds[::-1] + [pairPart.globalId]
+            else:
+                pairsToAdd = [-1] * len(idsToAdd)
             
-            # NOTE Cadnano does not seem to store color for circular staples
-            #      Therefore, random color is generated for them
-            if cellType != "d" and not areScaffolds and len(strandColor) == 0:
-                vid = strandPart.vhelixId
-                bid = strandPart.baseId
-                colRec = stapleStartToColor[(vid, bid)] if (vid, bid) in stapleStartToColor else None
-                if colRec != None:
-                    strandColor = colRec
-            # For deletion, "deletion" cell exists but it contains no nucleotides
-            # and is thus ignored on the level of DNA data structure.
-            # The resulting strand, therefore, simply "goes through that cell without stopping".
-
-        if len(strandColor) == 0:
-            strandColor = "#0000FF" if areScaffolds else "#{:02x}{:02x}{:02x}".format(r(), r(), r())
-
-        strandObject = {}
-
-        strandObject['id'] = globalIdGenerator
-        globalIdGenerator += 1
-        strandObject['name'] = "DNA_strand"
-        strandObject['naType'] = "DNA"
-        strandObject['chainName'] = "NULL"
-        strandObject['color'] = strandColor
-        strandObject['isScaffold'] = areScaffolds
-        strandObject['pdbFileId'] = -1
-        strandObject['fivePrimeId'] = ntIds[0]
-        strandObject['threePrimeId'] = ntIds[-1]
-
-        nucleotides = []
-        for i in range(len(ntIds)):
-            newNucl = {}
-            newNucl['id'] = ntIds[i]
-            newNucl['nbAbbrev'] = "N"
-            newNucl['pair'] = ntPairs[i]
-            newNucl['prev'] = ntIds[i - 1] if i > 0 else -1
-            newNucl['next'] = ntIds[i + 1] if i < len(ntIds) - 1 else - 1
-            newNucl['pdbId'] = -1
-            newNucl['altPositions'] = []
-
-            nucleotides.append(newNucl)
-
-        # Maintain circularity
-        circStr = "[acyclic]"
-        if strand[-1].nextPart == strand[0]:
-            nucleotides[0]['prev'] = ntIds[-1]
-            nucleotides[-1]['next'] = ntIds[0]
-            circStr = "[circular]"
-
-        strandObject['nucleotides'] = nucleotides
-        resultingObjects.append(strandObject)
-        print(circStr, "Scaffold" if areScaffolds else "Staple", "strand object generated with", len(nucleotides), "nucleotides.")
-        print(" Color:", strandColor)
-
-    thisStructure['naStrands'] = thisStructure['naStrands'] + resultingObjects
-
-def convert_data_to_unf_file(latticesData, latticesPositions, latticeOrientations):
-    unfFileData = unfutils.initialize_unf_file_data_object("cadnano_converted_structure", "Cadnano to UNF Python Converter Script")
-    global globalIdGenerator
-    posId = 0
-
-    for lattData in latticesData:
+            ntIds += idsToAdd
+            ntPairs += pairsToAdd
+        
+        # NOTE Cadnano does not seem to store color for circular staples
+        #      Therefore, random color is generated for them
+        if cellType != "d" and not areScaffolds and len(strandColor) == 0:
+            vid = strandPart.vhelixId
+            bid = strandPart.baseId
+            colRec = stapleStartToColor[(vid, bid)] if (vid, bid) in stapleStartToColor else None
+            if colRec != None:
+                strandColor = colRec
+        # For deletion, "deletion" cell exists but it contains no nucleotides
+        # and is thus ignored on the level of DNA data structure.
+        # The resulting strand, therefore, simply "goes through that cell without stopping".
+
+    if len(strandColor) == 0:
+        strandColor = "#0000FF" if areScaffolds else "#{:02x}{:02x}{:02x}".format(r(), r(), r())
+
+    strandObject = {}
+
+    strandObject['id'] = idGenerator.get_next_id()
+    strandObject['name'] = "DNA_strand"
+    strandObject['naType'] = "DNA"
+    strandObject['chainName'] = "NULL"
+    strandObject['color'] = strandColor
+    strandObject['isScaffold'] = areScaffolds
+    strandObject['pdbFileId'] = -1
+    strandObject['fivePrimeId'] = ntIds[0]
+    strandObject['threePrimeId'] = ntIds[-1]
+
+    # Maintain circularity
+    isCircular = strand[-1].nextPart == strand[0]
+    strandObject['nucleotides'] = generate_unf_nucleotides(ntIds, ntPairs, isCircular)
+
+    stats.count("nucleotides", len(ntIds))
+    stats.log_detail("[circular]" if isCircular else "[acyclic]", "Scaffold" if areScaffolds else "Staple",
+     "strand object generated with", len(ntIds), "nucleotides.")
+    stats.log_detail(" Color:", strandColor)
+    return strandObject
+
+def generate_unf_nucleotides(ntIds, ntPairs, isCircular):
+    for i in range(len(ntIds)):
+        newNucl = {}
+        newNucl['id'] = ntIds[i]
+        newNucl['nbAbbrev'] = "N"
+        newNucl['pair'] = ntPairs[i]
+        newNucl['prev'] = ntIds[i - 1] if i > 0 or isCircular else -1
+        newNucl['next'] = ntIds[(i + 1) % len(ntIds)] if i < len(ntIds) - 1 or isCircular else - 1
+        newNucl['pdbId'] = -1
+        newNucl['altPositions'] = []
+
+        yield newNucl
+
+# Creates UNF cells of the virtual helix and assigns them the nucleotides of the strand parts
+def create_vhelix_cells(vhelix, cellOccupancy, idGenerator, stats):
+    cells = []
+    for i in range(vhelix.lastActiveCell + 1):
+        newCell = {}
+        newCell['id'] = idGenerator.get_next_id()
+        newCell['number'] = i
+        newCell['type'] = "n"
+        newCell['fiveToThreeNts'] = []
+        newCell['threeToFiveNts'] = []
+
+        # Find out the directionality of the strands in this virtual helix.
+        # Parts are visited in the same order as they appear in the strand
+        # components, and the search stops once both directions are filled
+        # and the next component is reached.
+        lastCompIdx = None
+        for compIdx, currPart in cellOccupancy.get((vhelix.id, i), []):
+            if compIdx != lastCompIdx:
+                if len(newCell['fiveToThreeNts']) > 0 and len(newCell['threeToFiveNts']) > 0:
+                    break
+                lastCompIdx = compIdx
+
+            cellType = currPart.get_unf_cell_type()
+            newCell['type'] = cellType
+
+            if cellType != "d":
+                strVhelixStartPart = currPart.prevPart if currPart.prevPart != None and currPart.prevPart.vhelixId == vhelix.id else currPart
+                strVhelixEndPart = currPart.nextPart if currPart.nextPart != None and currPart.nextPart.vhelixId == vhelix.id else currPart
+
+                # We can afford "and" instead of "or" because the start/end parts are initialized
+                # with this strand part and the comparsion includes equality
+                if strVhelixStartPart.baseId <= currPart.baseId and strVhelixEndPart.baseId >= currPart.baseId:
+                    if len(newCell['fiveToThreeNts']) > 0:
+                        stats.log_error("Error! Rewriting content of a valid cell", vhelix.row,
+                         vhelix.col, i, "with a new 5'3' value.", newCell['fiveToThreeNts'], "->", currPart.globalId)
+                    newCell['fiveToThreeNts'] = [currPart.globalId] + currPart.insertedNuclIds
+                elif strVhelixStartPart.baseId >= currPart.baseId and strVhelixEndPart.baseId <= currPart.baseId:
+                    if len(newCell['threeToFiveNts']) > 0:
+                        stats.log_error("Error! Rewriting content of a valid cell", vhelix.row,
+                        vhelix.col, i, "with a new 3'5' value.", newCell['threeToFiveNts'], "->", currPart.globalId)
+                    newCell['threeToFiveNts'] = [currPart.globalId] + currPart.insertedNuclIds
+
+        cells.append(newCell)
+
+    stats.count("cells", len(cells))
+    return cells
+
+# Number of IDs assigned to the lattice and its structure by the UNF output
+def get_lattice_ids_count(lattData):
+    vhelices = lattData[0]
+    return 2 + len(vhelices) + sum(vhelix.lastActiveCell + 1 for vhelix in vhelices) + len(lattData[1]) + len(lattData[2])
+
+def generate_unf_lattices(latticesData, latticesPositions, latticeOrientations, latticeIdGenerators, latticeContexts, stats):
+    for posId, lattData in enumerate(latticesData):
         vhelices = lattData[0]
-        scaffoldStrands = lattData[1]
-        stapleStrands = lattData[2]
+        idGenerator = latticeIdGenerators[posId]
 
-        allStrandParts = scaffoldStrands + stapleStrands
+        with stats.phase("cell assignment"):
+            cellOccupancy = create_cell_occupancy_index(lattData[1] + lattData[2])
+        stapleStartToColor = {}
+        # Cell occupancy and staple colors are needed later when the strands are generated
+        latticeContexts.append((cellOccupancy, stapleStartToColor))
 
         outputLattice = {}
-        outputLattice['id'] = globalIdGenerator
-        globalIdGenerator += 1
+        outputLattice['id'] = idGenerator.get_next_id()
         outputLattice['name'] = 'lattice_from_cadnano'
-        outputLattice['position'] = [int(pos) for pos in latticesPositions[posId].split(",")]
-        outputLattice['orientation'] = [int(rot) for rot in latticeOrientations[posId].split(",")]
-        posId += 1
-        outputLattice['virtualHelices'] = []
-
-        stapleStartToColor = {}
-
-        for vhelix in vhelices:
-            outputVhelix = {}
-            outputVhelix['id'] = globalIdGenerator
-            globalIdGenerator += 1
-            outputVhelix['firstActiveCell'] = vhelix.firstActiveCell
-            outputVhelix['lastActiveCell'] = vhelix.lastActiveCell
-            outputVhelix['lastCell'] = vhelix.lastCell
-            outputVhelix['latticePosition'] = [vhelix.row, vhelix.col]
-            outputVhelix['initialAngle'] = LSQ_INIT_ANGLE if vhelix.latticeType == LATTICE_SQUARE else LHC_INIT_ANGLE 
-        
-            outputLattice['type'] = vhelix.latticeType
-
-            for stapColPair in vhelix.stapColors:
-                stapleStartToColor[(vhelix.id, stapColPair[0])] = unfutils.dec_color_to_hex(stapColPair[1])
-
-            cells = []
-            for i in range(vhelix.lastActiveCell + 1):
-                newCell = {}
-                newCell['id'] = globalIdGenerator
-                globalIdGenerator += 1
-                newCell['number'] = i
-                newCell['type'] = "n"
-                newCell['fiveToThreeNts'] = []
-                newCell['threeToFiveNts'] = []
-
-                # The purpose of this (computationally not ideal) code is to
-                # find out the directionality of this strand in this virtual helix.
-                for sp in allStrandParts:
-                    for x in sp:
-                        if x.vhelixId == vhelix.id and x.baseId == i:
-                            currPart = x
-                            cellType = currPart.get_unf_cell_type()
-                            newCell['type'] = cellType        
-                            
-                            if cellType != "d":
-                                strVhelixStartPart = currPart.prevPart if currPart.prevPart != None and currPart.prevPart.vhelixId == vhelix.id else currPart
-                                strVhelixEndPart = currPart.nextPart if currPart.nextPart != None and currPart.nextPart.vhelixId == vhelix.id else currPart
-                                
-                                # We can afford "and" instead of "or" because the start/end parts are initialized
-                                # with this strand part and the comparsion includes equality
-                                if strVhelixStartPart.baseId <= currPart.baseId and strVhelixEndPart.baseId >= currPart.baseId:
-                                    if len(newCell['fiveToThreeNts']) > 0:
-                                        print("Error! Rewriting content of a valid cell", vhelix.row,
-                                         vhelix.col, i, "with a new 5'3' value.", newCell['fiveToThreeNts'], "->", currPart.globalId)
-                                    newCell['fiveToThreeNts'] = [currPart.globalId] + currPart.insertedNuclIds
-                                elif strVhelixStartPart.baseId >= currPart.baseId and strVhelixEndPart.baseId <= currPart.baseId:
-                                    if len(newCell['threeToFiveNts']) > 0:
-                                        print("Error! Rewriting content of a valid cell", vhelix.row, 
-                                        vhelix.col, i, "with a new 3'5' value.", newCell['threeToFiveNts'], "->", currPart.globalId)
-                                    newCell['threeToFiveNts'] = [currPart.globalId] + currPart.insertedNuclIds
-                    if len(newCell['fiveToThreeNts']) > 0 and len(newCell['threeToFiveNts']) > 0:
-                        break
-              
-                cells.append(newCell)
-
-            outputVhelix['cells'] = cells
-            outputLattice['virtualHelices'].append(outputVhelix)
-
-        unfFileData['lattices'].append(outputLattice)
+        outputLattice['position'] = unfutils.parse_int_vector(latticesPositions[posId])
+        outputLattice['orientation'] = unfutils.parse_int_vector(latticeOrientations[posId])
+        outputLattice['virtualHelices'] = generate_unf_vhelices(vhelices, cellOccupancy, stapleStartToColor, idGenerator, stats)
+        if len(vhelices) > 0:
+            outputLattice['type'] = vhelices[0].latticeType
+
+        yield outputLattice
+
+def generate_unf_vhelices(vhelices, cellOccupancy, stapleStartToColor, idGenerator, stats):
+    for vhelix in vhelices:
+        outputVhelix = {}
+        outputVhelix['id'] = idGenerator.get_next_id()
+        outputVhelix['firstActiveCell'] = vhelix.firstActiveCell
+        outputVhelix['lastActiveCell'] = vhelix.lastActiveCell
+        outputVhelix['lastCell'] = vhelix.lastCell
+        outputVhelix['latticePosition'] = [vhelix.row, vhelix.col]
+        outputVhelix['initialAngle'] = LSQ_INIT_ANGLE if vhelix.latticeType == LATTICE_SQUARE else LHC_INIT_ANGLE 
+
+        for stapColPair in vhelix.stapColors:
+            stapleStartToColor[(vhelix.id, stapColPair[0])] = unfutils.dec_color_to_hex(stapColPair[1])
+
+        with stats.phase("cell assignment"):
+            outputVhelix['cells'] = create_vhelix_cells(vhelix, cellOccupancy, idGenerator, stats)
+
+        yield outputVhelix
+
+# Expects all the lattices to be already generated
+def generate_unf_structures(latticesData, latticeIdGenerators, latticeContexts, stats):
+    for lattIdx, lattData in enumerate(latticesData):
+        idGenerator = latticeIdGenerators[lattIdx]
+        cellOccupancy, stapleStartToColor = latticeContexts[lattIdx]
 
         newStructure = {}
-        newStructure['id'] = globalIdGenerator
-        globalIdGenerator += 1
+        newStructure['id'] = idGenerator.get_next_id()
         newStructure['name'] = "Multilayer structure"
-        newStructure['naStrands'] = []
+        newStructure['naStrands'] = itertools.chain(
+            generate_unf_strands(lattData[1], cellOccupancy, True, stapleStartToColor, idGenerator, stats),
+            generate_unf_strands(lattData[2], cellOccupancy, False, stapleStartToColor, idGenerator, stats))
         newStructure['aaChains'] = []
-        strands_to_unf_data(unfFileData, newStructure, scaffoldStrands, allStrandParts, True, stapleStartToColor)
-        strands_to_unf_data(unfFileData, newStructure, stapleStrands, allStrandParts, False, stapleStartToColor)
-        unfFileData['structures'].append(newStructure)
-    
-    unfFileData['idCounter'] = globalIdGenerator
 
-    with open(OUTPUT_FILE_NAME, 'w') as outfile:
-        json.dump(unfFileData, outfile)
+        yield newStructure
+
+# Creates the UNF document. Lattices and structures are generated only when the document
+# is being written (or materialized).
+def create_unf_file_data(latticesData, latticesPositions, latticeOrientations, idGenerator, stats):
+    unfFileData = unfutils.initialize_unf_file_data_object("cadnano_converted_structure", "Cadnano to UNF Python Converter Script")
+
+    # The lattices are written before the structures. To keep the IDs of each lattice
+    # and its structure together, they are assigned from a block reserved in advance.
+    latticeIdGenerators = [unfutils.IdGenerator(idGenerator.reserve_block(get_lattice_ids_count(lattData)))
+     for lattData in latticesData]
+    latticeContexts = []
+
+    unfFileData['lattices'] = generate_unf_lattices(latticesData, latticesPositions, latticeOrientations,
+     latticeIdGenerators, latticeContexts, stats)
+    unfFileData['structures'] = generate_unf_structures(latticesData, latticeIdGenerators, latticeContexts, stats)
+    return unfFileData
+
+def convert_data_to_unf_file(latticesData, latticesPositions, latticeOrientations, idGenerator, stats, output = OUTPUT_FILE_NAME):
+    unfFileData = create_unf_file_data(latticesData, latticesPositions, latticeOrientations, idGenerator, stats)
+    return unfutils.output_unf_document(unfFileData, idGenerator, output, stats)
+
+# Converts cadnano designs to a single UNF document.
+# Each input is a tuple (source, lattice_type[, position[, orientation]]) where the source is a path,
+# text stream or parsed cadnano dict, and position/orientation are "x,y,z" strings or sequences of numbers.
+# If the output (path or text stream) is given, the UNF is written there and None is returned.
+# Otherwise, the UNF document is returned as a dict.
+def convert_cadnano_to_unf(inputs, output = None, jobs = 1, stats = None):
+    if stats == None:
+        stats = unfutils.ConversionStats("cadnano_to_unf", unfutils.VERBOSITY_QUIET)
+    idGenerator = unfutils.IdGenerator()
+
+    sources = [inp[0] for inp in inputs]
+    latticeTypes = [inp[1] for inp in inputs]
+    positions = [inp[2] if len(inp) > 2 else "0,0,0" for inp in inputs]
+    orientations = [inp[3] if len(inp) > 3 else "0,0,0" for inp in inputs]
+
+    processedFilesData = process_cadnano_files(sources, latticeTypes, idGenerator, stats, jobs)
+    return convert_data_to_unf_file(processedFilesData, positions, orientations, idGenerator, stats, output)
 
 def getInputFilesToProcess(argv):
     resPaths = []
@@ -418,6 +585,8 @@ def getInputFilesToProcess(argv):
 
     for i in range(1, len(argv)):
         thisArg = argv[i]
+        if thisArg.startswith("--"):
+            continue
         splitArr = thisArg.split(':')
         if len(splitArr) < 2:
             print("Invalid argument!", thisArg, splitArr)
@@ -446,15 +615,19 @@ def main():
         print("rotation = x,y,z (degrees) [default 0,0,0]")
         print("")
         print("At least one input file is mandatory.")
+        print("Options:")
+        print("--jobs=<n> = number of processes used to load the input files [default 1]")
+        unfutils.print_compression_cli_usage(OUTPUT_FILE_NAME)
+        unfutils.print_stats_cli_usage()
         sys.exit(1)
     
     filesToProcess = getInputFilesToProcess(sys.argv)
-    processedFilesData = []
-    
-    for i in range(0, len(filesToProcess[0])):
-        processedFilesData.append(process_cadnano_file(filesToProcess[0][i], filesToProcess[1][i]))
+    jobs = int(unfutils.get_cli_option(sys.argv, "jobs", 1))
+    stats = unfutils.create_stats_from_cli("cadnano_to_unf", sys.argv)
 
-    convert_data_to_unf_file(processedFilesData, filesToProcess[2], filesToProcess[3])
+    output = unfutils.get_compressed_file_name(OUTPUT_FILE_NAME, unfutils.get_cli_option(sys.argv, "compress", None))
+    convert_cadnano_to_unf(list(zip(*filesToProcess)), output, jobs, stats)
+    unfutils.finish_stats_from_cli(stats, sys.argv)
 
 if __name__ == '__main__':
   main()
\ No newline at end of file
@@ -0,0 +1,142 @@
+import os
+import re
+import time
+import hashlib
+import pathlib
+import threading
+import urllib.request
+import concurrent.futures
+
+# On-disk cache of structures downloaded from the PDB (or its mirror).
+# Downloaded files are stored by the SHA-256 of their content ("objects" directory)
+# and the "refs" directory maps each "<ID>.<format>" key to the content hash and size.
+# The content is hashed only when it is stored; lookups check only the size of the stored file.
+# When the cache grows over its size limit, the least recently used files are removed.
+# The files are written via temporary files and renames so that several processes
+# (e.g., parallel CI jobs) can share one cache directory.
+# Only plain IDs (optionally with the .pdb or .cif extension) are cached, other forms
+# (e.g., .mmtf or URLs) are left for atomium.fetch.
+
+DEFAULT_CACHE_DIR = os.environ.get("UNF_PDB_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "unf", "pdb"))
+DEFAULT_CACHE_SIZE_MB = 1024
+# Either a base URL/directory to which "<ID>.<format>" is appended or a template with {id} and {format} fields.
+# Local directories and file:// URLs can be used as well.
+DEFAULT_MIRROR_URL = os.environ.get("UNF_PDB_MIRROR", "https://files.rcsb.org/download/")
+DEFAULT_FETCH_JOBS = 4
+DOWNLOAD_TIMEOUT_SECONDS = 60
+
+SUPPORTED_FORMATS = ["pdb", "cif"]
+PDB_ID_REGEX = re.compile(r"^([A-Za-z0-9_]+?)(?:\.(pdb|cif))?$")
+
+def parse_pdb_id(pdbId):
+    match = PDB_ID_REGEX.match(pdbId)
+    if match == None:
+        raise ValueError("Invalid PDB ID: " + pdbId)
+    return (match.group(1).upper(), match.group(2) if match.group(2) != None else "cif")
+
+# Returns true if the structure can be downloaded to the cache (i.e., it is not an .mmtf file or URL)
+def is_cacheable_id(pdbId):
+    return PDB_ID_REGEX.match(pdbId) != None
+
+def get_mirror_url(mirrorUrl, pdbId, fileFormat):
+    if "{id}" in mirrorUrl:
+        return mirrorUrl.format(id = pdbId, format = fileFormat)
+    if os.path.isdir(mirrorUrl):
+        mirrorUrl = pathlib.Path(mirrorUrl).resolve().as_uri()
+    return mirrorUrl.rstrip("/") + "/" + pdbId + "." + fileFormat
+
+class PdbCache:
+    def __init__(self, cacheDir = DEFAULT_CACHE_DIR, maxSizeMb = DEFAULT_CACHE_SIZE_MB, mirrorUrl = DEFAULT_MIRROR_URL):
+        self.cacheDir = cacheDir
+        self.maxSizeBytes = int(maxSizeMb * 1024 * 1024)
+        self.mirrorUrl = mirrorUrl
+        self.objectsDir = os.path.join(cacheDir, "objects")
+        self.refsDir = os.path.join(cacheDir, "refs")
+        self.lock = threading.Lock()
+
+    def get_object_path(self, contentHash, fileFormat):
+        return os.path.join(self.objectsDir, contentHash + "." + fileFormat)
+
+    # Returns the path of the cached file or None if it is not cached (or is truncated)
+    def lookup(self, pdbId, fileFormat):
+        refPath = os.path.join(self.refsDir, pdbId + "." + fileFormat)
+        try:
+            with open(refPath, "r") as file:
+                contentHash, size = file.read().split()
+            objectPath = self.get_object_path(contentHash, fileFormat)
+            if os.path.getsize(objectPath) != int(size):
+                return None
+            # Modification time serves as the last use time for the eviction
+            os.utime(objectPath)
+            return objectPath
+        except (OSError, ValueError):
+            return None
+
+    def store(self, pdbId, fileFormat, data):
+        # The directories are created on the first store only
+        os.makedirs(self.objectsDir, exist_ok = True)
+        os.makedirs(self.refsDir, exist_ok = True)
+        contentHash = hashlib.sha256(data).hexdigest()
+        objectPath = self.get_object_path(contentHash, fileFormat)
+        write_file_atomically(objectPath, data)
+        write_file_atomically(os.path.join(self.refsDir, pdbId + "." + fileFormat), (contentHash + " " + str(len(data))).encode("ascii"))
+        self.evict(objectPath)
+        return objectPath
+
+    def download(self, pdbId, fileFormat):
+        with urllib.request.urlopen(get_mirror_url(self.mirrorUrl, pdbId, fileFormat), timeout = DOWNLOAD_TIMEOUT_SECONDS) as response:
+            return response.read()
+
+    # Returns the path to the local copy of the structure ("<ID>" or "<ID>.<format>"),
+    # downloading it first if it is not cached
+    def get_path(self, pdbIdWithFormat):
+        pdbId, fileFormat = parse_pdb_id(pdbIdWithFormat)
+        cachedPath = self.lookup(pdbId, fileFormat)
+        if cachedPath != None:
+            return cachedPath
+        data = self.download(pdbId, fileFormat)
+        with self.lock:
+            return self.store(pdbId, fileFormat, data)
+
+    # Returns the paths of all the structures, downloading the missing ones concurrently.
+    # Structures which could not be fetched have the path None and their errors are returned
+    # as (ID, exception) pairs so that one failed download does not stop the others.
+    def get_paths(self, pdbIds, jobs = DEFAULT_FETCH_JOBS):
+        def get_path_or_error(pdbId):
+            try:
+                return (self.get_path(pdbId), None)
+            except (OSError, ValueError) as e:
+                return (None, e)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers = max(1, jobs)) as executor:
+            results = list(executor.map(get_path_or_error, pdbIds))
+        paths = [path for path, error in results]
+        errors = [(pdbId, error) for pdbId, (path, error) in zip(pdbIds, results) if error != None]
+        return (paths, errors)
+
+    # Removes the least recently used files until the cache fits into its size limit.
+    # The given (just stored) file is never removed.
+    def evict(self, keptPath):
+        objects = []
+        for entry in os.scandir(self.objectsDir):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                objects.append((stat.st_mtime, stat.st_size, entry.path))
+
+        totalSize = sum(size for mtime, size, path in objects)
+        for mtime, size, path in sorted(objects):
+            if totalSize <= self.maxSizeBytes:
+                break
+            if os.path.samefile(path, keptPath):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            totalSize -= size
+
+def write_file_atomically(path, data):
+    tmpPath = path + "." + str(os.getpid()) + "." + str(threading.get_ident()) + "." + str(time.time_ns()) + ".tmp"
+    with open(tmpPath, "wb") as file:
+        file.write(data)
+    os.replace(tmpPath, path)
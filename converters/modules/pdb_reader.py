@@ -0,0 +1,534 @@
+import os
+import re
+import mmap
+import itertools
+import contextlib
+import numpy as np
+
+# Reader of atomic structures for the PDB to UNF conversion.
+# PDB (fixed-column ATOM/HETATM records) and mmCIF (_atom_site loop) files are read
+# directly into column arrays from a memory-mapped file.
+# Other formats (e.g., MMTF) are loaded with atomium.
+#
+# Residues are split into polymer chains and ligands the same way as atomium does it:
+# - PDB: atoms preceding the last TER record of the model belong to polymer chains, the remaining ones to ligands
+# - mmCIF: atoms of "polymer" and "branched" entities belong to polymer chains, the remaining ones to ligands
+# Waters outside of polymer chains are omitted and when there are alternate locations
+# of atoms with partial occupancy, only the first alternate location is used.
+
+FAST_READER_EXTENSIONS = [".pdb", ".ent", ".cif"]
+
+# Masses of the elements (as used by atomium) for the computation of residue center of mass.
+# Elements not listed are considered to have zero mass (see AtomTable.get_residue_centers_of_mass).
+ELEMENT_MASSES = {
+    "H": 1.0079, "C": 12.0107, "N": 14.0067, "O": 15.9994, "P": 30.9738, "S": 32.065, "SE": 78.96,
+    "F": 18.9984, "CL": 35.453, "BR": 79.904, "I": 126.9045, "NA": 22.9897, "MG": 24.305, "K": 39.0983,
+    "CA": 40.078, "MN": 54.938, "FE": 55.845, "CO": 58.9332, "NI": 58.6934, "CU": 63.546, "ZN": 65.39
+}
+
+WATER_NAMES = ["HOH", "DOD"]
+
+# Atoms of a group of residues stored column-wise,
+# i.e., one array per attribute with an entry for each atom (or residue)
+class AtomTable:
+    def __init__(self, coords, names, elements, resIdx, resNames, resIds, atomOffset = None):
+        self.coords = coords
+        self.names = names
+        self.elements = elements
+        self.resIdx = resIdx
+        self.resNames = resNames
+        self.resIds = resIds
+        self.resCount = len(resNames)
+        # Index of the first atom of the table in the structure's atoms (see PdbStructure.atomSelection)
+        self.atomOffset = atomOffset
+
+    def __len__(self):
+        return len(self.names)
+
+    # Creates the table from atomium's residues (or ligands)
+    @classmethod
+    def from_residues(cls, residues):
+        coords = []
+        names = []
+        elements = []
+        resIdx = []
+
+        for idx, residue in enumerate(residues):
+            for atom in residue.atoms():
+                coords.append(atom.location)
+                names.append(atom.name)
+                elements.append(atom.element)
+                resIdx.append(idx)
+
+        return cls(np.array(coords, dtype = float).reshape(-1, 3), np.array(names, dtype = str),
+            np.array(elements, dtype = object), np.array(resIdx, dtype = int),
+            [residue.name for residue in residues], [residue.id for residue in residues])
+
+    # Returns the table containing only the atoms of the given residue
+    def get_residue(self, resIdx):
+        mask = self.resIdx == resIdx
+        atomOffset = self.atomOffset + np.argmax(mask) if self.atomOffset != None else None
+        return AtomTable(self.coords[mask], self.names[mask], self.elements[mask],
+            np.zeros(np.count_nonzero(mask), dtype = int), [self.resNames[resIdx]], [self.resIds[resIdx]], atomOffset)
+
+    # Returns the table with the same atoms at other locations (e.g., from another model)
+    def with_coords(self, coords):
+        return AtomTable(coords, self.names, self.elements, self.resIdx, self.resNames, self.resIds, self.atomOffset)
+
+    # Returns the locations of the table's atoms from the locations of all the structure's atoms
+    def select_coords(self, structureCoords):
+        return structureCoords[self.atomOffset:self.atomOffset + len(self)]
+
+    # Returns the index of the atom with the given name for each residue (-1 if not present).
+    # If the residue contains more atoms of this name, the first (or last) one is returned.
+    def find_atom_per_residue(self, atomName, last = False):
+        atomIndices = np.flatnonzero(self.names == atomName)
+        if last:
+            atomIndices = atomIndices[::-1]
+        resIndices, firstIdx = np.unique(self.resIdx[atomIndices], return_index = True)
+        result = np.full(self.resCount, -1)
+        result[resIndices] = atomIndices[firstIdx]
+        return result
+
+    # Averages the coordinates of the selected atoms of each residue.
+    # The coordinates are accumulated in their original order.
+    def get_residue_centers(self, mask):
+        sums = np.zeros((self.resCount, 3))
+        np.add.at(sums, self.resIdx[mask], self.coords[mask])
+        counts = np.bincount(self.resIdx[mask], minlength = self.resCount)
+        return np.true_divide(sums, counts[:, None])
+
+    # Residues made only of elements without a known mass get their geometric center instead
+    def get_residue_centers_of_mass(self):
+        masses = np.array([ELEMENT_MASSES.get(str(element).upper(), 0.0) for element in self.elements], dtype = float)
+        sums = np.zeros((self.resCount, 3))
+        np.add.at(sums, self.resIdx, self.coords * masses[:, None])
+        totalMasses = np.bincount(self.resIdx, masses, minlength = self.resCount)
+        hasMass = totalMasses > 0
+        centers = np.zeros((self.resCount, 3))
+        centers[hasMass] = sums[hasMass] / totalMasses[hasMass, None]
+        if not hasMass.all():
+            centers[~hasMass] = self.get_residue_centers(np.ones(len(self), dtype = bool))[~hasMass]
+        return centers
+
+    # Returns the (not mass-weighted) center of all atoms and their locations relative to it
+    def get_center_and_offsets(self):
+        center = np.true_divide(np.add.reduce(self.coords, axis = 0), len(self))
+        return (center, self.coords - center)
+
+# First model of the structure split into polymer chains and ligands
+class PdbStructure:
+    def __init__(self, code, title, authors, chains, ligands, atomSelection = None, recordsCount = 0):
+        self.code = code
+        self.title = title
+        self.authors = authors
+        # List of (chain ID, AtomTable of the chain's residues) tuples
+        self.chains = chains
+        # List of AtomTables with one residue each
+        self.ligands = ligands
+        # Indices of the atom records of a model used by the tables (in the order of the tables' atoms)
+        self.atomSelection = atomSelection
+        # Number of atom records in the model
+        self.recordsCount = recordsCount
+
+def can_read_fast(fileName):
+    return os.path.splitext(str(fileName))[1].lower() in FAST_READER_EXTENSIONS
+
+# Provides the content of the path (memory-mapped), binary/text stream or bytes
+@contextlib.contextmanager
+def open_structure_data(source):
+    if isinstance(source, (bytes, bytearray)):
+        yield source
+    elif hasattr(source, "read"):
+        data = source.read()
+        yield data.encode("utf-8") if isinstance(data, str) else data
+    else:
+        with open(source, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                yield b""
+            else:
+                with mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as data:
+                    yield data
+
+def is_mmcif_file(fileName):
+    return os.path.splitext(str(fileName))[1].lower() == ".cif"
+
+# Reads the first model of the structure from the path, binary/text stream or bytes.
+# The file name determines the format.
+def read_structure(source, fileName = None):
+    if fileName == None:
+        fileName = getattr(source, "name", "input.pdb") if hasattr(source, "read") else source
+    with open_structure_data(source) as data:
+        if is_mmcif_file(fileName):
+            return read_mmcif_data(data)
+        return read_pdb_data(data)
+
+# Generates the locations of the structure's atoms (ordered as in its atom tables) in the models
+# of the given range (start, end; end can be None). Only one model is held in memory at a time.
+# All the models must contain the same atom records as the first one.
+def read_frames(source, fileName, structure, frameRange):
+    # The models' generator holds a view of the memory-mapped data, so it is closed before the data
+    with open_structure_data(source) as data, contextlib.closing(iter_mmcif_models_coords(data) if is_mmcif_file(fileName)
+        else iter_pdb_models_coords(data)) as modelsCoords:
+        for modelIdx, modelCoords in enumerate(itertools.islice(modelsCoords, frameRange[0], frameRange[1])):
+            if len(modelCoords) != structure.recordsCount:
+                raise ValueError("Model " + str(frameRange[0] + modelIdx + 1) + " has different number of atoms than the first model.")
+            yield modelCoords[structure.atomSelection]
+
+# Loads the structure (file path or text stream) with atomium.
+# If fetch is true, the source is an ID (e.g., "1abc.mmtf") or URL fetched by atomium.
+def load_with_atomium(source, fetch = False):
+    import atomium # Using atomium library for PDB parsing; pip3 install atomium
+    import atomium.utilities
+
+    if fetch:
+        pdbFile = atomium.fetch(source)
+    elif hasattr(source, "read"):
+        # The name is used by atomium to determine the file format
+        pdbFile = atomium.utilities.parse_string(source.read(), str(getattr(source, "name", "input.pdb")))
+    else:
+        pdbFile = atomium.open(source)
+
+    model = pdbFile.model
+    chains = [(chain.id, AtomTable.from_residues(chain.residues())) for chain in model.chains()]
+    ligands = [AtomTable.from_residues([ligand]) for ligand in model.ligands()]
+    return PdbStructure(pdbFile.code, pdbFile.title, pdbFile.authors, chains, ligands)
+
+# Returns the given columns of the lines as an (n, colEnd - colStart) matrix of characters.
+# Characters beyond the line end are returned as spaces.
+def get_line_columns(data, lineStarts, lineEnds, colStart, colEnd):
+    width = colEnd - colStart
+    starts = lineStarts + colStart
+    chars = np.full((len(starts), width), ord(" "), dtype = np.uint8)
+    # Windows of the data are gathered at once except for the lines near the end of the data
+    inData = starts + width <= len(data)
+    if len(data) >= width:
+        chars[inData] = np.lib.stride_tricks.sliding_window_view(data, width)[starts[inData]]
+    for lineIdx in np.flatnonzero(~inData):
+        lineRest = data[starts[lineIdx]:]
+        chars[lineIdx, :len(lineRest)] = lineRest
+    chars[np.arange(colStart, colEnd) >= (lineEnds - lineStarts)[:, None]] = ord(" ")
+    return chars
+
+def get_string_column(chars, colStart, colEnd, strip = True):
+    column = np.ascontiguousarray(chars[:, colStart:colEnd]).view("S" + str(colEnd - colStart)).ravel()
+    return (np.char.strip(column) if strip else column).astype(str)
+
+def get_float_column(chars, colStart, colEnd, default):
+    column = np.ascontiguousarray(chars[:, colStart:colEnd]).view("S" + str(colEnd - colStart)).ravel()
+    isBlank = np.char.strip(column) == b""
+    return np.where(isBlank, default, np.where(isBlank, b"0", column).astype(float))
+
+# Returns the data as an array with the positions of the starts and ends of its lines and their record names
+def split_pdb_lines(data):
+    data = np.frombuffer(data, dtype = np.uint8)
+    lineEnds = np.flatnonzero(data == ord("\n"))
+    lineStarts = np.concatenate(([0], lineEnds + 1))
+    lineEnds = np.concatenate((lineEnds, [len(data)]))
+    if len(data) == 0:
+        lineStarts = lineEnds = np.zeros(0, dtype = int)
+    # Ignore '\r' of Windows line endings
+    hasCr = (lineEnds > lineStarts) & (data[np.maximum(lineEnds - 1, 0)] == ord("\r"))
+    lineEnds = lineEnds - hasCr
+
+    heads = np.ascontiguousarray(get_line_columns(data, lineStarts, lineEnds, 0, 6)).view("S6").ravel()
+    return (data, lineStarts, lineEnds, heads)
+
+def is_pdb_atom_record(heads):
+    return (heads == b"ATOM  ") | (heads == b"HETATM")
+
+def get_pdb_coords(chars):
+    return np.stack((get_float_column(chars, 30, 38, np.nan), get_float_column(chars, 38, 46, np.nan),
+        get_float_column(chars, 46, 54, np.nan)), axis = 1)
+
+# Generates the locations of all atom records of each model.
+# Models are delimited by ENDMDL records (models without atoms are skipped).
+def iter_pdb_models_coords(data):
+    data, lineStarts, lineEnds, heads = split_pdb_lines(data)
+    atomLines = np.flatnonzero(is_pdb_atom_record(heads))
+    modelEnds = np.flatnonzero(heads == b"ENDMDL")
+    modelBounds = np.searchsorted(atomLines, np.concatenate(([0], modelEnds, [len(heads)])))
+    for atomsFrom, atomsTo in zip(modelBounds[:-1], modelBounds[1:]):
+        if atomsTo > atomsFrom:
+            modelLines = atomLines[atomsFrom:atomsTo]
+            yield get_pdb_coords(get_line_columns(data, lineStarts[modelLines], lineEnds[modelLines], 0, 54))
+
+def read_pdb_data(data):
+    data, lineStarts, lineEnds, heads = split_pdb_lines(data)
+
+    # Only the first model is read
+    modelEnds = np.flatnonzero(heads == b"ENDMDL")
+    linesCount = modelEnds[0] if len(modelEnds) > 0 else len(heads)
+    terLines = np.flatnonzero(np.char.startswith(heads[:linesCount], b"TER"))
+    lastTerLine = terLines[-1] if len(terLines) > 0 else 0
+
+    atomLines = np.flatnonzero(is_pdb_atom_record(heads[:linesCount]))
+    chars = get_line_columns(data, lineStarts[atomLines], lineEnds[atomLines], 0, 80)
+
+    chainIds = get_string_column(chars, 21, 22, False)
+    resIds = np.char.add(np.char.add(np.char.add(chainIds, "."), get_string_column(chars, 22, 26)), get_string_column(chars, 26, 27))
+    elements = get_string_column(chars, 76, 78).astype(object)
+    elements[elements == ""] = None
+    resNames = get_string_column(chars, 17, 20)
+
+    atoms = {}
+    atoms["coords"] = get_pdb_coords(chars)
+    atoms["names"] = get_string_column(chars, 12, 16)
+    atoms["elements"] = elements
+    atoms["resNames"] = resNames
+    atoms["resIds"] = resIds
+    atoms["chainIds"] = chainIds
+    atoms["altLocs"] = get_string_column(chars, 16, 17)
+    atoms["occupancies"] = get_float_column(chars, 54, 60, 1.0)
+    atoms["isPolymer"] = atomLines < lastTerLine
+    # Only the unstripped name is compared by atomium
+    atoms["isWater"] = np.isin(get_string_column(chars, 17, 20, False), WATER_NAMES)
+
+    def get_records(recordName):
+        lines = np.flatnonzero(heads == recordName.ljust(6).encode("ascii"))
+        return [bytes(data[lineStarts[i]:lineEnds[i]]).decode("latin-1").rstrip() for i in lines]
+
+    header = get_records("HEADER")
+    code = header[0][62:66] if len(header) > 0 and len(header[0][62:66].strip()) > 0 else None
+    title = " ".join(line[10:].strip() for line in get_records("TITLE")) or None
+    authors = " ".join(line[10:].strip() for line in get_records("AUTHOR"))
+    authors = [author.strip() for author in authors.split(",")] if len(authors) > 0 else []
+
+    return build_structure(code, title, authors, atoms)
+
+MMCIF_TOKEN_REGEX = re.compile(rb"(?m)^;((?s:.*?))\n;|'(.*?)'(?=\s|$)|\"(.*?)\"(?=\s|$)|(#[^\n]*)|(\S+)")
+MMCIF_TAG_REGEX = re.compile(rb"\s*(_\S+)")
+MMCIF_LOOP_END_REGEX = re.compile(rb"(?m)^[ \t]*(?:loop_|_|#|data_)")
+MMCIF_VALUE_REGEX = re.compile(rb"(?m)'.*?'(?=\s|$)|\".*?\"(?=\s|$)|\S+")
+MMCIF_TEXT_FIELD_REGEX = re.compile(rb"(?m)#|^;")
+MMCIF_CATEGORIES = ["_entry", "_struct", "_audit_author", "_entity", "_struct_asym", "_atom_site"]
+
+def get_mmcif_token_value(match):
+    return next(group for group in match.group(1, 2, 3, 5) if group != None)
+
+def is_mmcif_keyword(match):
+    token = match.group(5)
+    return token != None and (token.startswith(b"_") or token == b"loop_" or token.startswith(b"data_"))
+
+# Reads the values of the loop starting at the given position.
+# Returns the values and the position after the loop.
+def read_mmcif_loop_values(data, pos):
+    endMatch = MMCIF_LOOP_END_REGEX.search(data, pos)
+    end = endMatch.start() if endMatch != None else len(data)
+    body = data[pos:end]
+
+    # Loop bodies without text fields or comments (typically, _atom_site) are split into values at once
+    if MMCIF_TEXT_FIELD_REGEX.search(body) == None:
+        if body.find(b"'") < 0 and body.find(b"\"") < 0:
+            return (body.split(), end)
+        return ([value[1:-1] if value[:1] in [b"'", b"\""] else value for value in MMCIF_VALUE_REGEX.findall(body)], end)
+
+    values = []
+    while True:
+        match = MMCIF_TOKEN_REGEX.search(data, pos)
+        if match == None or is_mmcif_keyword(match):
+            break
+        pos = match.end()
+        if match.group(4) == None:
+            values.append(get_mmcif_token_value(match))
+    return (values, pos)
+
+# Reads the values of the given categories of the first data block.
+# Returns dictionary mapping the categories to dictionaries of item name -> list of values (bytes).
+def read_mmcif_categories(data, categories):
+    result = {}
+    pendingTag = None
+    blocksCount = 0
+    pos = 0
+
+    def store(tag, values):
+        category, item = tag.decode("latin-1").split(".", 1)
+        if category in categories:
+            result.setdefault(category, {})[item] = values
+
+    while True:
+        match = MMCIF_TOKEN_REGEX.search(data, pos)
+        if match == None:
+            break
+        pos = match.end()
+        token = match.group(5)
+
+        if match.group(4) != None:
+            continue
+        elif token != None and token.startswith(b"data_"):
+            blocksCount += 1
+            if blocksCount > 1:
+                break
+        elif token == b"loop_":
+            loopTags = []
+            tagMatch = MMCIF_TAG_REGEX.match(data, pos)
+            while tagMatch != None:
+                loopTags.append(tagMatch.group(1))
+                pos = tagMatch.end()
+                tagMatch = MMCIF_TAG_REGEX.match(data, pos)
+            values, pos = read_mmcif_loop_values(data, pos)
+            for idx, tag in enumerate(loopTags):
+                store(tag, values[idx::len(loopTags)])
+        elif token != None and token.startswith(b"_"):
+            pendingTag = token
+        elif pendingTag != None:
+            store(pendingTag, [get_mmcif_token_value(match)])
+            pendingTag = None
+
+    return result
+
+# Converts the values to an array of strings. Unknown ('?') and inapplicable ('.') values are replaced by the default.
+def decode_mmcif_values(values, default = ""):
+    column = np.array(values, dtype = "S")
+    isNull = (column == b"?") | (column == b".")
+    column = column.astype(str)
+    column[isNull] = default
+    return column
+
+# Generates the locations of all atoms of each model.
+# Unlike PDB files, the whole atom_site category is parsed at once.
+def iter_mmcif_models_coords(data):
+    atomSite = read_mmcif_categories(data, ["_atom_site"]).get("_atom_site", {})
+    if "Cartn_x" not in atomSite:
+        return
+    modelNums = decode_mmcif_values(atomSite["pdbx_PDB_model_num"]) if "pdbx_PDB_model_num" in atomSite else \
+        np.full(len(atomSite["Cartn_x"]), "")
+    coords = np.stack([np.array(atomSite[item], dtype = "S").astype(float) for item in ["Cartn_x", "Cartn_y", "Cartn_z"]], axis = 1)
+    _, firstIdx = np.unique(modelNums, return_index = True)
+    for modelNum in modelNums[np.sort(firstIdx)]:
+        yield coords[modelNums == modelNum]
+
+def read_mmcif_data(data):
+    categories = read_mmcif_categories(data, MMCIF_CATEGORIES)
+    atomSite = categories.get("_atom_site", {})
+    atomsCount = len(next(iter(atomSite.values()))) if len(atomSite) > 0 else 0
+    # Only the first model is read
+    inModel = np.ones(atomsCount, dtype = bool)
+
+    def get_column(item, default = ""):
+        if item not in atomSite:
+            return np.full(np.count_nonzero(inModel), default)
+        return decode_mmcif_values(atomSite[item], default)[inModel]
+
+    def get_category_column(category, item):
+        return decode_mmcif_values(categories.get(category, {}).get(item, [])).tolist()
+
+    modelNums = get_column("pdbx_PDB_model_num")
+    if atomsCount > 0:
+        inModel = modelNums == modelNums[0]
+
+    # Type of the entity of each atom determines if it belongs to polymer chain, ligand or water
+    entityTypes = dict(zip(get_category_column("_entity", "id"), get_category_column("_entity", "type")))
+    asymEntities = dict(zip(get_category_column("_struct_asym", "id"), get_category_column("_struct_asym", "entity_id")))
+    if len(entityTypes) > 0:
+        asymTypes = {asymId: entityTypes.get(entityId, "") for asymId, entityId in asymEntities.items()}
+        molTypes = np.array([asymTypes.get(asymId, "") for asymId in get_column("label_asym_id")], dtype = str)
+        isPolymer = np.isin(molTypes, ["polymer", "branched"])
+        isWater = molTypes == "water"
+    else:
+        # Without entities, atoms of residues having a sequence ID are considered to be polymer ones
+        isPolymer = get_column("label_seq_id") != ""
+        isWater = np.isin(get_column("auth_comp_id"), WATER_NAMES)
+
+    chainIds = get_column("auth_asym_id")
+    resIds = np.char.add(np.char.add(np.char.add(chainIds, "."), get_column("auth_seq_id")), get_column("pdbx_PDB_ins_code"))
+    # Like atomium, unknown ('?') and inapplicable ('.') element symbols are kept as they are
+    if "type_symbol" in atomSite:
+        elements = np.array(atomSite["type_symbol"], dtype = "S").astype(str)[inModel].astype(object)
+    else:
+        elements = np.full(np.count_nonzero(inModel), None, dtype = object)
+
+    atoms = {}
+    atoms["coords"] = np.stack((get_column("Cartn_x").astype(float), get_column("Cartn_y").astype(float),
+        get_column("Cartn_z").astype(float)), axis = 1).reshape(-1, 3)
+    atoms["names"] = get_column("label_atom_id")
+    atoms["elements"] = elements
+    atoms["resNames"] = get_column("auth_comp_id")
+    atoms["resIds"] = resIds
+    atoms["chainIds"] = chainIds
+    atoms["altLocs"] = get_column("label_alt_id")
+    atoms["occupancies"] = get_column("occupancy", "1").astype(float)
+    atoms["isPolymer"] = isPolymer
+    atoms["isWater"] = isWater
+
+    def get_single_value(category, item):
+        values = categories.get(category, {}).get(item, [])
+        return values[0].decode("latin-1") if len(values) > 0 and values[0] not in [b"?", b"."] else None
+
+    code = get_single_value("_entry", "id")
+    title = get_single_value("_struct", "title")
+    authors = get_category_column("_audit_author", "name")
+
+    return build_structure(code, title, authors, atoms)
+
+# For residues containing atoms with partial occupancy, keeps only the atoms
+# without alternate location or with the first alternate location of the residue
+def get_alt_loc_mask(groupOfAtom, groupsCount, altLocs, occupancies):
+    hasPartial = np.zeros(groupsCount, dtype = bool)
+    np.logical_or.at(hasPartial, groupOfAtom, occupancies < 1)
+
+    # Alternate locations are compared by their order
+    _, altCodes = np.unique(altLocs, return_inverse = True)
+    altCodes = altCodes.ravel()
+    hasAlt = altLocs != ""
+    firstAlt = np.full(groupsCount, np.iinfo(int).max)
+    np.minimum.at(firstAlt, groupOfAtom[hasAlt], altCodes[hasAlt])
+    firstAlt[~hasPartial] = -1
+
+    return (occupancies == 1) | ~hasAlt | (altCodes == firstAlt[groupOfAtom])
+
+def get_atom_groups(atoms):
+    groupKeys = np.char.add(np.where(atoms["isPolymer"], "P", "N"), atoms["resIds"])
+    _, firstIdx, groupOfAtom = np.unique(groupKeys, return_index = True, return_inverse = True)
+    return (firstIdx, groupOfAtom.ravel())
+
+# Groups the atom records (dictionary of per-atom arrays) into residues, polymer chains and ligands.
+# Chains, residues and atoms keep the order of their first appearance in the file.
+def build_structure(code, title, authors, atoms):
+    recordsCount = len(atoms["names"])
+    atoms["recordIdx"] = np.arange(recordsCount)
+    keep = atoms["isPolymer"] | ~atoms["isWater"]
+    atoms = {key: column[keep] for key, column in atoms.items()}
+    firstIdx, groupOfAtom = get_atom_groups(atoms)
+    keep = get_alt_loc_mask(groupOfAtom, len(firstIdx), atoms["altLocs"], atoms["occupancies"])
+    atoms = {key: column[keep] for key, column in atoms.items()}
+    firstIdx, groupOfAtom = get_atom_groups(atoms)
+
+    # Polymer residues are ordered by their chain first, ligands come last
+    groupIsPolymer = atoms["isPolymer"][firstIdx]
+    polymerGroups = np.flatnonzero(groupIsPolymer)
+    chainNames, chainOfGroup = np.unique(atoms["chainIds"][firstIdx[polymerGroups]], return_inverse = True)
+    chainStarts = np.full(len(chainNames), len(groupOfAtom))
+    np.minimum.at(chainStarts, chainOfGroup.ravel(), firstIdx[polymerGroups])
+
+    groupChainStarts = np.full(len(firstIdx), len(groupOfAtom))
+    groupChainStarts[polymerGroups] = chainStarts[chainOfGroup.ravel()]
+    groupOrder = np.lexsort((firstIdx, groupChainStarts, ~groupIsPolymer))
+    groupRank = np.empty(len(firstIdx), dtype = int)
+    groupRank[groupOrder] = np.arange(len(firstIdx))
+
+    atomOrder = np.argsort(groupRank[groupOfAtom], kind = "stable")
+    atoms = {key: column[atomOrder] for key, column in atoms.items()}
+    atomRanks = groupRank[groupOfAtom][atomOrder]
+    groupOffsets = np.searchsorted(atomRanks, np.arange(len(firstIdx) + 1))
+
+    # The first atom of each residue determines its name and ID
+    def create_table(firstRank, endRank):
+        atomsFrom = groupOffsets[firstRank]
+        atomsTo = groupOffsets[endRank]
+        resFirstAtoms = groupOffsets[firstRank:endRank]
+        return AtomTable(atoms["coords"][atomsFrom:atomsTo], atoms["names"][atomsFrom:atomsTo],
+            atoms["elements"][atomsFrom:atomsTo], atomRanks[atomsFrom:atomsTo] - firstRank,
+            atoms["resNames"][resFirstAtoms].tolist(), atoms["resIds"][resFirstAtoms].tolist(), atomsFrom)
+
+    chains = []
+    orderedChainStarts = groupChainStarts[groupOrder[:len(polymerGroups)]]
+    chainBounds = np.flatnonzero(np.diff(orderedChainStarts)) + 1
+    chainBounds = np.concatenate(([0], chainBounds, [len(polymerGroups)])) if len(polymerGroups) > 0 else []
+    for firstRank, endRank in zip(chainBounds[:-1], chainBounds[1:]):
+        chainId = str(atoms["chainIds"][groupOffsets[firstRank]])
+        chains.append((chainId, create_table(firstRank, endRank)))
+
+    ligands = [create_table(rank, rank + 1) for rank in range(len(polymerGroups), len(firstIdx))]
+
+    return PdbStructure(code, title, authors, chains, ligands, atoms["recordIdx"], recordsCount)
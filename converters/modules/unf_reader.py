@@ -0,0 +1,467 @@
+import os
+import re
+import sys
+import json
+import mmap
+import shutil
+import tempfile
+import numpy as np
+
+import modules.unf_utils as unfutils
+
+# Reading of UNF files (JSON core and included files) and the binary coordinates extension.
+
+# Optional index of the included files stored in the "misc" object of the JSON core:
+# "includedFilesIndex": [{ "name": <file name>, "offset": <int>, "length": <int>, "hash": <MD5 hash> }, ...]
+# Offsets are byte offsets of the files' contents relative to the beginning of the first
+# "#INCLUDED_FILE" line, so they do not change when the JSON core is rewritten.
+# Lengths (in bytes) do not include the line break preceding the next "#INCLUDED_FILE" line
+# nor the line break ending the UNF file (written after the last file's content).
+# If the index is missing or does not match the file, it is rebuilt by scanning the file.
+INCLUDED_FILES_INDEX_KEY = "includedFilesIndex"
+# Coordinates can be stored in a binary included file instead of JSON arrays (see BinaryCoordinatesWriter).
+# Objects whose coordinates are stored this way list the references to them in the BINARY_COORDINATES_KEY member:
+# "binaryCoordinates": [{ "fileId": <external file ID>, "offset": <byte offset in the file>, "shape": [<int>, ...],
+#   "member": <name of the coordinates' member>, "items": <name of the array of items> (optional),
+#   "fields": [<names of the vectors>, ...] (optional) }, ...]
+# If "items" is given, the first dimension of the array corresponds to the items of the object's array
+# and each item's member holds its part of the coordinates. If "fields" are given, the second-to-last
+# dimension is stored as objects with the vectors under these names (e.g., nucleotide positions).
+BINARY_COORDINATES_KEY = "binaryCoordinates"
+BINARY_COORDINATES_DTYPE = np.dtype("<f4")
+BINARY_COORDINATES_FILE_NAME = "coordinates.f32"
+NUCLEOTIDE_POSITION_FIELDS = ["nucleobaseCenter", "backboneCenter", "baseNormal", "hydrogenFaceDir"]
+
+# Loads only the JSON core of the UNF given as a path, stream or dict.
+# Paths and binary streams are read only up to the first included file.
+def load_unf_core(source):
+    if isinstance(source, dict):
+        return source
+    elif not unfutils.is_stream(source) and unfutils.get_file_compression(source) == None:
+        with UnfReader(source) as reader:
+            return reader.get_core()
+    elif unfutils.is_stream(source) and isinstance(source.read(0), str) and not hasattr(source, "buffer"):
+        return unfutils.load_unf_input(source)[0]
+    elif unfutils.is_stream(source) and isinstance(source.read(0), str):
+        source = source.buffer
+    # Compressed files are decompressed only up to the first included file
+    with unfutils.open_binary_input(source) as infile:
+        return read_unf_core(infile)[0]
+
+# Reads the binary stream up to the first included file. Returns the parsed JSON core
+# and the byte position of the first "#INCLUDED_FILE" line (None if no file is included).
+def read_unf_core(infile):
+    chunks = []
+    readLength = 0
+    tail = b""
+    while True:
+        chunk = infile.read(unfutils.READ_CHUNK_SIZE)
+        if not chunk:
+            return (unfutils.json_loads(b"".join(chunks)), None)
+        # The tag may be split between two chunks
+        window = tail + chunk
+        tagIdx = window.find(unfutils.INCLUDED_FILE_TAG_BYTES)
+        chunks.append(chunk)
+        if tagIdx > -1:
+            includedStart = readLength - len(tail) + tagIdx
+            return (unfutils.json_loads(b"".join(chunks)[0:includedStart]), includedStart)
+        readLength += len(chunk)
+        tail = window[-(len(unfutils.INCLUDED_FILE_TAG_BYTES) - 1):]
+
+# Generates the positions of all occurrences of the pattern in the binary stream (from the given position)
+def find_all_in_stream(infile, pattern, start = 0):
+    infile.seek(start)
+    windowStart = start
+    window = b""
+    while True:
+        chunk = infile.read(unfutils.READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        window += chunk
+        idx = window.find(pattern)
+        while idx > -1:
+            yield windowStart + idx
+            idx = window.find(pattern, idx + 1)
+        # Keep the end of the window which could be the beginning of a pattern split between chunks
+        keptFrom = max(0, len(window) - len(pattern) + 1)
+        windowStart += keptFrom
+        window = window[keptFrom:]
+
+def create_included_file_entry(name, offset, length, fileHash):
+    return {"name": name, "offset": offset, "length": length, "hash": fileHash}
+
+def get_included_file_tag_line(name):
+    return unfutils.INCLUDED_FILE_TAG_BYTES + name.encode("utf-8") + b"\n"
+
+# Creates the index of the included files given as (name, length, hash) tuples in the order they are written
+def create_included_files_index(files):
+    entries = []
+    sectionStart = 0
+    for name, length, fileHash in files:
+        offset = sectionStart + len(get_included_file_tag_line(name))
+        entries.append(create_included_file_entry(name, offset, length, fileHash))
+        sectionStart = offset + length + 1
+    return entries
+
+def get_stream_size(infile):
+    infile.seek(0, os.SEEK_END)
+    return infile.tell()
+
+# Builds the index of the included files by scanning the binary stream for "#INCLUDED_FILE" lines.
+# Hashes are taken from the external files of the JSON core.
+def scan_included_files(infile, includedStart, externalFiles = []):
+    if includedStart == None:
+        return []
+    hashes = {extFile["path"]: extFile.get("hash") for extFile in externalFiles if extFile.get("isIncluded")}
+    tagPositions = [includedStart] + [pos + 1 for pos in find_all_in_stream(infile, b"\n" + unfutils.INCLUDED_FILE_TAG_BYTES, includedStart)]
+    fileEnd = get_stream_size(infile)
+    # The line break ending the UNF file is not a part of the last file (see INCLUDED_FILES_INDEX_KEY)
+    infile.seek(fileEnd - 1)
+    if infile.read(1) == b"\n":
+        fileEnd -= 1
+
+    entries = []
+    for i, tagPos in enumerate(tagPositions):
+        infile.seek(tagPos)
+        tagLine = infile.readline()
+        name = tagLine[len(unfutils.INCLUDED_FILE_TAG_BYTES):].decode("utf-8").strip()
+        contentStart = tagPos + len(tagLine)
+        contentEnd = tagPositions[i + 1] - 1 if i + 1 < len(tagPositions) else fileEnd
+        entries.append(create_included_file_entry(name, contentStart - includedStart, max(0, contentEnd - contentStart), hashes.get(name)))
+    return entries
+
+# Checks that the index describes exactly the "#INCLUDED_FILE" sections of the binary stream
+def is_included_files_index_valid(infile, includedStart, entries):
+    if includedStart == None or len(entries) == 0:
+        return includedStart == None and len(entries) == 0
+    sectionStart = 0
+    for entry in entries:
+        tagLine = get_included_file_tag_line(entry["name"])
+        if entry["offset"] != sectionStart + len(tagLine):
+            return False
+        infile.seek(includedStart + sectionStart)
+        if infile.read(len(tagLine)) != tagLine:
+            return False
+        # The next section starts after the line break
+        sectionStart = entry["offset"] + entry["length"] + 1
+    # The file may end with a line break after the content of the last file
+    fileEnd = get_stream_size(infile)
+    if fileEnd == includedStart + sectionStart:
+        infile.seek(fileEnd - 1)
+        return infile.read(1) == b"\n"
+    return fileEnd == includedStart + sectionStart - 1
+
+# Returns the end of the content of the last included file relative to the first "#INCLUDED_FILE" line,
+# i.e., without the line break ending the UNF file (see INCLUDED_FILES_INDEX_KEY)
+def get_included_files_end(entries):
+    return entries[-1]["offset"] + entries[-1]["length"] if len(entries) > 0 else 0
+
+# Returns the parsed JSON core of the UNF (path or seekable binary stream), the byte position
+# of its included files and their index (see INCLUDED_FILES_INDEX_KEY). The stored index is used
+# if it matches the file, otherwise it is rebuilt by a scan of the file.
+def read_included_files_index(source):
+    with unfutils.open_binary_input(source) as infile:
+        parsedData, includedStart = read_unf_core(infile)
+        return (parsedData, includedStart, get_included_files_index(infile, parsedData, includedStart))
+
+def get_included_files_index(infile, parsedData, includedStart):
+    entries = parsedData.get("misc", {}).get(INCLUDED_FILES_INDEX_KEY)
+    if entries == None or not is_included_files_index_valid(infile, includedStart, entries):
+        entries = scan_included_files(infile, includedStart, parsedData.get("externalFiles", []))
+    return entries
+
+# Returns the content (bytes) of the included file of the given name.
+# Only the JSON core and the requested file are read if the UNF has a valid index.
+def read_included_file(source, name):
+    with unfutils.open_binary_input(source) as infile:
+        parsedData, includedStart, entries = read_included_files_index(infile)
+        entry = next((entry for entry in entries if entry["name"] == name), None)
+        if entry == None:
+            raise KeyError("File " + name + " is not included in the UNF.")
+        infile.seek(includedStart + entry["offset"])
+        return infile.read(entry["length"])
+
+# Reader of UNF files which memory-maps the file and parses only what is requested:
+# the JSON core (get_core), the included files (get_included_file) as lazy views of the mapped file,
+# or individual structures/strands (iter_structures, iter_na_strands) without parsing the whole core.
+# Views returned by the included files must be released before the reader is closed.
+# Compressed files are decompressed into a temporary file first.
+class UnfReader:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        # Compressed files are decompressed into a temporary file which is mapped instead
+        compression = unfutils.get_stream_compression(self.file)
+        if compression != None:
+            compressedFile = self.file
+            self.file = tempfile.TemporaryFile()
+            with compressedFile, unfutils.open_compressed_file(compressedFile, compression, "rb") as infile:
+                shutil.copyfileobj(infile, self.file, unfutils.READ_CHUNK_SIZE)
+            self.file.flush()
+        if os.fstat(self.file.fileno()).st_size == 0:
+            self.file.close()
+            raise ValueError("UNF file " + str(path) + " is empty.")
+        self.data = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        includedStart = self.data.find(unfutils.INCLUDED_FILE_TAG_BYTES)
+        self.includedStart = includedStart if includedStart > -1 else None
+        self.coreText = None
+        self.core = None
+        self.includedFilesIndex = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def get_core_end(self):
+        return self.includedStart if self.includedStart != None else len(self.data)
+
+    def get_core_text(self):
+        if self.coreText == None:
+            self.coreText = self.data[0:self.get_core_end()].decode("utf-8")
+        return self.coreText
+
+    def get_core(self):
+        if self.core == None:
+            self.core = unfutils.json_loads(self.get_core_text())
+        return self.core
+
+    def get_included_files_index(self):
+        if self.includedFilesIndex == None:
+            self.includedFilesIndex = get_included_files_index(self.data, self.get_core(), self.includedStart)
+        return self.includedFilesIndex
+
+    def get_included_files(self):
+        return [IncludedFile(self, entry) for entry in self.get_included_files_index()]
+
+    def get_included_file(self, name):
+        entry = next((entry for entry in self.get_included_files_index() if entry["name"] == name), None)
+        if entry == None:
+            raise KeyError("File " + name + " is not included in the UNF.")
+        return IncludedFile(self, entry)
+
+    # Returns the coordinates referenced by the object's BINARY_COORDINATES_KEY member as a read-only NumPy array.
+    # The data are copied from the mapped file, so the arrays can outlive the reader (e.g., in lazy generators).
+    def get_binary_coordinates(self, ref):
+        extFile = next((extFile for extFile in self.get_core()["externalFiles"] if extFile["id"] == ref["fileId"]), None)
+        if extFile == None:
+            raise KeyError("External file " + str(ref["fileId"]) + " with binary coordinates does not exist.")
+        includedFile = self.get_included_file(extFile["path"])
+        count = int(np.prod(ref["shape"]))
+        if ref["offset"] + count * BINARY_COORDINATES_DTYPE.itemsize > includedFile.length:
+            raise ValueError("Binary coordinates exceed the included file " + includedFile.name + ".")
+        start = includedFile.start + ref["offset"]
+        data = self.data[start:start + count * BINARY_COORDINATES_DTYPE.itemsize]
+        return np.frombuffer(data, BINARY_COORDINATES_DTYPE).reshape(ref["shape"])
+
+    # Generates the structures one by one
+    def iter_structures(self):
+        return iter_json_members(self.get_core_text(), {"structures": parse_json_array_values})
+
+    # Generates the nucleic acid strands of all structures one by one
+    def iter_na_strands(self):
+        def parse_structure(text, pos):
+            return (yield from parse_json_object(text, pos, {"naStrands": parse_json_array_values}))
+        return iter_json_members(self.get_core_text(), {"structures": lambda text, pos: parse_json_array(text, pos, parse_structure)})
+
+# Included file of UnfReader. The content is read from the mapped file only when accessed.
+class IncludedFile:
+    def __init__(self, reader, entry):
+        self.reader = reader
+        self.name = entry["name"]
+        self.hash = entry["hash"]
+        self.start = reader.includedStart + entry["offset"]
+        self.length = entry["length"]
+
+    # Zero-copy view of the content (must be released before the reader is closed)
+    def get_view(self):
+        return memoryview(self.reader.data)[self.start:self.start + self.length]
+
+    def get_bytes(self):
+        return self.reader.data[self.start:self.start + self.length]
+
+    def get_text(self):
+        return self.get_bytes().decode("utf-8")
+
+    # Checks the content against the stored hash
+    def verify(self):
+        hasher = unfutils.IncludedFileHasher()
+        for chunkStart in range(self.start, self.start + self.length, unfutils.READ_CHUNK_SIZE):
+            hasher.update(self.reader.data[chunkStart:min(chunkStart + unfutils.READ_CHUNK_SIZE, self.start + self.length)])
+        return hasher.hexdigest() == self.hash
+
+# Collects coordinates as packed little-endian float32 arrays which are appended to the UNF as an included file
+# after the JSON core (see BINARY_COORDINATES_KEY). The data are kept in a temporary file until then.
+class BinaryCoordinatesWriter:
+    def __init__(self, fileId, name = BINARY_COORDINATES_FILE_NAME):
+        self.fileId = fileId
+        self.name = name
+        self.file = tempfile.TemporaryFile()
+        self.hasher = unfutils.IncludedFileHasher()
+        self.length = 0
+
+    def __repr__(self):
+        return "BinaryCoordinatesWriter(" + self.name + ", " + str(self.length) + " B)"
+
+    # Stores the coordinates and returns the reference to them (see BINARY_COORDINATES_KEY)
+    def add(self, coordinates, member, items = None, fields = None):
+        data = np.ascontiguousarray(coordinates, dtype = BINARY_COORDINATES_DTYPE)
+        ref = {"fileId": self.fileId, "offset": self.length, "shape": list(data.shape), "member": member}
+        if items != None:
+            ref["items"] = items
+        if fields != None:
+            ref["fields"] = fields
+        chunk = data.tobytes()
+        self.file.write(chunk)
+        self.hasher.update(chunk)
+        self.length += len(chunk)
+        return ref
+
+    # External file entry whose hash is known only after all coordinates are added
+    def get_external_file(self):
+        return {"id": self.fileId, "path": self.name, "isIncluded": True, "hash": unfutils.DeferredValue(self.hasher.hexdigest, 34)}
+
+    def get_included_files_index(self):
+        return create_included_files_index([(self.name, self.length, self.hasher.hexdigest())])
+
+    # Width of the index's placeholder (see unfutils.DeferredValue) fitting any length of the file
+    def get_included_files_index_width(self):
+        return len(unfutils.json_dumps(create_included_files_index([(self.name, sys.maxsize, "0" * 32)])))
+
+    # Appends the included file to the text output (a file or a stream with an underlying binary buffer).
+    # The UNF file ends with a line break after the binary content.
+    def write_included_file(self, outfile):
+        if not hasattr(outfile, "buffer"):
+            raise ValueError("Binary coordinates can be written only to files or streams with a binary buffer.")
+        outfile.write("\n" + unfutils.INCLUDED_FILE_TAG + self.name + "\n")
+        outfile.flush()
+        self.file.seek(0)
+        shutil.copyfileobj(self.file, outfile.buffer, unfutils.READ_CHUNK_SIZE)
+        outfile.buffer.write(b"\n")
+        outfile.buffer.flush()
+
+    def close(self):
+        self.file.close()
+
+# Returns the coordinates (NumPy array) in the plain JSON layout
+def binary_coordinates_to_json(coordinates, fields = None):
+    if fields == None:
+        return coordinates.tolist()
+    return [dict(zip(fields, vectors)) for vectors in coordinates.reshape(-1, *coordinates.shape[-2:]).tolist()]
+
+def generate_items_with_coordinates(items, member, coordinates, fields):
+    for item, itemCoordinates in zip(items, coordinates):
+        item[member] = binary_coordinates_to_json(itemCoordinates, fields)
+        yield item
+
+def find_binary_coordinates_owners(value):
+    if isinstance(value, dict):
+        if BINARY_COORDINATES_KEY in value:
+            yield value
+        for item in value.values():
+            yield from find_binary_coordinates_owners(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from find_binary_coordinates_owners(item)
+
+# Replaces the references to binary coordinates in the parsed document by the coordinates in the plain JSON layout.
+# The function returns the array of the given reference (e.g., UnfReader.get_binary_coordinates).
+# Arrays of items are expanded lazily (as generators), so the document is meant to be written by JsonStreamWriter
+# (see stream_object_arrays). Returns the IDs of the external files holding the coordinates.
+def expand_binary_coordinates(document, get_coordinates):
+    fileIds = set()
+    for owner in list(find_binary_coordinates_owners(document)):
+        for ref in owner.pop(BINARY_COORDINATES_KEY):
+            fileIds.add(ref["fileId"])
+            coordinates = get_coordinates(ref)
+            if "items" in ref:
+                owner[ref["items"]] = generate_items_with_coordinates(owner[ref["items"]], ref["member"], coordinates, ref.get("fields"))
+            else:
+                owner[ref["member"]] = binary_coordinates_to_json(coordinates, ref.get("fields"))
+    return fileIds
+
+# Replaces (in place) the arrays of objects of the document by iterators, so that the objects
+# containing generators can be written by JsonStreamWriter
+def stream_object_arrays(document):
+    for key, value in document.items():
+        if isinstance(value, dict):
+            stream_object_arrays(value)
+        elif isinstance(value, list) and any(isinstance(item, dict) for item in value):
+            for item in value:
+                if isinstance(item, dict):
+                    stream_object_arrays(item)
+            document[key] = iter(value)
+    return document
+
+# Incremental parsing of JSON text. The parse_* functions are generators yielding values
+# found inside of the JSON value starting at the given position and returning the position after it.
+JSON_DECODER = json.JSONDecoder()
+JSON_WHITESPACE_REGEX = re.compile(r"[ \t\n\r]*")
+
+def skip_json_whitespace(text, pos):
+    return JSON_WHITESPACE_REGEX.match(text, pos).end()
+
+def parse_json_value(text, pos):
+    value, pos = JSON_DECODER.raw_decode(text, pos)
+    yield value
+    return pos
+
+# Skips the value (it is parsed but not kept)
+def skip_json_value(text, pos):
+    return JSON_DECODER.raw_decode(text, pos)[1]
+    yield
+
+# Parses the array elements with the given function
+def parse_json_array(text, pos, parse_element):
+    pos = skip_json_whitespace(text, pos + 1)
+    if text[pos] == "]":
+        return pos + 1
+    while True:
+        pos = yield from parse_element(text, skip_json_whitespace(text, pos))
+        pos = skip_json_whitespace(text, pos)
+        if text[pos] == "]":
+            return pos + 1
+        pos += 1
+
+def parse_json_array_values(text, pos):
+    return (yield from parse_json_array(text, pos, parse_json_value))
+
+# Parses the object's members of the given names with the given functions, other members are skipped
+def parse_json_object(text, pos, parseMembers):
+    pos = skip_json_whitespace(text, pos + 1)
+    if text[pos] == "}":
+        return pos + 1
+    while True:
+        key, pos = JSON_DECODER.raw_decode(text, skip_json_whitespace(text, pos))
+        pos = skip_json_whitespace(text, skip_json_whitespace(text, pos) + 1)
+        pos = yield from parseMembers.get(key, skip_json_value)(text, pos)
+        pos = skip_json_whitespace(text, pos)
+        if text[pos] == "}":
+            return pos + 1
+        pos += 1
+
+# Generates the values found by the functions parsing the members of the top-level object
+def iter_json_members(text, parseMembers):
+    yield from parse_json_object(text, skip_json_whitespace(text, 0), parseMembers)
+
+# Writes the UNF document with the coordinates collected by the BinaryCoordinatesWriter during the writing
+# as its only included file. Coordinates stored in the binary file are not rounded.
+def output_unf_document_with_binary_coordinates(unfFileData, idGenerator, output, stats, binaryCoordinates):
+    if output == None:
+        raise ValueError("Binary coordinates require an output file.")
+    unfFileData["externalFiles"] = iter(unfFileData["externalFiles"] + [binaryCoordinates.get_external_file()])
+    unfFileData["misc"][INCLUDED_FILES_INDEX_KEY] = unfutils.DeferredValue(binaryCoordinates.get_included_files_index,
+        binaryCoordinates.get_included_files_index_width())
+    try:
+        with stats.phase("serialization"), unfutils.open_text_output(output) as outfile:
+            unfutils.write_unf_stream(outfile, unfFileData, idGenerator)
+            binaryCoordinates.write_included_file(outfile)
+    finally:
+        binaryCoordinates.close()
+    stats.count("binaryCoordinatesBytes", binaryCoordinates.length)
+    return None
@@ -1,6 +1,24 @@
 import datetime
+import threading
+import time
+import os
+import json
+import gzip
+import lzma
+import shutil
+import hashlib
+import tempfile
+import tracemalloc
+import contextlib
+import collections.abc
 import numpy as np
 
+# orjson is used for reading and writing JSON if it is installed (see set_json_backend)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 DNA_PDB_BASES = ["DA", "DG", "DT", "DC", "DU"]
 
 RNA_PDB_BASES = ["A", "G", "T", "C", "U"]
@@ -11,6 +29,162 @@ AA_PDB_RESNAMES = ["HIS", "ARG", "LYS", "ILE", "PHE", "LEU", "TRP"
 
 NUCLEOBASE_RING_COMMON_ATOMS = ["C2", "C4", "C5", "C6", "N1", "N3"]
 
+INCLUDED_FILE_TAG = "#INCLUDED_FILE "
+INCLUDED_FILE_TAG_BYTES = INCLUDED_FILE_TAG.encode("ascii")
+
+# Included files may contain binary data. Their text (see load_unf_input) keeps the bytes which
+# are not valid UTF-8 as surrogates so that they are written back unchanged (see write_included_files_text).
+INCLUDED_FILES_ERRORS = "surrogateescape"
+
+# Members holding coordinates which are rounded when the output precision is set
+# (directions stored among the positions keep their full precision)
+COORDINATE_KEYS = {"altPositions", "positions", "position"}
+DIRECTION_KEYS = {"baseNormal", "hydrogenFaceDir"}
+
+# Verbosity levels of the converters' console output
+VERBOSITY_QUIET = 0     # errors only
+VERBOSITY_SUMMARY = 1   # summary of the processed data
+VERBOSITY_DETAILED = 2  # one line per processed object (helix, strand, chain, ...)
+
+# Allocates unique UNF IDs. The allocator can be shared between threads
+# and can reserve contiguous blocks of IDs, e.g., for data processed in another process
+# which are later renumbered by the block's starting ID.
+class IdGenerator:
+    def __init__(self, firstId = 0):
+        self.nextId = firstId
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "IdGenerator(" + str(self.nextId) + ")"
+
+    def get_next_id(self):
+        return self.reserve_block(1)
+
+    # Returns the first ID of a block of "count" consecutive IDs
+    def reserve_block(self, count):
+        with self.lock:
+            firstId = self.nextId
+            self.nextId += count
+        return firstId
+
+    # Value since which it is safe to assign new IDs, i.e., the UNF idCounter
+    def get_id_counter(self):
+        with self.lock:
+            return self.nextId
+
+# Collects timing, memory and object counts of the individual conversion phases
+# and controls the amount of printed progress information.
+# Memory is traced (via tracemalloc) only if requested as it slows down the conversion.
+class ConversionStats:
+    def __init__(self, converterName, verbosity = VERBOSITY_DETAILED, traceMemory = False):
+        self.converterName = converterName
+        self.verbosity = verbosity
+        self.traceMemory = traceMemory
+        self.phases = {}
+        self.counters = {}
+        self.openPhases = []
+        self.startTime = time.perf_counter()
+        if traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def __repr__(self):
+        return "ConversionStats(" + self.converterName + ")"
+
+    # Times the enclosed block. Repeated phases of the same name are accumulated.
+    # Phases may be nested (e.g., when the data are produced while being serialized).
+    @contextlib.contextmanager
+    def phase(self, name):
+        phaseRecord = self.phases.setdefault(name, {"seconds": 0.0, "calls": 0, "peakMemoryBytes": 0})
+        self.update_open_phases_peak()
+        self.openPhases.append(phaseRecord)
+        phaseStart = time.perf_counter()
+        try:
+            yield
+        finally:
+            phaseRecord["seconds"] += time.perf_counter() - phaseStart
+            phaseRecord["calls"] += 1
+            self.update_open_phases_peak()
+            self.openPhases.pop()
+
+    # Folds the memory peak since the last reset into all currently open phases
+    def update_open_phases_peak(self):
+        if not self.traceMemory:
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        for phaseRecord in self.openPhases:
+            phaseRecord["peakMemoryBytes"] = max(phaseRecord["peakMemoryBytes"], peak)
+        tracemalloc.reset_peak()
+
+    def count(self, name, amount = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Adds phases and counters gathered by another (e.g., worker process') stats object
+    def merge(self, other):
+        for name, otherRecord in other.phases.items():
+            phaseRecord = self.phases.setdefault(name, {"seconds": 0.0, "calls": 0, "peakMemoryBytes": 0})
+            phaseRecord["seconds"] += otherRecord["seconds"]
+            phaseRecord["calls"] += otherRecord["calls"]
+            phaseRecord["peakMemoryBytes"] = max(phaseRecord["peakMemoryBytes"], otherRecord["peakMemoryBytes"])
+        for name, amount in other.counters.items():
+            self.count(name, amount)
+
+    def log_error(self, *args):
+        print(*args)
+
+    def log(self, *args):
+        if self.verbosity >= VERBOSITY_SUMMARY:
+            print(*args)
+
+    def log_detail(self, *args):
+        if self.verbosity >= VERBOSITY_DETAILED:
+            print(*args)
+
+    def to_dict(self):
+        report = {}
+        report["converter"] = self.converterName
+        report["totalSeconds"] = time.perf_counter() - self.startTime
+        report["phases"] = []
+        for name, record in self.phases.items():
+            phaseReport = dict(name = name, **record)
+            if not self.traceMemory:
+                del phaseReport["peakMemoryBytes"]
+            report["phases"].append(phaseReport)
+        report["counters"] = dict(self.counters)
+        if self.traceMemory:
+            report["peakMemoryBytes"] = max([0] + [record["peakMemoryBytes"] for record in self.phases.values()])
+        return report
+
+    def write_report(self, path):
+        with open(path, "w") as outfile:
+            json.dump(self.to_dict(), outfile, indent = 2)
+
+# Creates conversion stats object configured by the --verbosity=<0-2> and --trace-memory
+# command line options
+def create_stats_from_cli(converterName, argv):
+    return ConversionStats(converterName, int(get_cli_option(argv, "verbosity", VERBOSITY_DETAILED)),
+     has_cli_flag(argv, "trace-memory"))
+
+def print_stats_cli_usage():
+    print("--verbosity=<0-2> = 0 prints only errors, 1 also a summary, 2 also every processed object [default 2]")
+    print("--report=<path> = writes timing and object counts of the conversion phases to a JSON file")
+    print("--trace-memory = includes peak memory of the conversion phases in the report (slows down the conversion)")
+
+# Writes the report if requested by the --report=<path> command line option
+def finish_stats_from_cli(stats, argv):
+    reportPath = get_cli_option(argv, "report", None)
+    if reportPath != None:
+        stats.write_report(reportPath)
+
+# Calls the function repeatedly and returns the best time and the result of the last call (used by the benchmarks)
+def measure(function, repeat):
+    bestTime = None
+    for i in range(repeat):
+        startTime = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - startTime
+        bestTime = elapsed if bestTime == None else min(bestTime, elapsed)
+    return (bestTime, result)
+
 def initialize_unf_file_data_object(name, author, lenUnits = "A", angUnits = "deg"):
     unfFileData = {}
 
@@ -40,6 +214,424 @@ def initialize_unf_file_data_object(name, author, lenUnits = "A", angUnits = "de
 
     return unfFileData
 
+# JSON backends: (loads accepting str or bytes, dumps returning compact str).
+# Both write NaN and Infinity as the stdlib does (orjson alone would write them as null)
+# and NumPy arrays and scalars as lists and numbers.
+def stdlib_json_dumps(value):
+    return json.dumps(value, separators = (",", ":"), default = numpy_to_json_value)
+
+def numpy_to_json_value(value):
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError("Object of type " + type(value).__name__ + " is not JSON serializable")
+
+def has_non_finite_floats(value):
+    if isinstance(value, (float, np.floating)):
+        return not np.isfinite(value)
+    elif isinstance(value, np.ndarray):
+        return value.dtype.kind == "f" and not np.isfinite(value).all()
+    elif isinstance(value, dict):
+        return any(has_non_finite_floats(item) for item in value.values())
+    elif isinstance(value, (list, tuple)):
+        return any(has_non_finite_floats(item) for item in value)
+    return False
+
+def orjson_loads(data):
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        # E.g., NaN values or integers out of the 64-bit range
+        return json.loads(data)
+
+def orjson_dumps(value):
+    try:
+        text = orjson.dumps(value, option = orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+    except TypeError:
+        return stdlib_json_dumps(value)
+    # Non-finite floats are looked for only if orjson wrote some null
+    if "null" in text and has_non_finite_floats(value):
+        return stdlib_json_dumps(value)
+    return text
+
+JSON_BACKENDS = {"json": (json.loads, stdlib_json_dumps)}
+if orjson != None:
+    JSON_BACKENDS["orjson"] = (orjson_loads, orjson_dumps)
+
+jsonBackendName = None
+json_loads = None
+json_dumps = None
+
+# Selects the JSON backend by its name ("json" or "orjson")
+def set_json_backend(name):
+    global jsonBackendName, json_loads, json_dumps
+    if name not in JSON_BACKENDS:
+        raise ValueError("JSON backend " + name + " is not available. Available backends: " + ", ".join(JSON_BACKENDS))
+    jsonBackendName = name
+    json_loads, json_dumps = JSON_BACKENDS[name]
+
+def get_json_backend():
+    return jsonBackendName
+
+# The backend can be also selected by the UNF_JSON_BACKEND environment variable
+set_json_backend(os.environ.get("UNF_JSON_BACKEND", "orjson" if orjson != None else "json"))
+
+# Returns the value (nested lists/dicts) with the floats rounded to the given number of decimals
+def round_coordinates(value, precision):
+    if isinstance(value, float):
+        return round(value, precision)
+    elif isinstance(value, list):
+        return [round_coordinates(item, precision) for item in value]
+    elif isinstance(value, dict):
+        return {key: item if key in DIRECTION_KEYS else round_coordinates(item, precision) for key, item in value.items()}
+    return value
+
+# Returns the object with the coordinate members (see COORDINATE_KEYS) of it and its nested objects rounded
+def round_coordinate_members(value, precision):
+    if isinstance(value, dict):
+        return {key: round_coordinates(item, precision) if key in COORDINATE_KEYS else round_coordinate_members(item, precision)
+            for key, item in value.items()}
+    elif isinstance(value, list):
+        return [round_coordinate_members(item, precision) for item in value]
+    return value
+
+# Value of a field which is known only after the rest of the document is written
+# (e.g., UNF idCounter). It is written as a fixed-width placeholder which is
+# overwritten once the document is finished.
+class DeferredValue:
+    def __init__(self, getter, width = 20):
+        self.getter = getter
+        self.width = width
+
+    def __repr__(self):
+        return "DeferredValue(" + str(self.width) + ")"
+
+# Writes JSON documents whose arrays can be provided as iterators (e.g., generators).
+# Items of such arrays are written as soon as they are produced, so the whole document
+# does not need to be kept in memory. The output is compact (no spaces after separators)
+# apart from the padding of deferred values. If the precision is given, coordinates
+# (see COORDINATE_KEYS) are rounded to the given number of decimals.
+# Deferred values are patched by seeking back in the output. Documents written to non-seekable
+# outputs (e.g., pipes or sys.stdout) are written to a temporary file first and copied to the output.
+class JsonStreamWriter:
+    def __init__(self, outfile, precision = None):
+        self.outfile = outfile
+        self.precision = precision
+        self.deferredValues = []
+
+    def write_document(self, document):
+        if is_seekable(self.outfile):
+            self.write_value(document)
+            self.patch_deferred_values()
+            return
+
+        outfile = self.outfile
+        with tempfile.TemporaryFile("w+") as self.outfile:
+            self.write_value(document)
+            self.patch_deferred_values()
+            self.outfile.seek(0)
+            shutil.copyfileobj(self.outfile, outfile, READ_CHUNK_SIZE)
+        self.outfile = outfile
+
+    def write_value(self, value):
+        if isinstance(value, dict):
+            self.write_object(value)
+        elif isinstance(value, DeferredValue):
+            self.deferredValues.append((self.outfile.tell(), value))
+            self.outfile.write(" " * value.width)
+        elif isinstance(value, collections.abc.Iterator):
+            self.write_array(value)
+        else:
+            self.outfile.write(json_dumps(value))
+
+    def write_object(self, obj):
+        # Objects without any streamed content are serialized at once
+        if not any(isinstance(v, (dict, DeferredValue, collections.abc.Iterator)) for v in obj.values()):
+            self.outfile.write(json_dumps(obj if self.precision == None else round_coordinate_members(obj, self.precision)))
+            return
+
+        self.outfile.write("{")
+        isFirst = True
+        for key, value in obj.items():
+            if not isFirst:
+                self.outfile.write(",")
+            isFirst = False
+            self.outfile.write(json_dumps(key) + ":")
+            if self.precision != None and key in COORDINATE_KEYS and isinstance(value, list):
+                value = round_coordinates(value, self.precision)
+            self.write_value(value)
+        self.outfile.write("}")
+
+    def write_array(self, items):
+        self.outfile.write("[")
+        isFirst = True
+        for item in items:
+            if not isFirst:
+                self.outfile.write(",")
+            isFirst = False
+            self.write_value(item)
+        self.outfile.write("]")
+
+    def patch_deferred_values(self):
+        if len(self.deferredValues) == 0:
+            return
+        endPos = self.outfile.tell()
+        for pos, deferredValue in self.deferredValues:
+            valueStr = json_dumps(deferredValue.getter())
+            # The value must not overwrite the JSON following its placeholder
+            if len(valueStr) > deferredValue.width:
+                raise ValueError("Deferred value " + valueStr + " does not fit into its placeholder of " + str(deferredValue.width) +
+                    " characters. The written document is not valid.")
+            self.outfile.seek(pos)
+            self.outfile.write(valueStr.ljust(deferredValue.width))
+        self.outfile.seek(endPos)
+        self.deferredValues = []
+
+# Writes the UNF document (as created by initialize_unf_file_data_object) where any array
+# may be an iterator producing the items and the idCounter is taken from the ID generator
+# after the rest of the document is written
+def write_unf_stream(outfile, unfFileData, idGenerator, precision = None):
+    unfFileData['idCounter'] = DeferredValue(idGenerator.get_id_counter)
+    JsonStreamWriter(outfile, precision).write_document(unfFileData)
+
+# Converts a document containing iterators and deferred values (see JsonStreamWriter)
+# to plain dicts and lists
+def materialize_document(document):
+    if isinstance(document, dict):
+        return {key: materialize_document(value) for key, value in document.items()}
+    elif isinstance(document, DeferredValue):
+        return document
+    elif isinstance(document, collections.abc.Iterator):
+        return [materialize_document(item) for item in document]
+    return document
+
+# Replaces deferred values (in nested dicts) by their final values
+def resolve_deferred_values(document):
+    for key, value in document.items():
+        if isinstance(value, DeferredValue):
+            document[key] = value.getter()
+        elif isinstance(value, dict):
+            resolve_deferred_values(value)
+
+# Input/output helpers accepting either paths or already opened (text) streams.
+# Opened streams are not closed.
+# Compressed inputs (gzip or xz) are recognized by their magic bytes and decompressed on the fly.
+# Outputs are compressed if their path ends with the extension of a compression format (e.g., output.unf.gz).
+def is_stream(source):
+    return hasattr(source, "read") or hasattr(source, "write")
+
+def is_seekable(stream):
+    try:
+        return stream.seekable()
+    except (AttributeError, ValueError):
+        return False
+
+@contextlib.contextmanager
+def open_text_input(source):
+    if is_stream(source):
+        yield source
+    elif get_file_compression(source) != None:
+        with open_compressed_file(source, get_file_compression(source), "rt") as infile:
+            yield infile
+    else:
+        with open(source, "r") as infile:
+            yield infile
+
+# Compressed outputs are written to a temporary file first, as the deferred values
+# (see JsonStreamWriter) need a seekable output, and compressed chunk by chunk afterwards
+@contextlib.contextmanager
+def open_text_output(target):
+    if is_stream(target):
+        yield target
+    elif get_output_compression(target) != None:
+        with tempfile.TemporaryFile("w+") as outfile:
+            yield outfile
+            outfile.flush()
+            outfile.buffer.seek(0)
+            compress_stream(outfile.buffer, target, get_output_compression(target))
+    else:
+        with open(target, "w") as outfile:
+            yield outfile
+
+# Compression formats: (magic bytes, file extension)
+COMPRESSION_FORMATS = {
+    "gzip": (b"\x1f\x8b", ".gz"),
+    "xz": (b"\xfd7zXZ\x00", ".xz")
+}
+GZIP_COMPRESS_LEVEL = 6
+XZ_PRESET = 6
+
+# Returns the compression format of the binary stream (None if it is not compressed)
+# without changing the stream's position. Non-seekable streams are recognized only if they support peek.
+def get_stream_compression(infile):
+    if hasattr(infile, "peek"):
+        magic = infile.peek(8)
+    elif infile.seekable():
+        position = infile.tell()
+        magic = infile.read(8)
+        infile.seek(position)
+    else:
+        return None
+    return next((name for name, (formatMagic, extension) in COMPRESSION_FORMATS.items() if magic.startswith(formatMagic)), None)
+
+def get_file_compression(path):
+    with open(path, "rb") as infile:
+        return get_stream_compression(infile)
+
+def get_output_compression(path):
+    return next((name for name, (magic, extension) in COMPRESSION_FORMATS.items() if str(path).endswith(extension)), None)
+
+# Returns the file name with the extension of the compression format (or unchanged if no compression is given)
+def get_compressed_file_name(fileName, compression):
+    if compression == None:
+        return fileName
+    if compression not in COMPRESSION_FORMATS:
+        raise ValueError("Unknown compression " + compression + ". Supported compressions: " + ", ".join(COMPRESSION_FORMATS))
+    return fileName + COMPRESSION_FORMATS[compression][1]
+
+# Returns the path of a temporary file next to the given one with the same (compression) extension
+def get_temporary_file_name(path):
+    root, extension = os.path.splitext(path)
+    return root + ".tmp" + extension
+
+# Opens the compressed file given as a path or binary stream (which is not closed with the returned file)
+def open_compressed_file(file, compression, mode):
+    if compression == "gzip":
+        return gzip.open(file, mode, compresslevel = GZIP_COMPRESS_LEVEL)
+    elif compression == "xz":
+        return lzma.open(file, mode, preset = XZ_PRESET if "w" in mode else None)
+    raise ValueError("Unknown compression " + str(compression) + ".")
+
+def compress_stream(infile, path, compression):
+    with open_compressed_file(path, compression, "wb") as outfile:
+        shutil.copyfileobj(infile, outfile, READ_CHUNK_SIZE)
+
+def print_compression_cli_usage(fileName):
+    print("--compress=<" + "|".join(COMPRESSION_FORMATS) + "> = compresses the output (e.g., " + get_compressed_file_name(fileName, "gzip") + ")")
+
+# Returns a short description of the input for printing purposes
+def describe_source(source):
+    if isinstance(source, dict):
+        return "<" + str(source.get("name", "document")) + ">"
+    elif is_stream(source):
+        return str(getattr(source, "name", "<stream>"))
+    return str(source)
+
+READ_CHUNK_SIZE = 1 << 20
+
+# Incremental MD5 hash of an included file's content without line breaks (see externalFiles' hash).
+# The content can be given in chunks of text or UTF-8 bytes split anywhere. As every '\r' and '\n'
+# is removed on its own, the result does not depend on where the chunks end
+# (e.g., between '\r' and '\n' of a Windows line ending).
+class IncludedFileHasher:
+    def __init__(self):
+        self.hasher = hashlib.md5()
+
+    def update(self, chunk):
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        self.hasher.update(chunk.translate(None, b"\r\n"))
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+# Returns the hash of the included file given as a path or (text or binary) stream,
+# reading the file in chunks
+def get_included_file_hash(source):
+    hasher = IncludedFileHasher()
+    if is_stream(source):
+        read_chunks(source, hasher.update)
+    else:
+        with open(source, "rb") as infile:
+            read_chunks(infile, hasher.update)
+    return hasher.hexdigest()
+
+# Checks the content of the included file (path or stream) against the hash stored in the UNF
+def verify_included_file_hash(source, expectedHash):
+    return get_included_file_hash(source) == expectedHash
+
+def read_chunks(infile, callback):
+    while True:
+        chunk = infile.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        callback(chunk)
+
+# Loads a JSON document from a path or a stream. Dicts are returned as they are.
+def load_json_input(source):
+    if isinstance(source, dict):
+        return source
+    with open_text_input(source) as infile:
+        return json_loads(infile.read())
+
+# Loads a UNF file from a path or a stream and returns the parsed JSON core
+# and the text of the included files (starting with the first #INCLUDED_FILE line, or empty)
+# Dicts are considered to be already parsed UNF documents without included files.
+# Paths, binary streams and text streams with a binary buffer are read as bytes,
+# so the included files may contain binary data (see INCLUDED_FILES_ERRORS).
+def load_unf_input(source):
+    if isinstance(source, dict):
+        return (source, "")
+    if is_stream(source) and isinstance(source.read(0), str) and not hasattr(source, "buffer"):
+        fileContent = source.read()
+        jsonPartEndIdx = fileContent.find(INCLUDED_FILE_TAG)
+        if jsonPartEndIdx > -1:
+            return (json_loads(fileContent[0:jsonPartEndIdx]), fileContent[jsonPartEndIdx:])
+        return (json_loads(fileContent), "")
+
+    with open_binary_input(source.buffer if hasattr(source, "buffer") else source) as infile:
+        fileContent = infile.read()
+    jsonPartEndIdx = fileContent.find(INCLUDED_FILE_TAG_BYTES)
+    if jsonPartEndIdx > -1:
+        return (json_loads(fileContent[0:jsonPartEndIdx]), fileContent[jsonPartEndIdx:].decode("utf-8", INCLUDED_FILES_ERRORS))
+    return (json_loads(fileContent), "")
+
+# Writes the text of the included files (see load_unf_input) to the text output.
+# Binary data are written as bytes to the underlying buffer (if there is one).
+def write_included_files_text(outfile, text):
+    if hasattr(outfile, "buffer"):
+        outfile.flush()
+        outfile.buffer.write(text.encode("utf-8", INCLUDED_FILES_ERRORS))
+    else:
+        outfile.write(text)
+
+@contextlib.contextmanager
+def open_binary_input(source):
+    if is_stream(source):
+        compression = get_stream_compression(source)
+        if compression == None:
+            yield source
+        else:
+            with open_compressed_file(source, compression, "rb") as infile:
+                yield infile
+    else:
+        with open(source, "rb") as infile:
+            compression = get_stream_compression(infile)
+            if compression == None:
+                yield infile
+            else:
+                with open_compressed_file(infile, compression, "rb") as decompressedFile:
+                    yield decompressedFile
+
+# Writes the UNF document (possibly containing iterators) to the output path or stream,
+# or returns it as a plain dict if no output is given.
+# If the precision is given, coordinates are rounded to the given number of decimals.
+def output_unf_document(unfFileData, idGenerator, output, stats, precision = None):
+    with stats.phase("serialization"):
+        if output == None:
+            unfFileData['idCounter'] = DeferredValue(idGenerator.get_id_counter)
+            unfFileData = materialize_document(unfFileData)
+            resolve_deferred_values(unfFileData)
+            return unfFileData if precision == None else round_coordinate_members(unfFileData, precision)
+        with open_text_output(output) as outfile:
+            write_unf_stream(outfile, unfFileData, idGenerator, precision)
+    return None
+
+# Returns list of integers from a "x,y,z" string or a sequence of numbers
+def parse_int_vector(value):
+    if isinstance(value, str):
+        value = value.split(",")
+    return [int(v) for v in value]
+
 def is_dna_res(resName):
     return resName in DNA_PDB_BASES
 
@@ -55,6 +647,10 @@ def is_drna_backbone(atomName):
 def normalize(np_vector):
     return np_vector / np.sqrt(np.sum(np_vector**2))
 
+# Normalizes vectors stored along the last axis
+def normalize_rows(np_vectors):
+    return np_vectors / np.sqrt(np.sum(np_vectors**2, axis = -1, keepdims = True))
+
 def dec_color_to_hex(decimalColor):
     result = "#"
     hexRes = hex(decimalColor).replace("0x", "")
@@ -68,4 +664,15 @@ def hex_color_to_dec(hexColor):
     if len(hexColor) != 7:
         return int("00FF00", 16)
     return int(hexColor[1:], 16)
-    
\ No newline at end of file
+
+# Returns the value of the command line option of form --name=value
+# or the default value if the option is not present
+def get_cli_option(argv, name, default):
+    prefix = "--" + name + "="
+    for arg in argv[1:]:
+        if arg.startswith(prefix):
+            return arg[len(prefix):]
+    return default
+
+def has_cli_flag(argv, name):
+    return ("--" + name) in argv[1:]
@@ -9,15 +9,16 @@
 
 import sys
 import os
-import json
-import atomium # Using atomium library for PDB parsing; pip3 install atomium
 import itertools
+import concurrent.futures
 import numpy as np
 from pprint import pprint
 import modules.unf_utils as unfutils
+import modules.unf_reader as unfreader
+import modules.pdb_reader as pdbreader
+import modules.pdb_cache as pdbcache
 
 OUTPUT_FILE_NAME = "output.unf"
-globalIdGenerator = 0
 
 class AminoAcidChain:
     def __init__(self, id, name, color, nTermAa, cTermAa):
@@ -26,6 +27,8 @@ class AminoAcidChain:
         self.color = color
         self.nTermAa = nTermAa
         self.cTermAa = cTermAa
+        # Per-frame arrays of amino acid positions if more frames are converted
+        self.framePositions = None
 
     def __repr__(self):
         return "chain " + self.name
@@ -51,6 +54,8 @@ class NucleicAcidStrand:
         self.color = color
         self.fivePrime = fivePrime
         self.threePrime = threePrime
+        # Per-frame tuples of nucleotide position arrays (see get_nt_frame) if more frames are converted
+        self.framePositions = None
     
     def __repr__(self):
         return "strand " + self.name
@@ -75,199 +80,370 @@ class NucleicAcid:
         self.prev = prevNa
         self.next = nextNa
 
-class Atom:
-    def __init__(self, atName, elName, position):
-        self.atName = atName
-        self.elName = elName
-        self.position = position
-
 class Ligand:
     def __init__(self, id, name, atoms):
         self.id = id
         self.name = name
         self.atoms = atoms
+        self.com, self.atomOffsets = atoms.get_center_and_offsets()
+        # Per-frame (center of mass, atom offsets) tuples if more frames are converted
+        self.framePositions = None
+             
+# Atom name pairs whose differences define the direction of the nucleobase's hydrogen face
+PYRIMIDINE_HYDR_FACE_PAIRS = [ ["N3", "C6"], ["C2", "N1"], ["C4", "C5"] ]
+PURINE_HYDR_FACE_PAIRS = [ ["N1", "C4"], ["C2", "N3"], ["C6", "C5"] ]
 
-        self.com = np.array([0.0, 0.0, 0.0])
+def get_ring_atom_idx_pairs(pairs):
+    return [[unfutils.NUCLEOBASE_RING_COMMON_ATOMS.index(atName) for atName in pair] for pair in pairs]
 
-        for atom in atoms:
-            self.com = np.add(self.com, atom.position)
-        
-        self.com = np.true_divide(self.com, len(atoms))
+PYRIMIDINE_HYDR_FACE_IDX_PAIRS = np.array(get_ring_atom_idx_pairs(PYRIMIDINE_HYDR_FACE_PAIRS))
+PURINE_HYDR_FACE_IDX_PAIRS = np.array(get_ring_atom_idx_pairs(PURINE_HYDR_FACE_PAIRS))
 
-        for atom in atoms:
-            atom.position = np.subtract(atom.position, self.com)       
-             
-def get_hydr_face_dir(residue, atNamesMap):
-    res_vector = np.array([0.0, 0.0, 0.0])
-
-    if "C" in residue.name or "T" in residue.name or "U" in residue.name:
-        pairs = [ ["N3", "C6"], ["C2", "N1"], ["C4", "C5"] ]
-    else:
-        pairs = [ ["N1", "C4"], ["C2", "N3"], ["C6", "C5"] ]
-
-    for pair in pairs:
-        p = atNamesMap[pair[0]]
-        q = atNamesMap[pair[1]]
-        diff = np.subtract(np.asarray(p.location), np.asarray(q.location))
-        res_vector = np.add(res_vector, diff)
-
-    return unfutils.normalize(res_vector)
-
-def get_base_normal(residue, atNamesMap, nbCenter):
-    parallel_to = np.subtract(np.copy(nbCenter), np.asarray(atNamesMap["O4'"].location))
-    res = np.array([0.0, 0.0, 0.0])
-
-    for perm in itertools.permutations(unfutils.NUCLEOBASE_RING_COMMON_ATOMS, 3):
-        p = atNamesMap[perm[0]]
-        q = atNamesMap[perm[1]]
-        r = atNamesMap[perm[2]]   
-        
-        v1 = unfutils.normalize(
-            np.subtract(np.asarray(p.location), np.asarray(q.location)))
-        v2 = unfutils.normalize(
-            np.subtract(np.asarray(p.location), np.asarray(r.location)))
-
-        curr_res = unfutils.normalize(np.cross(v1, v2))
-        if np.dot(curr_res, parallel_to) < 0.0:
-            curr_res = -curr_res
-        res = np.add(res, curr_res)    
-        
-    return unfutils.normalize(res)
+# All ordered triplets of the ring atoms used for the computation of the base normal
+RING_ATOM_IDX_PERMUTATIONS = np.array(list(itertools.permutations(range(len(unfutils.NUCLEOBASE_RING_COMMON_ATOMS)), 3)))
+
+def is_pyrimidine_res(resName):
+    return "C" in resName or "T" in resName or "U" in resName
+
+# Expects (n, 6, 3) array of ring atom locations (ordered as NUCLEOBASE_RING_COMMON_ATOMS)
+# and array of n booleans determining pyrimidines
+def get_hydr_face_dirs(ringCoords, isPyrimidine):
+    idxPairs = np.where(isPyrimidine[:, None, None], PYRIMIDINE_HYDR_FACE_IDX_PAIRS, PURINE_HYDR_FACE_IDX_PAIRS)
+    nuclIdx = np.arange(len(ringCoords))[:, None]
+    diffs = ringCoords[nuclIdx, idxPairs[:, :, 0]] - ringCoords[nuclIdx, idxPairs[:, :, 1]]
+    return unfutils.normalize_rows(np.add.reduce(diffs, axis = 1))
+
+# The base normal is an average of the normals of all planes given by triplets of ring atoms,
+# oriented to the side of the nucleobase center (relative to the O4' atom)
+def get_base_normals(ringCoords, o4Coords, nbCenters):
+    parallelTo = nbCenters - o4Coords
+    p = ringCoords[:, RING_ATOM_IDX_PERMUTATIONS[:, 0]]
+    q = ringCoords[:, RING_ATOM_IDX_PERMUTATIONS[:, 1]]
+    r = ringCoords[:, RING_ATOM_IDX_PERMUTATIONS[:, 2]]
+
+    v1 = unfutils.normalize_rows(p - q)
+    v2 = unfutils.normalize_rows(p - r)
+    normals = unfutils.normalize_rows(np.cross(v1, v2))
+    normals = np.where(np.sum(normals * parallelTo[:, None, :], axis = -1, keepdims = True) < 0.0, -normals, normals)
+
+    return unfutils.normalize_rows(np.add.reduce(normals, axis = 1))
+
+def is_drna_backbone_atoms(atomNames):
+    return (np.char.find(atomNames, "P") >= 0) | (np.char.find(atomNames, "'") >= 0)
+
+# Computes the positions of all the nucleotides at once.
+# Returns arrays of nucleobase centers, backbone centers, base normals and hydrogen face directions.
+def get_nt_frame(atoms):
+    isBackbone = is_drna_backbone_atoms(atoms.names)
+
+    # Residues with duplicate atom names use the last atom of the name
+    ringAtomIdx = np.array([atoms.find_atom_per_residue(atName, True) for atName in unfutils.NUCLEOBASE_RING_COMMON_ATOMS]).T
+    o4AtomIdx = atoms.find_atom_per_residue("O4'", True)
+    if np.any(ringAtomIdx < 0) or np.any(o4AtomIdx < 0):
+        raise KeyError("Nucleotide is missing nucleobase ring or O4' atoms.")
+
+    ringCoords = atoms.coords[ringAtomIdx]
+    o4Coords = atoms.coords[o4AtomIdx]
+    isPyrimidine = np.array([is_pyrimidine_res(resName) for resName in atoms.resNames], dtype = bool)
+
+    bbCenters = atoms.get_residue_centers(isBackbone)
+    nbCenters = atoms.get_residue_centers(~isBackbone)
+
+    hydrFaceDirs = get_hydr_face_dirs(ringCoords, isPyrimidine)
+    baseNormals = get_base_normals(ringCoords, o4Coords, nbCenters)
+
+    return (nbCenters, bbCenters, baseNormals, hydrFaceDirs)
+
+def get_nt_positions(atoms):
+    nbCenters, bbCenters, baseNormals, hydrFaceDirs = get_nt_frame(atoms)
+    return [NucleotidePos(nbCenters[i], bbCenters[i], baseNormals[i], hydrFaceDirs[i]) for i in range(atoms.resCount)]
 
 def get_nt_pos(residue):
-    bbCenter = np.array([0.0, 0.0, 0.0])
-    bbCount = 0
+    return get_nt_positions(pdbreader.AtomTable.from_residues([residue]))[0]
     
-    nbCenter = np.array([0.0, 0.0, 0.0])
-    nbCount = 0
-
-    atNamesMap = {}
-
-    for atom in residue.atoms():
-        atLoc = np.asarray(atom.location)
-        atNamesMap[atom.name] = atom
-        if unfutils.is_drna_backbone(atom.name):
-            bbCenter = np.add(bbCenter, atLoc)
-            bbCount += 1
-        else:
-            nbCenter = np.add(nbCenter, atLoc)
-            nbCount += 1
-       
-    bbCenter = np.true_divide(bbCenter, bbCount)
-    nbCenter = np.true_divide(nbCenter, nbCount)
-
-    hydrFaceDir = get_hydr_face_dir(residue, atNamesMap)
-    baseNormal = get_base_normal(residue, atNamesMap, nbCenter)
-
-    return NucleotidePos(nbCenter, bbCenter, baseNormal, hydrFaceDir)
-    
-def process_na_strand(chainName, residues, naType):
-    print("Processing", naType, "strand with", len(residues), "nucleotides.")
-    global globalIdGenerator
+# Connects the residues (nucleotides or amino acids) of the list via prev/next references
+def link_residues(residues):
+    for i in range(len(residues)):
+        residues[i].set_prev_next(
+            residues[i - 1] if i > 0 else None,
+            residues[i + 1] if i < len(residues) - 1 else None)
+
+# Removes the prev/next references (so that long chains can be pickled)
+# and returns the residues of the chain starting with the given one
+def unlink_residues(firstResidue):
+    residues = []
+    while firstResidue != None:
+        residues.append(firstResidue)
+        firstResidue = firstResidue.next
+    for residue in residues:
+        residue.set_prev_next(None, None)
+    return residues
+
+def process_na_strand(chainName, residues, naType, idGenerator, stats):
+    stats.log_detail("Processing", naType, "strand with", residues.resCount, "nucleotides.")
     nucleotides = []
 
-    for res in residues:
-        newNtId = globalIdGenerator
-        globalIdGenerator += 1
-        nucleotides.append(NucleicAcid(newNtId, res.name, None, None, res.id, get_nt_pos(res)))
+    ntPositions = get_nt_positions(residues)
+    for resName, resId, ntPos in zip(residues.resNames, residues.resIds, ntPositions):
+        newNtId = idGenerator.get_next_id()
+        nucleotides.append(NucleicAcid(newNtId, resName, None, None, resId, ntPos))
     
-    for i in range(len(nucleotides)):
-        nucleotides[i].set_prev_next(
-            nucleotides[i - 1] if i > 0 else None,
-            nucleotides[i + 1] if i < len(nucleotides) - 1 else None)
+    link_residues(nucleotides)
     
-    newStrand = NucleicAcidStrand(globalIdGenerator, chainName, naType, "#FF0000", nucleotides[0], nucleotides[-1])
-    globalIdGenerator += 1
-    print("\tProcessing finished:", newStrand.name, len(nucleotides))
+    newStrand = NucleicAcidStrand(idGenerator.get_next_id(), chainName, naType, "#FF0000", nucleotides[0], nucleotides[-1])
+    stats.count("naStrands")
+    stats.count("nucleotides", len(nucleotides))
+    stats.log_detail("\tProcessing finished:", newStrand.name, len(nucleotides))
     return newStrand
 
-def get_aa_pos(residue):
-    for atom in residue.atoms():
-        if atom.name == "CA":
-            return np.asarray(atom.location)
+def get_aa_positions(atoms):
+    caAtomIdx = atoms.find_atom_per_residue("CA")
+    positions = atoms.coords[caAtomIdx]
     # Just a fallback in case alpha carbon is not found for some reason
-    return residue.center_of_mass
+    if np.any(caAtomIdx < 0):
+        positions[caAtomIdx < 0] = atoms.get_residue_centers_of_mass()[caAtomIdx < 0]
+    return positions
 
-def process_aa_chain(chainName, residues):
-    print("Processing protein chain with", len(residues), "residues.")
-    global globalIdGenerator
+def get_aa_pos(residue):
+    return get_aa_positions(pdbreader.AtomTable.from_residues([residue]))[0]
+
+def process_aa_chain(chainName, residues, idGenerator, stats):
+    stats.log_detail("Processing protein chain with", residues.resCount, "residues.")
     aminoAcids = []
 
-    for res in residues:
-        newAaId = globalIdGenerator
-        globalIdGenerator += 1
-        aminoAcids.append(AminoAcid(newAaId, res.name, None, None, get_aa_pos(res), res.id))
+    aaPositions = get_aa_positions(residues)
+    for resName, resId, aaPos in zip(residues.resNames, residues.resIds, aaPositions):
+        newAaId = idGenerator.get_next_id()
+        aminoAcids.append(AminoAcid(newAaId, resName, None, None, aaPos, resId))
     
-    for i in range(len(aminoAcids)):
-        aminoAcids[i].set_prev_next(
-            aminoAcids[i - 1] if i > 0 else None,
-            aminoAcids[i + 1] if i < len(aminoAcids) - 1 else None)
-
-    newChain = AminoAcidChain(globalIdGenerator, chainName, "#0000FF", aminoAcids[0], aminoAcids[-1])
-    globalIdGenerator += 1
-    print("\tProcessing finished:", newChain.name, len(aminoAcids))
-    return newChain
+    link_residues(aminoAcids)
 
-def process_ligand(ligand):
-    global globalIdGenerator
-    atoms = []
-
-    for atom in ligand.atoms():
-        atLoc = np.asarray(atom.location)
-        atoms.append(Atom(atom.name, atom.element, atLoc))
+    newChain = AminoAcidChain(idGenerator.get_next_id(), chainName, "#0000FF", aminoAcids[0], aminoAcids[-1])
+    stats.count("aaChains")
+    stats.count("aminoAcids", len(aminoAcids))
+    stats.log_detail("\tProcessing finished:", newChain.name, len(aminoAcids))
+    return newChain
 
-    newLigand = Ligand(globalIdGenerator, ligand.name, atoms)
-    globalIdGenerator += 1
-    print("Processed ligand", ligand.name, "with", len(atoms), "atoms.")
+def process_ligand(ligand, idGenerator, stats):
+    ligandName = ligand.resNames[0]
+    newLigand = Ligand(idGenerator.get_next_id(), ligandName, ligand)
+    stats.count("ligands")
+    stats.count("ligandAtoms", len(ligand))
+    stats.log_detail("Processed ligand", ligandName, "with", len(ligand), "atoms.")
     return newLigand
 
-def process_pdb(pdb_path):
-    if os.path.isfile(pdb_path):
-        pdb = atomium.open(pdb_path)
-    else:
-        pdb = atomium.fetch(pdb_path)
+# Returns true if the structure is neither available locally nor cacheable (e.g., .mmtf or URL)
+# and is thus fetched by atomium
+def is_fetched_by_atomium(pdb_path):
+    return isinstance(pdb_path, str) and not os.path.isfile(pdb_path) and not pdbcache.is_cacheable_id(pdb_path)
+
+# Returns the path or stream from which the structure is read and its file name.
+# Structures not available locally are fetched via the cache (if it can handle them).
+def resolve_pdb_source(pdb_path, pdbCache = None):
+    if unfutils.is_stream(pdb_path):
+        return (pdb_path, str(getattr(pdb_path, "name", "input.pdb")))
+    if not os.path.isfile(pdb_path) and pdbcache.is_cacheable_id(pdb_path):
+        pdb_path = (pdbCache if pdbCache != None else pdbcache.PdbCache()).get_path(pdb_path)
+    return (pdb_path, pdb_path)
+
+def load_pdb_source(source, fileName, useAtomium = False):
+    if is_fetched_by_atomium(source):
+        return pdbreader.load_with_atomium(source, fetch = True)
+    if not useAtomium and pdbreader.can_read_fast(fileName):
+        return pdbreader.read_structure(source, fileName)
+    return pdbreader.load_with_atomium(source)
+
+# Loads the PDB/MMTF/CIF structure given as a path, text stream or
+# an ID of the structure to be fetched from RCSB data bank (or its mirror) via the cache.
+# MMTF files and URLs which are not available locally are fetched by atomium.
+# PDB and CIF files are read by the built-in reader, other formats by atomium.
+def load_pdb(pdb_path, useAtomium = False, pdbCache = None):
+    return load_pdb_source(*resolve_pdb_source(pdb_path, pdbCache), useAtomium)
+
+# Parses the range of converted frames (models): "all", "<first>:<end>" (0-based, end excluded,
+# any bound can be omitted) or "<frame>"
+def parse_frame_range(text):
+    if text == "all":
+        return (0, None)
+    bounds = text.split(":")
+    if len(bounds) == 1:
+        return (int(bounds[0]), int(bounds[0]) + 1)
+    if len(bounds) != 2:
+        raise ValueError("Invalid frame range: " + text)
+    return (int(bounds[0]) if len(bounds[0]) > 0 else 0, int(bounds[1]) if len(bounds[1]) > 0 else None)
+
+def get_frame_positions(target, atoms):
+    if isinstance(target, NucleicAcidStrand):
+        return get_nt_frame(atoms)
+    elif isinstance(target, AminoAcidChain):
+        return get_aa_positions(atoms)
+    return atoms.get_center_and_offsets()
+
+# Computes the positions of the strands, chains and ligands in each frame.
+# Targets are (strand/chain/ligand, its AtomTable) tuples whose topology is reused for all frames,
+# frames are streamed so that only the coarse-grained positions are kept in memory.
+def add_frames(targets, frames, stats):
+    for target, atoms in targets:
+        target.framePositions = []
+    for frameCoords in frames:
+        for target, atoms in targets:
+            target.framePositions.append(get_frame_positions(target, atoms.with_coords(atoms.select_coords(frameCoords))))
+        stats.count("frames")
+        stats.log_detail("Processed frame", stats.counters["frames"])
+    if len(targets) > 0 and len(targets[0][0].framePositions) == 0:
+        raise ValueError("No frames found in the given range.")
+
+def get_chain_type(residues):
+    # First residue helps to determine if we are processing protein
+    # or nucleic acid chain
+    if(unfutils.is_protein_res(residues.resNames[0])):
+        return "protein"
+    elif(unfutils.is_dna_res(residues.resNames[0])):
+        return "DNA"
+    elif(unfutils.is_rna_res(residues.resNames[0])):
+        return "RNA"
+    # We are probably processing ligands chain
+    # which is not detected as "ligand" by atomium for some reason
+    return "ligands"
+
+# Number of IDs assigned by process_chain
+def get_chain_ids_count(residues):
+    if residues.resCount == 0:
+        return 0
+    elif get_chain_type(residues) == "ligands":
+        return residues.resCount
+    return residues.resCount + 1
+
+# Returns lists of protein chains, nucleic acid strands and ligands created from the chain
+def process_chain(chainId, residues, idGenerator, stats):
+    if residues.resCount == 0:
+        return ([], [], [])
+
+    chainType = get_chain_type(residues)
+    if chainType == "protein":
+        return ([process_aa_chain(chainId, residues, idGenerator, stats)], [], [])
+    elif chainType == "ligands":
+        return ([], [], [process_ligand(residues.get_residue(resIdx), idGenerator, stats) for resIdx in range(residues.resCount)])
+    return ([], [process_na_strand(chainId, residues, chainType, idGenerator, stats)], [])
+
+# Processes the chain with IDs starting at the given one and its own stats so that it can
+# be run in a separate process. Returns the processed data without links between residues,
+# the residues of the protein chains and nucleic acid strands and the gathered stats.
+def process_chain_isolated(chainId, residues, firstId, verbosity, traceMemory):
+    idGenerator = unfutils.IdGenerator(firstId)
+    stats = unfutils.ConversionStats("pdb_to_unf", verbosity, traceMemory)
+    with stats.phase("chain processing"):
+        chainData = process_chain(chainId, residues, idGenerator, stats)
+    residueLists = [unlink_residues(chain.nTermAa) for chain in chainData[0]] + \
+        [unlink_residues(strand.fivePrime) for strand in chainData[1]]
+    return (chainData, residueLists, stats)
+
+# Processes the chains, possibly in parallel. Each chain gets a block of IDs reserved in advance
+# in the order of the chains, so the resulting IDs are identical to the ones assigned
+# when processing the chains one after another.
+def process_chains(chains, idGenerator, stats, jobs = 1):
+    if jobs <= 1 or len(chains) < 2:
+        with stats.phase("chain processing"):
+            return [process_chain(chainId, residues, idGenerator, stats) for chainId, residues in chains]
+
+    firstIds = [idGenerator.reserve_block(get_chain_ids_count(residues)) for chainId, residues in chains]
+    with concurrent.futures.ProcessPoolExecutor(max_workers = jobs) as executor:
+        results = list(executor.map(process_chain_isolated, [chainId for chainId, residues in chains],
+         [residues for chainId, residues in chains], firstIds,
+         [stats.verbosity] * len(chains), [stats.traceMemory] * len(chains)))
+
+    chainsData = []
+    for chainData, residueLists, workerStats in results:
+        stats.merge(workerStats)
+        for residues in residueLists:
+            link_residues(residues)
+        chainsData.append(chainData)
+    return chainsData
+
+# If the frame range is given (see parse_frame_range), the positions of the residues and ligands
+# are computed for each model in the range instead of the first model only.
+def process_pdb(pdb_path, idGenerator, stats, useAtomium = False, jobs = 1, pdbCache = None, frameRange = None):
+    with stats.phase("parse"):
+        source, fileName = resolve_pdb_source(pdb_path, pdbCache)
+        if frameRange != None:
+            if useAtomium or is_fetched_by_atomium(source) or not pdbreader.can_read_fast(fileName):
+                raise ValueError("More frames can be converted only from PDB/CIF files read by the built-in reader.")
+            # The stream is read twice (topology and frames)
+            if unfutils.is_stream(source):
+                source = source.read()
+                source = source.encode("utf-8") if isinstance(source, str) else source
+        pdb = load_pdb_source(source, fileName, useAtomium)
 
     aaChains = []
     naStrands = []
     ligands = []
-    
-    for chain in pdb.model.chains():
-        residues = chain.residues()
-        
-        if len(residues) > 0:
-            # First residue helps to determine if we are processing protein
-            # or nucleic acid chain
-            if(unfutils.is_protein_res(residues[0].name)):
-                aaChains.append(process_aa_chain(chain.id, residues))
-            elif(unfutils.is_dna_res(residues[0].name)):
-                naStrands.append(process_na_strand(chain.id, residues, "DNA"))
-            elif(unfutils.is_rna_res(residues[0].name)):
-                naStrands.append(process_na_strand(chain.id, residues, "RNA"))
-            # We are probably processing ligands chain
-            # which is not detected as "ligand" by atomium for some reason
-            else:
-                for residue in residues:
-                    ligands.append(process_ligand(residue))
-
-    for ligand in pdb.model.ligands():
-        ligands.append(process_ligand(ligand))
+    frameTargets = []
+
+    for (chainId, residues), (chainAaChains, chainNaStrands, chainLigands) in zip(pdb.chains, process_chains(pdb.chains, idGenerator, stats, jobs)):
+        aaChains.extend(chainAaChains)
+        naStrands.extend(chainNaStrands)
+        ligands.extend(chainLigands)
+        frameTargets.extend([(target, residues) for target in chainAaChains + chainNaStrands])
+        frameTargets.extend([(ligand, ligand.atoms) for ligand in chainLigands])
+
+    with stats.phase("chain processing"):
+        for ligand in pdb.ligands:
+            ligands.append(process_ligand(ligand, idGenerator, stats))
+            frameTargets.append((ligands[-1], ligand))
+
+    if frameRange != None:
+        with stats.phase("frames"):
+            add_frames(frameTargets, pdbreader.read_frames(source, fileName, pdb, frameRange), stats)
+
+    stats.log("Found:", len(aaChains), "protein chains,", len(naStrands), "nucleic acid strands,", len(ligands), "ligands.")
 
     return (pdb, aaChains, naStrands, ligands)
 
-def convert_data_to_unf_file(pdbFile, aaChains, naStrands, ligands):
-    global globalIdGenerator
-    
+def convert_data_to_unf_file(pdbFile, aaChains, naStrands, ligands, idGenerator, stats, output = OUTPUT_FILE_NAME, precision = None,
+    binaryCoordinates = False):
+    coordinatesWriter = unfreader.BinaryCoordinatesWriter(idGenerator.get_next_id()) if binaryCoordinates else None
+    unf_file_data = create_unf_file_data(pdbFile, aaChains, naStrands, ligands, idGenerator, stats, coordinatesWriter)
+    if coordinatesWriter != None:
+        return unfreader.output_unf_document_with_binary_coordinates(unf_file_data, idGenerator, output, stats, coordinatesWriter)
+    return unfutils.output_unf_document(unf_file_data, idGenerator, output, stats, precision)
+
+# Converts the structure given as a path, text stream or PDB ID (see load_pdb) to UNF.
+# If the output (path or text stream) is given, the UNF is written there and None is returned.
+# Otherwise, the UNF document is returned as a dict.
+# If the precision is given, the coordinates are rounded to the given number of decimals.
+# If binaryCoordinates is set, the coordinates are stored in a binary included file (see unfreader.BinaryCoordinatesWriter)
+# and the output must be given.
+def convert_pdb_to_unf(pdb_path, output = None, stats = None, useAtomium = False, jobs = 1, pdbCache = None, frameRange = None, precision = None,
+    binaryCoordinates = False):
+    if stats == None:
+        stats = unfutils.ConversionStats("pdb_to_unf", unfutils.VERBOSITY_QUIET)
+    idGenerator = unfutils.IdGenerator()
+    return convert_data_to_unf_file(*process_pdb(pdb_path, idGenerator, stats, useAtomium, jobs, pdbCache, frameRange),
+        idGenerator, stats, output, precision, binaryCoordinates)
+
+# Output file name used when more structures are converted at once
+def get_output_file_name(pdb_path):
+    return os.path.splitext(os.path.basename(pdb_path))[0] + ".unf"
+
+# Creates the UNF document. Strands, chains and ligands are generated
+# only when the document is being written. If the coordinates writer is given,
+# their coordinates are stored by it instead of the JSON arrays.
+def create_unf_file_data(pdbFile, aaChains, naStrands, ligands, idGenerator, stats, coordinatesWriter = None):
     unf_file_data = unfutils.initialize_unf_file_data_object(pdbFile.code + ", " + pdbFile.title,
          ", ".join(pdbFile.authors) + " (converted to UNF by PDB to UNF converter)")
     
     newStructure = {}
-    newStructure["id"] = globalIdGenerator
-    globalIdGenerator += 1
+    newStructure["id"] = idGenerator.get_next_id()
     newStructure["name"] = pdbFile.code
-    newStructure["naStrands"] = []
-    newStructure["aaChains"] = []
+    newStructure["naStrands"] = (create_unf_na_strand(strand, stats, coordinatesWriter) for strand in naStrands)
+    newStructure["aaChains"] = (create_unf_aa_chain(chain, stats, coordinatesWriter) for chain in aaChains)
+    unf_file_data["structures"] = iter([newStructure])
+
+    unf_file_data["molecules"]["ligands"] = (create_unf_ligand(ligand, stats, coordinatesWriter) for ligand in ligands)
+    return unf_file_data
 
-    for strand in naStrands:
+def create_unf_na_strand(strand, stats, coordinatesWriter = None):
+    with stats.phase("structure emission"):
         newStrObj = {}
         newStrObj["id"] = strand.id
         newStrObj["name"] = strand.name
@@ -278,36 +454,61 @@ def convert_data_to_unf_file(pdbFile, aaChains, naStrands, ligands):
         newStrObj["threePrimeId"] = strand.threePrime.id
         newStrObj["pdbFileId"] = -1
         newStrObj["chainName"] = strand.name
+        newStrObj["nucleotides"] = generate_unf_nucleotides(strand, coordinatesWriter == None)
+        if coordinatesWriter != None:
+            newStrObj[unfreader.BINARY_COORDINATES_KEY] = [coordinatesWriter.add(get_strand_coordinates(strand),
+                "altPositions", "nucleotides", unfreader.NUCLEOTIDE_POSITION_FIELDS)]
+    return newStrObj
+
+# Returns (nucleotides, frames, 4, 3) array of the nucleotide positions (see unfreader.NUCLEOTIDE_POSITION_FIELDS)
+def get_strand_coordinates(strand):
+    if strand.framePositions != None:
+        return np.stack([np.stack(positions, axis = 1) for positions in strand.framePositions], axis = 1)
+    ntPositions = []
+    currNucl = strand.fivePrime
+    while currNucl != None:
+        ntPos = currNucl.ntPos
+        ntPositions.append([[ntPos.nbCenter, ntPos.bbCenter, ntPos.baseNormal, ntPos.hydrogenFaceDir]])
+        currNucl = currNucl.next
+    return np.array(ntPositions)
+
+def generate_unf_nucleotides(strand, withPositions = True):
+    currNucl = strand.fivePrime
+    ntIdx = 0
+    while True:
+        newNucl = {}
+        newNucl["id"] = currNucl.id
+        newNucl["nbAbbrev"] = currNucl.nbName if len(currNucl.nbName) == 1 else currNucl.nbName[1]
+        newNucl["pair"] = -1
+        newNucl["prev"] = currNucl.prev.id if currNucl.prev != None else -1
+        newNucl["next"] = currNucl.next.id if currNucl.next != None else -1
+        newNucl["pdbId"] = currNucl.id
+
+        # Without positions, they are stored in the binary coordinates of the strand
+        if withPositions and strand.framePositions != None:
+            newNucl["altPositions"] = [create_unf_nucleotide_pos(nbCenters[ntIdx], bbCenters[ntIdx], baseNormals[ntIdx], hydrFaceDirs[ntIdx])
+                for nbCenters, bbCenters, baseNormals, hydrFaceDirs in strand.framePositions]
+        elif withPositions:
+            newNucl["altPositions"] = [create_unf_nucleotide_pos(currNucl.ntPos.nbCenter, currNucl.ntPos.bbCenter,
+                currNucl.ntPos.baseNormal, currNucl.ntPos.hydrogenFaceDir)]
+        yield newNucl
+
+        currNucl = currNucl.next
+        ntIdx += 1
         
-        newStrObj["nucleotides"] = []
-
-        currNucl = strand.fivePrime
-        while True:
-            newNucl = {}
-            newNucl["id"] = currNucl.id
-            newNucl["nbAbbrev"] = currNucl.nbName if len(currNucl.nbName) == 1 else currNucl.nbName[1]
-            newNucl["pair"] = -1
-            newNucl["prev"] = currNucl.prev.id if currNucl.prev != None else -1
-            newNucl["next"] = currNucl.next.id if currNucl.next != None else -1
-            newNucl["pdbId"] = currNucl.id
-
-            newNuclPos = {}
-            newNuclPos["nucleobaseCenter"] = currNucl.ntPos.nbCenter.tolist()
-            newNuclPos["backboneCenter"] = currNucl.ntPos.bbCenter.tolist()
-            newNuclPos["baseNormal"] = currNucl.ntPos.baseNormal.tolist()
-            newNuclPos["hydrogenFaceDir"] = currNucl.ntPos.hydrogenFaceDir.tolist()
-            
-            newNucl["altPositions"] = [newNuclPos]
-            newStrObj["nucleotides"].append(newNucl)
-
-            currNucl = currNucl.next
-            
-            if currNucl == None:
-                break
-
-        newStructure["naStrands"].append(newStrObj)
-
-    for chain in aaChains:
+        if currNucl == None:
+            break
+
+def create_unf_nucleotide_pos(nbCenter, bbCenter, baseNormal, hydrogenFaceDir):
+    newNuclPos = {}
+    newNuclPos["nucleobaseCenter"] = nbCenter.tolist()
+    newNuclPos["backboneCenter"] = bbCenter.tolist()
+    newNuclPos["baseNormal"] = baseNormal.tolist()
+    newNuclPos["hydrogenFaceDir"] = hydrogenFaceDir.tolist()
+    return newNuclPos
+
+def create_unf_aa_chain(chain, stats, coordinatesWriter = None):
+    with stats.phase("structure emission"):
         newChainObj = {}
         newChainObj["id"] = chain.id
         newChainObj["color"] = chain.color
@@ -315,63 +516,133 @@ def convert_data_to_unf_file(pdbFile, aaChains, naStrands, ligands):
         newChainObj["cTerm"] = chain.cTermAa.id
         newChainObj["pdbFileId"] = -1
         newChainObj["chainName"] = chain.name
-
-        newChainObj["aminoAcids"] = []
-
-        currAa = chain.nTermAa
-        while True:
-            newAa = {}
-            newAa["id"] = currAa.id
-            newAa["secondary"] = "NULL"
-            newAa["aaAbbrev"] = currAa.aaName
-            newAa["prev"] = currAa.prev.id if currAa.prev != None else -1
-            newAa["next"] = currAa.next.id if currAa.next != None else -1
-            newAa["pdbId"] = currAa.id
+        newChainObj["aminoAcids"] = generate_unf_amino_acids(chain, coordinatesWriter == None)
+        if coordinatesWriter != None:
+            newChainObj[unfreader.BINARY_COORDINATES_KEY] = [coordinatesWriter.add(get_chain_coordinates(chain), "altPositions", "aminoAcids")]
+    return newChainObj
+
+# Returns (amino acids, frames, 3) array of the amino acid positions
+def get_chain_coordinates(chain):
+    if chain.framePositions != None:
+        return np.stack(chain.framePositions, axis = 1)
+    caPositions = []
+    currAa = chain.nTermAa
+    while currAa != None:
+        caPositions.append([currAa.CApos])
+        currAa = currAa.next
+    return np.array(caPositions)
+
+def generate_unf_amino_acids(chain, withPositions = True):
+    currAa = chain.nTermAa
+    aaIdx = 0
+    while True:
+        newAa = {}
+        newAa["id"] = currAa.id
+        newAa["secondary"] = "NULL"
+        newAa["aaAbbrev"] = currAa.aaName
+        newAa["prev"] = currAa.prev.id if currAa.prev != None else -1
+        newAa["next"] = currAa.next.id if currAa.next != None else -1
+        newAa["pdbId"] = currAa.id
+        # Without positions, they are stored in the binary coordinates of the chain
+        if withPositions and chain.framePositions != None:
+            newAa["altPositions"] = [positions[aaIdx].tolist() for positions in chain.framePositions]
+        elif withPositions:
             newAa["altPositions"] = [currAa.CApos.tolist()]
+        yield newAa
 
-            newChainObj["aminoAcids"].append(newAa)
-
-            currAa = currAa.next
-            if currAa == None:
-                break
+        currAa = currAa.next
+        aaIdx += 1
+        if currAa == None:
+            break
 
-        newStructure["aaChains"].append(newChainObj)
-    
-    unf_file_data["structures"].append(newStructure)
-
-    for ligand in ligands:
+def create_unf_ligand(ligand, stats, coordinatesWriter = None):
+    with stats.phase("structure emission"):
         newLigandObj = {}
         newLigandObj["id"] = ligand.id
         newLigandObj["name"] = ligand.name
         newLigandObj["externalFileId"] = -1
         newLigandObj["bonds"] = []
-        newLigandObj["positions"] = [ligand.com.tolist()]
-        newLigandObj["orientations"] = [[0, 0, 0]]
+        framePositions = ligand.framePositions if ligand.framePositions != None else [(ligand.com, ligand.atomOffsets)]
+        positions = np.stack([com for com, atomOffsets in framePositions])
+        if coordinatesWriter == None:
+            newLigandObj["positions"] = positions.tolist()
+        newLigandObj["orientations"] = [[0, 0, 0]] * len(framePositions)
         
         atoms = []
+        # (atoms, frames, 3) array of atom offsets
+        atomPositions = np.stack([atomOffsets for com, atomOffsets in framePositions], axis = 1)
 
-        for atom in ligand.atoms:
+        for atIdx, (atName, elName) in enumerate(zip(ligand.atoms.names.tolist(), ligand.atoms.elements.tolist())):
             newAtom = {}
-            newAtom["atomName"] = atom.atName
-            newAtom["elementName"] = atom.elName
-            newAtom["positions"] = [atom.position.tolist()]
+            newAtom["atomName"] = atName
+            newAtom["elementName"] = elName
+            if coordinatesWriter == None:
+                newAtom["positions"] = atomPositions[atIdx].tolist()
             atoms.append(newAtom)
 
         newLigandObj["atoms"] = atoms
-        unf_file_data["molecules"]["ligands"].append(newLigandObj)
-
-    unf_file_data["idCounter"] = globalIdGenerator
-
-    with open(OUTPUT_FILE_NAME, 'w') as outfile:
-        json.dump(unf_file_data, outfile)    
+        if coordinatesWriter != None:
+            newLigandObj[unfreader.BINARY_COORDINATES_KEY] = [coordinatesWriter.add(positions, "positions"),
+                coordinatesWriter.add(atomPositions, "positions", "atoms")]
+    return newLigandObj
 
 def main():
-    if len(sys.argv) < 2 or sys.argv[1] == "-h":
-        print("usage pdb_to_unf.py <pdb_path>")
+    pdbPaths = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if len(pdbPaths) < 1 or sys.argv[1] == "-h":
+        print("usage pdb_to_unf.py <pdb_path> [<pdb_path> ...] [options]")
         print("<pdb_path> = path to PDB/MMTF/CIF file. If the file is not available locally, it will be fetched from RCSB data bank.")
+        print("             Fetched structures can be given as <ID> or <ID>.<format> (cif [default] or pdb) and are stored in a local cache.")
+        print("             <ID>.mmtf and http(s) URLs are fetched by atomium without the cache.")
+        print("When more structures are given, each one is converted to <file_name_or_ID>.unf instead of " + OUTPUT_FILE_NAME + ".")
+        print("Options:")
+        print("--use-atomium = parses PDB/CIF files with atomium instead of the built-in reader")
+        print("--jobs=<n> = number of processes used to process the chains [default 1]")
+        print("--cache-dir=<path> = directory of the cache of fetched structures [default " + pdbcache.DEFAULT_CACHE_DIR + "]")
+        print("--cache-size=<MB> = size limit of the cache [default " + str(pdbcache.DEFAULT_CACHE_SIZE_MB) + "]")
+        print("--mirror=<url> = URL or local directory from which the structures are fetched [default " + pdbcache.DEFAULT_MIRROR_URL + "]")
+        print("--fetch-jobs=<n> = number of structures fetched concurrently [default " + str(pdbcache.DEFAULT_FETCH_JOBS) + "]")
+        print("--frames=<range> = converts the models (e.g., NMR ensemble or MD trajectory frames) as alternative positions;")
+        print("                   'all' or <first>:<end> (0-based, end excluded) [default first model only, PDB/CIF files only]")
+        print("--precision=<n> = number of decimals of the written coordinates (in angstroms) [default full precision]")
+        print("--binary-coordinates = stores the coordinates as float32 arrays in an included file instead of JSON arrays")
+        unfutils.print_compression_cli_usage(OUTPUT_FILE_NAME)
+        unfutils.print_stats_cli_usage()
         sys.exit(1)
 
-    convert_data_to_unf_file(*process_pdb(sys.argv[1]))
+    stats = unfutils.create_stats_from_cli("pdb_to_unf", sys.argv)
+    jobs = int(unfutils.get_cli_option(sys.argv, "jobs", 1))
+    useAtomium = unfutils.has_cli_flag(sys.argv, "use-atomium")
+    frameRange = unfutils.get_cli_option(sys.argv, "frames", None)
+    frameRange = parse_frame_range(frameRange) if frameRange != None else None
+    precision = unfutils.get_cli_option(sys.argv, "precision", None)
+    precision = int(precision) if precision != None else None
+    binaryCoordinates = unfutils.has_cli_flag(sys.argv, "binary-coordinates")
+    compression = unfutils.get_cli_option(sys.argv, "compress", None)
+
+    # Structures which are not available locally are fetched into the cache at once before the conversion
+    pdbCache = None
+    failedIds = set()
+    pdbIds = [pdbPath for pdbPath in pdbPaths if not os.path.isfile(pdbPath) and pdbcache.is_cacheable_id(pdbPath)]
+    if len(pdbIds) > 0:
+        pdbCache = pdbcache.PdbCache(unfutils.get_cli_option(sys.argv, "cache-dir", pdbcache.DEFAULT_CACHE_DIR),
+            float(unfutils.get_cli_option(sys.argv, "cache-size", pdbcache.DEFAULT_CACHE_SIZE_MB)),
+            unfutils.get_cli_option(sys.argv, "mirror", pdbcache.DEFAULT_MIRROR_URL))
+        with stats.phase("fetch"):
+            paths, errors = pdbCache.get_paths(pdbIds, int(unfutils.get_cli_option(sys.argv, "fetch-jobs", pdbcache.DEFAULT_FETCH_JOBS)))
+        for pdbId, error in errors:
+            print("Error! Structure", pdbId, "could not be fetched:", error)
+            failedIds.add(pdbId)
+
+    for pdbPath in pdbPaths:
+        if pdbPath in failedIds:
+            continue
+        output = unfutils.get_compressed_file_name(OUTPUT_FILE_NAME if len(pdbPaths) == 1 else get_output_file_name(pdbPath), compression)
+        if len(pdbPaths) > 1:
+            stats.log("Converting", pdbPath, "to", output)
+        convert_pdb_to_unf(pdbPath, output, stats, useAtomium, jobs, pdbCache, frameRange, precision, binaryCoordinates)
+    unfutils.finish_stats_from_cli(stats, sys.argv)
+    if len(failedIds) > 0:
+        sys.exit(1)
 
 if __name__ == '__main__':
   main()
@@ -2,34 +2,108 @@
 # Code is using Python 3
 
 import sys
-import json
+import os
+import itertools
+import concurrent.futures
 import modules.unf_utils as unfutils
+import modules.unf_reader as unfreader
 
 OUTPUT_FILE_NAME_BASICS = "output"
 OUTPUT_FILE_NAME_EXTENSION = ".json"
 
-def process_unf_file(unf_path):
-    file = open(unf_path, "r")
-    fileContent = file.read()
-    jsonPartEndIdx = fileContent.find("#INCLUDED_FILE ")
-    if jsonPartEndIdx > -1:
-        jsonPart = fileContent[0:jsonPartEndIdx]
-    else:
-        jsonPart = fileContent
-    parsedData = json.loads(jsonPart)
+# Strand fields used by the lattice export (the strands' nucleotides are not needed)
+EXPORTED_STRAND_FIELDS = ["isScaffold", "fivePrimeId", "color"]
 
-    id_to_str_nucl_tuple = get_nucl_id_dict(parsedData["structures"])
+# Converts the lattices of the UNF given as a path, text stream or parsed dict to cadnano files.
+# If the output directory is given, N-th lattice is written to <outputDir>/output<N>.json
+# and the paths of the written files are returned. Otherwise, the cadnano documents are returned as dicts.
+# With more jobs, the lattices are converted in parallel (the results keep the order of the lattices).
+def convert_unf_to_cadnano(unf, outputDir = None, stats = None, jobs = 1):
+    if stats == None:
+        stats = unfutils.ConversionStats("unf_to_cadnano", unfutils.VERBOSITY_QUIET)
 
+    with stats.phase("parse"):
+        parsedData = unfreader.load_unf_core(unf)
+
+    with stats.phase("link"):
+        id_to_str_nucl_tuple = get_nucl_id_dict(parsedData["structures"])
+
+    stats.count("nucleotides", len(id_to_str_nucl_tuple))
+
+    lattices = parsedData["lattices"]
+    if jobs > 1 and len(lattices) > 1:
+        return convert_unf_lattices_in_parallel(lattices, id_to_str_nucl_tuple, stats, outputDir, jobs)
+
+    results = []
     counter = 1
-    for lattice in parsedData["lattices"]:
-        convert_unf_lattice_to_cadnano(lattice, counter, id_to_str_nucl_tuple)
+    for lattice in lattices:
+        results.append(convert_unf_lattice_to_cadnano(lattice, counter, id_to_str_nucl_tuple, stats, outputDir))
         counter += 1
+    return results
+
+# Each worker gets only the lattice and the nucleotides/strands it references
+def convert_unf_lattices_in_parallel(lattices, id_to_str_nucl_tuple, stats, outputDir, jobs):
+    with stats.phase("link"):
+        latticeNuclDicts = [get_lattice_nucl_id_dict(lattice, id_to_str_nucl_tuple) for lattice in lattices]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = jobs) as executor:
+        latticesResults = list(executor.map(convert_unf_lattice_isolated, lattices, range(1, len(lattices) + 1),
+         latticeNuclDicts, [outputDir] * len(lattices), [stats.verbosity] * len(lattices), [stats.traceMemory] * len(lattices)))
+
+    results = []
+    for result, workerStats in latticesResults:
+        stats.merge(workerStats)
+        results.append(result)
+    return results
+
+# Converts the lattice with its own stats so that it can be run in a separate process
+def convert_unf_lattice_isolated(lattice, counter, id_to_str_nucl_tuple, outputDir, verbosity, traceMemory):
+    stats = unfutils.ConversionStats("unf_to_cadnano", verbosity, traceMemory)
+    result = convert_unf_lattice_to_cadnano(lattice, counter, id_to_str_nucl_tuple, stats, outputDir)
+    return (result, stats)
+
+# Returns the part of the nucleotide ID dictionary (see get_nucl_id_dict) referenced by the lattice's cells.
+# Strands are reduced to the fields used by the export and nucleotides to their links.
+def get_lattice_nucl_id_dict(lattice, id_to_str_nucl_tuple):
+    strandSummaries = {}
+    id_dict = {}
+    for vhelix in lattice["virtualHelices"]:
+        for cell in vhelix["cells"]:
+            for nuclId in itertools.chain(cell["fiveToThreeNts"], cell["threeToFiveNts"]):
+                strand, nucleotide = id_to_str_nucl_tuple[nuclId]
+                if strand["id"] not in strandSummaries:
+                    strandSummaries[strand["id"]] = {field: strand[field] for field in EXPORTED_STRAND_FIELDS}
+                id_dict[nuclId] = (strandSummaries[strand["id"]], {"prev": nucleotide["prev"], "next": nucleotide["next"]})
+    return id_dict
 
-def convert_unf_lattice_to_cadnano(lattice, counter, id_to_str_nucl_tuple):
+def process_unf_file(unf_path, stats, jobs = 1):
+    convert_unf_to_cadnano(unf_path, "", stats, jobs)
+
+def convert_unf_lattice_to_cadnano(lattice, counter, id_to_str_nucl_tuple, stats, outputDir = ""):
     outputFileName = OUTPUT_FILE_NAME_BASICS + str(counter) + OUTPUT_FILE_NAME_EXTENSION 
+    with stats.phase("cell assignment"):
+        outputFileData = create_cadnano_file_data(lattice, outputFileName, id_to_str_nucl_tuple)
+
+    stats.count("lattices")
+    stats.count("vstrands", len(outputFileData["vstrands"]))
+
+    if outputDir == None:
+        return outputFileData
+
+    outputPath = os.path.join(outputDir, outputFileName)
+    with stats.phase("serialization"):
+        with open(outputPath, 'w') as outfile:
+            stats.log("Processed and outputed UNF lattice to a file: " + outputPath)
+            # Each vstrand is serialized and written separately
+            outputFileData["vstrands"] = iter(outputFileData["vstrands"])
+            unfutils.JsonStreamWriter(outfile).write_document(outputFileData)
+    return outputPath
+
+def create_cadnano_file_data(lattice, outputFileName, id_to_str_nucl_tuple):
     outputFileData = init_cadnano_file_structure(outputFileName)
 
     nucl_id_to_cell_data = {}
+    num_to_vstrand = {}
     
     # vstrands where the scaffold is in the 5'3' direction carry even "num" value 
     #          in the cadnano files          
@@ -79,58 +153,35 @@ def convert_unf_lattice_to_cadnano(lattice, counter, id_to_str_nucl_tuple):
                 vstrData["loop"][cell["number"]] = max(len(cell["fiveToThreeNts"]), len(cell["threeToFiveNts"])) - 1
 
         outputFileData["vstrands"].append(vstrData)
+        num_to_vstrand[num] = vstrData
 
     for vhelix in lattice["virtualHelices"]:
         for cell in vhelix["cells"]:
-            for ftt in cell["fiveToThreeNts"]:
-                vc_tup = nucl_id_to_cell_data[ftt]
-                sn_tup = id_to_str_nucl_tuple[ftt]
-                isScaf = sn_tup[0]["isScaffold"]
-                prevId = sn_tup[1]["prev"]
-                nextId = sn_tup[1]["next"]
-
-                cellNum = cell["number"]
-                vstrand = next(x for x in outputFileData["vstrands"] if x["num"] == vc_tup[0])
-                if prevId >= 0 and nucl_id_to_cell_data[prevId][1] != cell:
-                    strArr = "stap"
-                    if isScaf:
-                        strArr = "scaf"
-                    vstrand[strArr][cellNum][0] = nucl_id_to_cell_data[prevId][0]
-                    vstrand[strArr][cellNum][1] = nucl_id_to_cell_data[prevId][1]["number"]
-
-                if nextId >= 0 and nucl_id_to_cell_data[nextId][1] != cell:
-                    strArr = "stap"
-                    if isScaf:
-                        strArr = "scaf"
-                    vstrand[strArr][cellNum][2] = nucl_id_to_cell_data[nextId][0]
-                    vstrand[strArr][cellNum][3] = nucl_id_to_cell_data[nextId][1]["number"]
-            
-            for ttf in cell["threeToFiveNts"]:
-                vc_tup = nucl_id_to_cell_data[ttf]
-                sn_tup = id_to_str_nucl_tuple[ttf]
+            for nuclId in itertools.chain(cell["fiveToThreeNts"], cell["threeToFiveNts"]):
+                vc_tup = nucl_id_to_cell_data[nuclId]
+                sn_tup = id_to_str_nucl_tuple[nuclId]
                 isScaf = sn_tup[0]["isScaffold"]
                 prevId = sn_tup[1]["prev"]
                 nextId = sn_tup[1]["next"]
 
                 cellNum = cell["number"]
-                vstrand = next(x for x in outputFileData["vstrands"] if x["num"] == vc_tup[0])
-                if prevId >= 0 and nucl_id_to_cell_data[prevId][1] != cell:
+                vstrand = num_to_vstrand[vc_tup[0]]
+                # Cells are compared by their IDs since they are unique within the UNF file
+                if prevId >= 0 and nucl_id_to_cell_data[prevId][1]["id"] != cell["id"]:
                     strArr = "stap"
                     if isScaf:
                         strArr = "scaf"
                     vstrand[strArr][cellNum][0] = nucl_id_to_cell_data[prevId][0]
                     vstrand[strArr][cellNum][1] = nucl_id_to_cell_data[prevId][1]["number"]
 
-                if nextId >= 0 and nucl_id_to_cell_data[nextId][1] != cell:
+                if nextId >= 0 and nucl_id_to_cell_data[nextId][1]["id"] != cell["id"]:
                     strArr = "stap"
                     if isScaf:
                         strArr = "scaf"
                     vstrand[strArr][cellNum][2] = nucl_id_to_cell_data[nextId][0]
                     vstrand[strArr][cellNum][3] = nucl_id_to_cell_data[nextId][1]["number"]
 
-    with open(outputFileName, 'w') as outfile:
-        print("Processed and outputed UNF lattice to a file: " + outputFileName)
-        json.dump(outputFileData, outfile)
+    return outputFileData
 
 
 def init_cadnano_file_structure(name):
@@ -171,11 +222,16 @@ def get_nucl_id_dict(structures):
 
 def main():
     if len(sys.argv) < 2 or sys.argv[1] == "-h":
-        print("usage: unf_to_cadnano.py <unf_file_path>")
+        print("usage: unf_to_cadnano.py <unf_file_path> [options]")
+        print("Options:")
+        print("--jobs=<n> = number of processes used to export the lattices [default 1]")
+        unfutils.print_stats_cli_usage()
         sys.exit(1)
 
     unf_path = sys.argv[1]
-    process_unf_file(unf_path)
+    stats = unfutils.create_stats_from_cli("unf_to_cadnano", sys.argv)
+    process_unf_file(unf_path, stats, int(unfutils.get_cli_option(sys.argv, "jobs", 1)))
+    unfutils.finish_stats_from_cli(stats, sys.argv)
 
 if __name__ == '__main__':
   main()
\ No newline at end of file
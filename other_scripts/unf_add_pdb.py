@@ -2,9 +2,16 @@
 # Code is using Python 3
 
 import sys
+import os
+import io
 import json
-import re
-import hashlib
+import codecs
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "converters"))
+
+import modules.unf_utils as unfutils
+import modules.unf_reader as unfreader
 
 OUTPUT_FILE_NAME = "output.unf"
 
@@ -17,64 +24,212 @@ def parse_args(argv):
 
     return (unfFile, pdbFile, molName, molPos, molRot)
 
-def modify_unf(unfFile, pdbFile, molName, molPos, molRot):
-    file = open(unfFile, "r")
-    fileContent = file.read()
-    jsonPartEndIdx = fileContent.find("#INCLUDED_FILE ")
-    if jsonPartEndIdx > -1:
-        jsonPart = fileContent[0:jsonPartEndIdx]
-    else:
-        jsonPart = fileContent
-    parsedData = json.loads(jsonPart)
+def load_unf(unf):
+    if isinstance(unf, tuple):
+        return unf
+    return unfutils.load_unf_input(unf)
 
+# Adds the external files and molecules referencing them to the parsed JSON core.
+# Molecules are given as (PDB path, name, position, orientation) tuples.
+# Returns (path, hash, content length in bytes) tuples of the PDB files to be included
+# (in the order of the molecules).
+def add_molecules(parsedData, molecules):
     idCounter = parsedData["idCounter"]
-    # Back slashes are replaced because they are escaped in JSON
-    # which causes some issues when matching appended file name and JSON data
-    pdbFile = pdbFile.replace("\\", "/")
-
-    newExternalFile = {}
-    newExternalFile["id"] = idCounter
-    idCounter += 1
-    newExternalFile["path"] = pdbFile
-    newExternalFile["isIncluded"] = True
-
-    with open(pdbFile, "r") as file:
-        pdbFullContent = file.read()
-        pdbContent = re.sub("\r\n|\n|\r", "", pdbFullContent)
-
-    newExternalFile["hash"] = hashlib.md5(pdbContent.encode("utf-8")).hexdigest()
-    parsedData["externalFiles"].append(newExternalFile)
-
-    newMolecule = {}
-    newMolecule["id"] = idCounter
-    idCounter += 1
-    newMolecule["name"] = molName
-    newMolecule["type"] = "NULL"
-    newMolecule["externalFileId"] = idCounter - 2
-    newMolecule["positions"] = [[int(mp) for mp in molPos]]
-    newMolecule["orientations"] = [[int(mr) for mr in molRot]]
-
-    parsedData["molecules"]["others"].append(newMolecule)
+    pdbFiles = []
+
+    for pdbFile, molName, molPos, molRot in molecules:
+        # Back slashes are replaced because they are escaped in JSON
+        # which causes some issues when matching appended file name and JSON data
+        pdbFile = pdbFile.replace("\\", "/")
+
+        newExternalFile = {}
+        newExternalFile["id"] = idCounter
+        idCounter += 1
+        newExternalFile["path"] = pdbFile
+        newExternalFile["isIncluded"] = True
+        fileHash, fileLength = get_included_content_info(pdbFile)
+        newExternalFile["hash"] = fileHash
+        parsedData["externalFiles"].append(newExternalFile)
+
+        newMolecule = {}
+        newMolecule["id"] = idCounter
+        idCounter += 1
+        newMolecule["name"] = molName
+        newMolecule["type"] = "NULL"
+        newMolecule["externalFileId"] = idCounter - 2
+        newMolecule["positions"] = [[int(mp) for mp in molPos]]
+        newMolecule["orientations"] = [[int(mr) for mr in molRot]]
+
+        parsedData["molecules"]["others"].append(newMolecule)
+        pdbFiles.append((pdbFile, fileHash, fileLength))
+
     parsedData["idCounter"] = idCounter
+    return pdbFiles
+
+# PDB files are read as UTF-8 text with universal newlines, i.e., they are included with '\n' line endings
+def open_pdb_file(pdbFile):
+    return open(pdbFile, "r", encoding = "utf-8", newline = None)
+
+# Returns the hash of the PDB file and the length of its content as it is included
+# (read as text by open_pdb_file and written in UTF-8)
+def get_included_content_info(pdbFile):
+    hasher = unfutils.IncludedFileHasher()
+    length = 0
+    with open_pdb_file(pdbFile) as file:
+        while True:
+            chunk = file.read(unfutils.READ_CHUNK_SIZE).encode("utf-8")
+            if not chunk:
+                break
+            hasher.update(chunk)
+            length += len(chunk)
+    return (hasher.hexdigest(), length)
+
+# Writes the PDB content as an included file, chunk by chunk
+def write_included_file(outfile, pdbFile):
+    write_text(outfile, "\n" + unfutils.INCLUDED_FILE_TAG + pdbFile + "\n")
+    with open_pdb_file(pdbFile) as file:
+        while True:
+            chunk = file.read(unfutils.READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            write_text(outfile, chunk)
+
+# Outputs are either text streams or binary files/streams
+def write_text(outfile, text):
+    outfile.write(text if isinstance(outfile, io.TextIOBase) else text.encode("utf-8"))
+
+# Appends the index entries of the new included files. The first new file starts
+# after the line break following the existing files (the length of which is given).
+def add_included_files_index_entries(entries, existingLength, pdbFiles):
+    sectionEnd = existingLength if len(entries) > 0 else -1
+    for pdbFile, fileHash, fileLength in pdbFiles:
+        offset = sectionEnd + 1 + len(unfreader.get_included_file_tag_line(pdbFile))
+        entries.append(unfreader.create_included_file_entry(pdbFile, offset, fileLength, fileHash))
+        sectionEnd = offset + fileLength
+    return entries
+
+# Adds the PDB file as an included file and a new molecule referencing it to the UNF.
+# The UNF can be given as a path, text stream or a tuple (parsed JSON core, included files' text).
+# If the output (path or text stream) is given, the resulting UNF is written there.
+# Otherwise, the tuple (parsed JSON core, included files' text) of the resulting UNF is returned.
+def add_pdb_to_unf(unf, pdbFile, molName, molPos, molRot, output = None):
+    return add_pdbs_to_unf(unf, [(pdbFile, molName, molPos, molRot)], output)
+
+# Adds more PDB files at once (see add_pdb_to_unf). Molecules are given as
+# (PDB path, name, position, orientation) tuples. When the UNF is given as a path and written
+# to an output, only the JSON core is held in memory; the existing and new included files
+# are streamed to the output. The index of the included files is stored in the JSON core.
+def add_pdbs_to_unf(unf, molecules, output = None):
+    if output == None or isinstance(unf, tuple) or unfutils.is_stream(unf):
+        parsedData, includedFiles = load_unf(unf)
+        pdbFiles = add_molecules(parsedData, molecules)
+
+        # The PDB contents are appended after the JSON core and the already included files
+        # (without the line break ending the UNF file which is written after the new files)
+        includedBytes = includedFiles.encode("utf-8", unfutils.INCLUDED_FILES_ERRORS)
+        entries = unfreader.get_included_files_index(io.BytesIO(includedBytes), parsedData, 0 if len(includedBytes) > 0 else None)
+        buffer = io.StringIO()
+        buffer.write(includedBytes[:unfreader.get_included_files_end(entries)].decode("utf-8", unfutils.INCLUDED_FILES_ERRORS))
+        for pdbFile, fileHash, fileLength in pdbFiles:
+            write_included_file(buffer, pdbFile)
+        buffer.write("\n")
+        includedFiles = buffer.getvalue()
+
+        includedBytes = includedFiles.encode("utf-8", unfutils.INCLUDED_FILES_ERRORS)
+        includedStart = includedBytes.find(unfutils.INCLUDED_FILE_TAG_BYTES)
+        parsedData.setdefault("misc", {})[unfreader.INCLUDED_FILES_INDEX_KEY] = unfreader.scan_included_files(io.BytesIO(includedBytes),
+            includedStart if includedStart > -1 else None, parsedData["externalFiles"])
+
+        if output == None:
+            return (parsedData, includedFiles)
+        with unfutils.open_text_output(output) as outfile:
+            write_unf(outfile, parsedData, includedFiles)
+        return
+
+    # The output replaces the input only after it is completely written
+    if not unfutils.is_stream(unf) and not unfutils.is_stream(output) and os.path.exists(output) and os.path.samefile(unf, output):
+        tmpOutput = unfutils.get_temporary_file_name(output)
+        add_pdbs_to_unf(unf, molecules, tmpOutput)
+        os.replace(tmpOutput, output)
+        return
+
+    with unfreader.UnfReader(unf) as reader, open_binary_output(output) as outfile:
+        parsedData = reader.get_core()
+        entries = reader.get_included_files_index()
+        pdbFiles = add_molecules(parsedData, molecules)
+        # The line break ending the UNF file is not copied, it is written after the new files
+        existingLength = unfreader.get_included_files_end(entries)
+        parsedData.setdefault("misc", {})[unfreader.INCLUDED_FILES_INDEX_KEY] = add_included_files_index_entries(entries, existingLength, pdbFiles)
+
+        write_text(outfile, unfutils.json_dumps(parsedData))
+        # The existing included files are copied from the mapped file as they are
+        decoder = codecs.getincrementaldecoder("utf-8")(unfutils.INCLUDED_FILES_ERRORS) if isinstance(outfile, io.TextIOBase) else None
+        existingEnd = reader.get_core_end() + existingLength
+        for chunkStart in range(reader.get_core_end(), existingEnd, unfutils.READ_CHUNK_SIZE):
+            chunk = reader.data[chunkStart:min(chunkStart + unfutils.READ_CHUNK_SIZE, existingEnd)]
+            outfile.write(decoder.decode(chunk) if decoder != None else chunk)
+        for pdbFile, fileHash, fileLength in pdbFiles:
+            write_included_file(outfile, pdbFile)
+        write_text(outfile, "\n")
+
+# Compressed outputs (see unfutils.get_output_compression) are compressed as they are written.
+# Text streams are written via their binary buffer (if they have one) as the included files may be binary.
+@contextlib.contextmanager
+def open_binary_output(output):
+    if unfutils.is_stream(output) and isinstance(output, io.TextIOBase) and hasattr(output, "buffer"):
+        output.flush()
+        yield output.buffer
+        output.buffer.flush()
+    elif unfutils.is_stream(output):
+        yield output
+    elif unfutils.get_output_compression(output) != None:
+        with unfutils.open_compressed_file(output, unfutils.get_output_compression(output), "wb") as outfile:
+            yield outfile
+    else:
+        with open(output, "wb") as outfile:
+            yield outfile
+
+def write_unf(outfile, parsedData, includedFiles):
+    outfile.write(unfutils.json_dumps(parsedData))
+    unfutils.write_included_files_text(outfile, includedFiles)
+
+# Reads the molecules from a JSON manifest (PDB paths are relative to the manifest's directory):
+# { "molecules": [ { "pdb": "molecule.pdb", "name": "molecule", "position": "0,0,0", "orientation": "0,0,0" }, ... ] }
+# Positions and orientations can be given as "x,y,z" strings or lists of numbers.
+def load_manifest(manifestPath):
+    with open(manifestPath, "r") as file:
+        manifest = json.load(file)
+    baseDir = os.path.dirname(manifestPath)
+
+    def parse_vector(value):
+        return value.split(",") if isinstance(value, str) else value
 
-    with open(OUTPUT_FILE_NAME, "w") as outfile:
-        json.dump(parsedData, outfile)
-        if jsonPartEndIdx > -1:
-            outfile.write(fileContent[jsonPartEndIdx:])
+    return [(os.path.join(baseDir, mol["pdb"]), mol["name"], parse_vector(mol.get("position", "0,0,0")),
+        parse_vector(mol.get("orientation", "0,0,0"))) for mol in manifest["molecules"]]
 
-    # After the JSON-based operations are finished, let's
-    # append the PDB content to the end of the UNF file
-    with open(OUTPUT_FILE_NAME, "a") as outfile:
-        outfile.write("\n#INCLUDED_FILE ")
-        outfile.write(pdbFile + "\n")
-        outfile.write(pdbFullContent)
+def modify_unf(unfFile, pdbFile, molName, molPos, molRot, output = OUTPUT_FILE_NAME):
+    add_pdb_to_unf(unfFile, pdbFile, molName, molPos, molRot, output)
 
 def main():
-    if len(sys.argv) != 6 or sys.argv[1] == "-h":
-        print("usage unf_add_pdb.py <unf_path> <pdb_path> <molecule_name> <x_pos,y_pos,z_pos> <x_rot,y_rot,z_rot>")
+    args = [arg for arg in sys.argv if not arg.startswith("--")]
+    manifestPath = unfutils.get_cli_option(sys.argv, "manifest", None)
+    output = unfutils.get_compressed_file_name(OUTPUT_FILE_NAME, unfutils.get_cli_option(sys.argv, "compress", None))
+
+    if len(args) == 2 and manifestPath != None:
+        add_pdbs_to_unf(args[1], load_manifest(manifestPath), output)
+        return
+
+    if len(args) != 6 or sys.argv[1] == "-h":
+        print("usage unf_add_pdb.py <unf_path> <pdb_path> <molecule_name> <x_pos,y_pos,z_pos> <x_rot,y_rot,z_rot> [options]")
+        print("      unf_add_pdb.py <unf_path> --manifest=<manifest_path> [options]")
+        print("The manifest is a JSON file listing more molecules to be added at once:")
+        print('{ "molecules": [ { "pdb": "molecule.pdb", "name": "molecule", "position": "0,0,0", "orientation": "0,0,0" }, ... ] }')
+        print("The input UNF can be compressed (gzip or xz).")
+        print("Options:")
+        unfutils.print_compression_cli_usage(OUTPUT_FILE_NAME)
         sys.exit(1)
 
-    modify_unf(*parse_args(sys.argv))    
+    modify_unf(*parse_args(args), output)
 
 if __name__ == '__main__':
-  main()
\ No newline at end of file
+  main()
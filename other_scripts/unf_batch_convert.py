@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# Code is using Python 3
+
+# Runs many conversions described by a JSON manifest in a process pool.
+# Each output is keyed by a hash of its inputs' content, the job options and the converters' source code,
+# so the jobs whose inputs did not change since the last run are skipped.
+#
+# Manifest layout (paths are relative to the manifest's directory):
+# {
+#   "jobs": [
+#     { "type": "cadnano", "inputs": [["design.json", "square", "0,0,0", "0,0,0"], ...], "output": "design.unf" },
+#     { "type": "pdb", "input": "structure.pdb", "output": "structure.unf" },
+#     { "type": "add_pdb", "input": "design.unf", "pdb": "molecule.pdb", "name": "molecule",
+#       "position": "0,0,0", "orientation": "0,0,0", "output": "design_with_molecule.unf" }
+#   ]
+# }
+# Jobs using an output of another job as their input are run after that job finishes.
+
+import sys
+import os
+import json
+import hashlib
+import concurrent.futures
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CONVERTERS_DIR = os.path.join(SCRIPT_DIR, "..", "converters")
+sys.path.insert(0, CONVERTERS_DIR)
+sys.path.insert(0, SCRIPT_DIR)
+
+import modules.unf_utils as unfutils
+
+CACHE_FILE_NAME = ".unf_batch_cache.json"
+HASH_CHUNK_SIZE = 1 << 20
+
+# Source files whose change invalidates all cached outputs
+CONVERTER_SOURCES = [
+    os.path.join(CONVERTERS_DIR, "cadnano_to_unf.py"),
+    os.path.join(CONVERTERS_DIR, "pdb_to_unf.py"),
+    os.path.join(CONVERTERS_DIR, "modules", "unf_utils.py"),
+    os.path.join(CONVERTERS_DIR, "modules", "pdb_reader.py"),
+    os.path.join(CONVERTERS_DIR, "modules", "pdb_cache.py"),
+    os.path.join(SCRIPT_DIR, "unf_add_pdb.py")
+]
+
+def get_job_inputs(job):
+    if job["type"] == "cadnano":
+        return [inp[0] for inp in job["inputs"]]
+    elif job["type"] == "add_pdb":
+        return [job["input"], job["pdb"]]
+    return [job["input"]]
+
+def hash_file(path, hasher):
+    with open(path, "rb") as file:
+        while True:
+            chunk = file.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+
+def get_job_key(job, baseDir, convertersHash):
+    hasher = hashlib.sha256()
+    hasher.update(convertersHash.encode("utf-8"))
+    hasher.update(json.dumps(job, sort_keys = True).encode("utf-8"))
+    for inputPath in get_job_inputs(job):
+        fullPath = os.path.join(baseDir, inputPath)
+        # Inputs which are not local files (e.g., PDB IDs to be fetched) are keyed by their name only
+        if os.path.isfile(fullPath):
+            hash_file(fullPath, hasher)
+    return hasher.hexdigest()
+
+def get_converters_hash():
+    hasher = hashlib.sha256()
+    for sourcePath in CONVERTER_SOURCES:
+        hash_file(sourcePath, hasher)
+    return hasher.hexdigest()
+
+# Splits the jobs into stages so that each job runs after the jobs producing its inputs.
+# Raises ValueError if the jobs depend on each other cyclically.
+def get_job_stages(jobs):
+    producers = {os.path.normpath(job["output"]): idx for idx, job in enumerate(jobs)}
+    stageOfJob = {}
+
+    def get_stage(idx, visited):
+        if idx in stageOfJob:
+            return stageOfJob[idx]
+        if idx in visited:
+            raise ValueError("Cyclic dependency of the job producing " + jobs[idx]["output"])
+        visited.add(idx)
+        stage = 0
+        for inputPath in get_job_inputs(jobs[idx]):
+            producerIdx = producers.get(os.path.normpath(inputPath))
+            if producerIdx != None and producerIdx != idx:
+                stage = max(stage, get_stage(producerIdx, visited) + 1)
+        stageOfJob[idx] = stage
+        return stage
+
+    for idx in range(len(jobs)):
+        get_stage(idx, set())
+
+    stages = [[] for i in range(max(stageOfJob.values(), default = -1) + 1)]
+    for idx in range(len(jobs)):
+        stages[stageOfJob[idx]].append(idx)
+    return stages
+
+# Runs in a worker process whose working directory is the manifest's directory.
+# The output is written to a temporary file first so that interrupted jobs leave no partial outputs.
+def run_job(job):
+    import cadnano_to_unf
+    import pdb_to_unf
+    import unf_add_pdb
+
+    outputPath = job["output"]
+    outputDir = os.path.dirname(outputPath)
+    if len(outputDir) > 0:
+        os.makedirs(outputDir, exist_ok = True)
+    tmpPath = unfutils.get_temporary_file_name(outputPath)
+
+    if job["type"] == "cadnano":
+        cadnano_to_unf.convert_cadnano_to_unf([tuple(inp) for inp in job["inputs"]], tmpPath)
+    elif job["type"] == "pdb":
+        pdb_to_unf.convert_pdb_to_unf(job["input"], tmpPath)
+    elif job["type"] == "add_pdb":
+        unf_add_pdb.add_pdb_to_unf(job["input"], job["pdb"], job["name"],
+         unfutils.parse_int_vector(job.get("position", "0,0,0")), unfutils.parse_int_vector(job.get("orientation", "0,0,0")), tmpPath)
+    else:
+        raise ValueError("Unknown job type: " + str(job["type"]))
+
+    os.replace(tmpPath, outputPath)
+    return outputPath
+
+def load_cache(cachePath):
+    if os.path.isfile(cachePath):
+        with open(cachePath, "r") as file:
+            return json.load(file)
+    return {}
+
+def save_cache(cachePath, cache):
+    with open(cachePath, "w") as file:
+        json.dump(cache, file, indent = 2, sort_keys = True)
+
+# Jobs whose input is produced by a failed (or skipped) job are skipped and counted as failed.
+# Returns True if all jobs succeeded. Raises ValueError if the jobs depend on each other cyclically.
+def run_manifest(manifestPath, workers = None, force = False):
+    baseDir = os.path.dirname(os.path.abspath(manifestPath))
+    with open(manifestPath, "r") as file:
+        jobs = json.load(file)["jobs"]
+    stages = get_job_stages(jobs)
+
+    cachePath = os.path.join(baseDir, CACHE_FILE_NAME)
+    cache = load_cache(cachePath)
+    convertersHash = get_converters_hash()
+    convertedCount = 0
+    skippedCount = 0
+    failedCount = 0
+    failedOutputs = set()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers, initializer = os.chdir, initargs = (baseDir,)) as executor:
+        for stage in stages:
+            # The keys are computed when the stage starts as the inputs may be outputs of previous stages
+            futures = {}
+            for idx in stage:
+                job = jobs[idx]
+                failedInputs = [inputPath for inputPath in get_job_inputs(job) if os.path.normpath(inputPath) in failedOutputs]
+                if len(failedInputs) > 0:
+                    cache.pop(os.path.normpath(job["output"]), None)
+                    failedOutputs.add(os.path.normpath(job["output"]))
+                    print("Skipped:", job["output"], "(input", failedInputs[0], "was not converted)")
+                    failedCount += 1
+                    continue
+                jobKey = get_job_key(job, baseDir, convertersHash)
+                outputExists = os.path.isfile(os.path.join(baseDir, job["output"]))
+                if not force and outputExists and cache.get(os.path.normpath(job["output"])) == jobKey:
+                    print("Up to date:", job["output"])
+                    skippedCount += 1
+                    continue
+                futures[executor.submit(run_job, job)] = (job, jobKey)
+
+            for future in concurrent.futures.as_completed(futures):
+                job, jobKey = futures[future]
+                try:
+                    future.result()
+                    cache[os.path.normpath(job["output"])] = jobKey
+                    print("Converted:", job["output"])
+                    convertedCount += 1
+                except Exception as e:
+                    cache.pop(os.path.normpath(job["output"]), None)
+                    failedOutputs.add(os.path.normpath(job["output"]))
+                    print("Error! Conversion of", job["output"], "failed:", repr(e))
+                    failedCount += 1
+
+            save_cache(cachePath, cache)
+
+    print("Finished:", convertedCount, "converted,", skippedCount, "up to date,", failedCount, "failed.")
+    return failedCount == 0
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] == "-h":
+        print("usage: unf_batch_convert.py <manifest_path> [options]")
+        print("Options:")
+        print("--jobs=<n> = number of worker processes [default number of CPUs]")
+        print("--force = converts all the jobs even if their inputs did not change")
+        sys.exit(1)
+
+    workers = unfutils.get_cli_option(sys.argv, "jobs", None)
+    try:
+        succeeded = run_manifest(sys.argv[1], int(workers) if workers != None else None, unfutils.has_cli_flag(sys.argv, "force"))
+    except ValueError as e:
+        print("Error!", e)
+        sys.exit(1)
+    if not succeeded:
+        sys.exit(1)
+
+if __name__ == '__main__':
+  main()
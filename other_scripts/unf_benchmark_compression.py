@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# Code is using Python 3
+
+# Measures the compression ratio and the read/write throughput of UNF files compressed
+# by the supported compression formats (see unfutils.COMPRESSION_FORMATS).
+# Write throughput covers compressing the whole file, read throughput decompressing the whole file,
+# and the core time loading only the JSON core (load_unf_core). Throughputs are given
+# in MB of the uncompressed file per second.
+
+import sys
+import os
+import glob
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "converters"))
+
+import modules.unf_utils as unfutils
+import modules.unf_reader as unfreader
+
+EXAMPLE_FILES_PATTERN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example-files", "*", "unf", "*.unf")
+DEFAULT_REPEAT = 3
+
+def write_file(unfPath, outputPath, compression):
+    with open(unfPath, "rb") as infile:
+        if compression == None:
+            with open(outputPath, "wb") as outfile:
+                shutil.copyfileobj(infile, outfile, unfutils.READ_CHUNK_SIZE)
+        else:
+            unfutils.compress_stream(infile, outputPath, compression)
+
+def read_file(path):
+    with unfutils.open_binary_input(path) as infile:
+        while infile.read(unfutils.READ_CHUNK_SIZE):
+            pass
+
+def benchmark_file(unfPath, outputDir, repeat):
+    size = os.path.getsize(unfPath)
+    results = []
+    for compression in [None] + list(unfutils.COMPRESSION_FORMATS):
+        outputPath = unfutils.get_compressed_file_name(os.path.join(outputDir, os.path.basename(unfPath)), compression)
+        writeTime = unfutils.measure(lambda: write_file(unfPath, outputPath, compression), repeat)[0]
+        readTime = unfutils.measure(lambda: read_file(outputPath), repeat)[0]
+        coreTime = unfutils.measure(lambda: unfreader.load_unf_core(outputPath), repeat)[0]
+        results.append((compression if compression != None else "none", os.path.getsize(outputPath) / size,
+            size / writeTime / 1e6, size / readTime / 1e6, coreTime))
+        os.remove(outputPath)
+    return (size, results)
+
+def print_results(unfPath, size, results):
+    print(os.path.basename(unfPath), "(" + str(size), "B)")
+    print("  {:<6} {:>8} {:>12} {:>12} {:>10}".format("format", "ratio", "write [MB/s]", "read [MB/s]", "core [s]"))
+    for name, ratio, writeSpeed, readSpeed, coreTime in results:
+        print("  {:<6} {:>7.1%} {:>12.1f} {:>12.1f} {:>10.4f}".format(name, ratio, writeSpeed, readSpeed, coreTime))
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "-h":
+        print("usage: unf_benchmark_compression.py [<unf_path> ...] [options]")
+        print("<unf_path> = uncompressed UNF file [default UNF files of the examples]")
+        print("Options:")
+        print("--repeat=<n> = number of repetitions of each measurement (the best time is reported) [default " + str(DEFAULT_REPEAT) + "]")
+        sys.exit(1)
+
+    unfPaths = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if len(unfPaths) == 0:
+        unfPaths = sorted(glob.glob(EXAMPLE_FILES_PATTERN))
+    repeat = int(unfutils.get_cli_option(sys.argv, "repeat", DEFAULT_REPEAT))
+
+    with tempfile.TemporaryDirectory() as outputDir:
+        for unfPath in unfPaths:
+            print_results(unfPath, *benchmark_file(unfPath, outputDir, repeat))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# Code is using Python 3
+
+# Measures the size of the UNF files created by pdb_to_unf and the time of their serialization and parsing
+# with the available JSON backends and coordinate precisions. The previous output format
+# (standard library json.dumps with the default separators and full precision) serves as a baseline.
+
+import sys
+import os
+import io
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "converters"))
+
+import modules.unf_utils as unfutils
+import pdb_to_unf
+
+DEFAULT_PRECISION = 3
+DEFAULT_REPEAT = 3
+
+def write_document(processedData, precision):
+    pdbFile, aaChains, naStrands, ligands = processedData
+    stats = unfutils.ConversionStats("benchmark", unfutils.VERBOSITY_QUIET)
+    output = io.StringIO()
+    pdb_to_unf.convert_data_to_unf_file(pdbFile, aaChains, naStrands, ligands, unfutils.IdGenerator(), stats, output, precision)
+    return output.getvalue()
+
+def benchmark_pdb(pdbPath, precision, repeat):
+    stats = unfutils.ConversionStats("benchmark", unfutils.VERBOSITY_QUIET)
+    processedData = pdb_to_unf.process_pdb(pdbPath, unfutils.IdGenerator(), stats)
+    results = []
+
+    # Baseline: the whole document serialized by the standard library with the default separators
+    def write_baseline():
+        pdbFile, aaChains, naStrands, ligands = processedData
+        unfFileData = pdb_to_unf.create_unf_file_data(pdbFile, aaChains, naStrands, ligands, unfutils.IdGenerator(), stats)
+        unfFileData["idCounter"] = 0
+        return json.dumps(unfutils.materialize_document(unfFileData))
+    writeTime, text = unfutils.measure(write_baseline, repeat)
+    parseTime = unfutils.measure(lambda: json.loads(text), repeat)[0]
+    results.append(("json (previous format)", writeTime, parseTime, len(text.encode("utf-8"))))
+
+    originalBackend = unfutils.get_json_backend()
+    for backend in unfutils.JSON_BACKENDS:
+        unfutils.set_json_backend(backend)
+        for variantPrecision in [None, precision]:
+            writeTime, text = unfutils.measure(lambda: write_document(processedData, variantPrecision), repeat)
+            parseTime = unfutils.measure(lambda: unfutils.json_loads(text), repeat)[0]
+            name = backend + ", compact" + (", " + str(variantPrecision) + " decimals" if variantPrecision != None else "")
+            results.append((name, writeTime, parseTime, len(text.encode("utf-8"))))
+    unfutils.set_json_backend(originalBackend)
+    return results
+
+def print_results(pdbPath, results):
+    baseWriteTime, baseParseTime, baseSize = results[0][1:]
+    print(pdbPath)
+    print("  {:<32} {:>10} {:>10} {:>12} {:>8} {:>8} {:>8}".format("variant", "write [s]", "parse [s]", "size [B]", "write", "parse", "size"))
+    for name, writeTime, parseTime, size in results:
+        print("  {:<32} {:>10.4f} {:>10.4f} {:>12} {:>7.0%} {:>7.0%} {:>7.0%}".format(name, writeTime, parseTime, size,
+            writeTime / baseWriteTime, parseTime / baseParseTime, size / baseSize))
+
+def main():
+    pdbPaths = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if len(pdbPaths) < 1 or sys.argv[1] == "-h":
+        print("usage: unf_benchmark_serialization.py <pdb_path> [<pdb_path> ...] [options]")
+        print("Options:")
+        print("--precision=<n> = number of decimals of the rounded coordinates [default " + str(DEFAULT_PRECISION) + "]")
+        print("--repeat=<n> = number of repetitions of each measurement (the best time is reported) [default " + str(DEFAULT_REPEAT) + "]")
+        print("Write, parse and size columns are relative to the previous format.")
+        sys.exit(1)
+
+    precision = int(unfutils.get_cli_option(sys.argv, "precision", DEFAULT_PRECISION))
+    repeat = int(unfutils.get_cli_option(sys.argv, "repeat", DEFAULT_REPEAT))
+    for pdbPath in pdbPaths:
+        print_results(pdbPath, benchmark_pdb(pdbPath, precision, repeat))
+
+if __name__ == '__main__':
+  main()
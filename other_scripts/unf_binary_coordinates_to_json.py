@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# Code is using Python 3
+
+# Converts a UNF file with binary coordinates (e.g., pdb_to_unf.py --binary-coordinates)
+# to the plain JSON layout. The binary included files are removed, other included files are kept.
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "converters"))
+
+import modules.unf_utils as unfutils
+import modules.unf_reader as unfreader
+
+OUTPUT_FILE_NAME = "output.unf"
+
+# Converts the UNF file given as a path. The output is a path or a text stream with a binary buffer.
+def convert_binary_coordinates_to_json(unfPath, output = OUTPUT_FILE_NAME):
+    with unfreader.UnfReader(unfPath) as reader:
+        document = reader.get_core()
+        includedFiles = reader.get_included_files()
+        binaryFileIds = unfreader.expand_binary_coordinates(document, reader.get_binary_coordinates)
+
+        binaryPaths = [extFile["path"] for extFile in document["externalFiles"] if extFile["id"] in binaryFileIds]
+        document["externalFiles"] = [extFile for extFile in document["externalFiles"] if extFile["id"] not in binaryFileIds]
+        keptFiles = [includedFile for includedFile in includedFiles if includedFile.name not in binaryPaths]
+        if len(keptFiles) > 0:
+            document.setdefault("misc", {})[unfreader.INCLUDED_FILES_INDEX_KEY] = unfreader.create_included_files_index(
+                [(includedFile.name, includedFile.length, includedFile.hash) for includedFile in keptFiles])
+        else:
+            document.get("misc", {}).pop(unfreader.INCLUDED_FILES_INDEX_KEY, None)
+
+        with unfutils.open_text_output(output) as outfile:
+            unfutils.JsonStreamWriter(outfile).write_document(unfreader.stream_object_arrays(document))
+            # The kept included files are copied from the mapped file as they are
+            for includedFile in keptFiles:
+                outfile.write("\n" + unfutils.INCLUDED_FILE_TAG + includedFile.name + "\n")
+                outfile.flush()
+                with includedFile.get_view() as view:
+                    outfile.buffer.write(view)
+            if len(keptFiles) > 0:
+                outfile.buffer.write(b"\n")
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] == "-h":
+        print("usage: unf_binary_coordinates_to_json.py <unf_path> [<output_path>]")
+        print("<output_path> = path of the converted UNF [default " + OUTPUT_FILE_NAME + "]")
+        sys.exit(1)
+
+    convert_binary_coordinates_to_json(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else OUTPUT_FILE_NAME)
+
+if __name__ == '__main__':
+  main()
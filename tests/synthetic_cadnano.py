@@ -0,0 +1,66 @@
+# Synthetic cadnano designs for tests.
+# The scaffold runs through all virtual helices in a snake-like way (even helices from base 0 upwards,
+# odd ones downwards) and the staples are split into pieces of the given length running in the opposite direction.
+
+import cadnano_to_unf
+import modules.unf_utils as unfutils
+
+NO_LINK = [-1, -1, -1, -1]
+
+def get_scaffold_path(vstrandsCount, length):
+    path = []
+    for vid in range(vstrandsCount):
+        bases = range(length) if vid % 2 == 0 else reversed(range(length))
+        path.extend((vid, bid) for bid in bases)
+    return path
+
+def get_staple_paths(vstrandsCount, length, stapleLength):
+    paths = []
+    for vid in range(vstrandsCount):
+        bases = list(reversed(range(length)) if vid % 2 == 0 else range(length))
+        for start in range(0, length, stapleLength):
+            paths.append([(vid, bid) for bid in bases[start:start + stapleLength]])
+    return paths
+
+# Writes the cadnano prev/next records of the path (consecutive cells are linked)
+def link_path(records, path, isCircular = False):
+    for i, (vid, bid) in enumerate(path):
+        prevVid, prevBid = path[i - 1] if i > 0 or isCircular else (-1, -1)
+        nextVid, nextBid = path[(i + 1) % len(path)] if i < len(path) - 1 or isCircular else (-1, -1)
+        records[vid][bid] = [prevVid, prevBid, nextVid, nextBid]
+
+# Returns the parsed cadnano design. If circularStaples is given, so many first staples are made circular.
+def make_design(vstrandsCount, length, stapleLength = 8, circularStaples = 0):
+    scaffold = [[list(NO_LINK) for bid in range(length)] for vid in range(vstrandsCount)]
+    staples = [[list(NO_LINK) for bid in range(length)] for vid in range(vstrandsCount)]
+
+    link_path(scaffold, get_scaffold_path(vstrandsCount, length))
+    for i, path in enumerate(get_staple_paths(vstrandsCount, length, stapleLength)):
+        link_path(staples, path, i < circularStaples)
+
+    columns = max(1, int(vstrandsCount ** 0.5))
+    vstrands = []
+    for vid in range(vstrandsCount):
+        vstrands.append({
+            "num": vid,
+            "row": vid // columns,
+            "col": vid % columns,
+            "scaf": scaffold[vid],
+            "stap": staples[vid],
+            "skip": [0] * length,
+            "loop": [0] * length,
+            "scafLoop": [],
+            "stapLoop": [],
+            "stap_colors": []
+        })
+    return {"name": "synthetic", "vstrands": vstrands}
+
+def get_part_positions(component):
+    return [(part.vhelixId, part.baseId) for part in component]
+
+# Loads the design (square lattice) and returns its scaffold and staple strand parts
+def load_parts(design):
+    stats = unfutils.ConversionStats("test", unfutils.VERBOSITY_QUIET)
+    vhelices, scaffoldParts, stapleParts = cadnano_to_unf.load_cadnano_vstrands(design, cadnano_to_unf.LATTICE_SQUARE,
+        unfutils.IdGenerator(), stats)
+    return (scaffoldParts, stapleParts)
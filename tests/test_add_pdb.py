@@ -0,0 +1,36 @@
+import io
+
+import unf_add_pdb
+import modules.unf_utils as unfutils
+import modules.unf_reader as unfreader
+
+PDB_TEXT = "HEADER    TEST\r\nATOM      1  CA  ALA A   1       1.000   2.000   3.000  1.00  0.00           C\r\nEND\r\n"
+
+def write_inputs(tmp_path):
+    unfPath = tmp_path / "input.unf"
+    unfPath.write_text(unfutils.json_dumps({"idCounter": 1, "externalFiles": [], "molecules": {"others": []}}))
+    pdbPath = tmp_path / "molecule.pdb"
+    pdbPath.write_bytes(PDB_TEXT.encode("utf-8"))
+    return (str(unfPath), str(pdbPath))
+
+def test_in_memory_and_streamed_outputs_match(tmp_path):
+    unfPath, pdbPath = write_inputs(tmp_path)
+    streamedPath = str(tmp_path / "streamed.unf")
+    unf_add_pdb.add_pdb_to_unf(unfPath, pdbPath, "m", [0, 0, 0], [0, 0, 0], streamedPath)
+    with open(unfPath, "r") as unfFile:
+        parsedData, includedFiles = unf_add_pdb.add_pdb_to_unf(unfFile, pdbPath, "m", [0, 0, 0], [0, 0, 0])
+
+    output = io.StringIO()
+    unf_add_pdb.write_unf(output, parsedData, includedFiles)
+    with open(streamedPath, "rb") as file:
+        assert file.read() == output.getvalue().encode("utf-8")
+
+def test_included_pdb_has_unix_line_endings(tmp_path):
+    unfPath, pdbPath = write_inputs(tmp_path)
+    outputPath = str(tmp_path / "output.unf")
+    unf_add_pdb.add_pdb_to_unf(unfPath, pdbPath, "m", [0, 0, 0], [0, 0, 0], outputPath)
+
+    with unfreader.UnfReader(outputPath) as reader:
+        includedFile = reader.get_included_file(pdbPath.replace("\\", "/"))
+        assert includedFile.length == len(PDB_TEXT.replace("\r\n", "\n").encode("utf-8"))
+        assert reader.get_core()["externalFiles"][0]["hash"] == unf_add_pdb.get_included_content_info(pdbPath)[0]
@@ -0,0 +1,36 @@
+import json
+import os
+
+import pytest
+
+import unf_batch_convert
+
+EXAMPLE_PDB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example-files", "cg_3ugm", "pdb", "3ugm.pdb")
+
+def write_manifest(directory, jobs):
+    manifestPath = os.path.join(directory, "manifest.json")
+    with open(manifestPath, "w") as file:
+        json.dump({"jobs": jobs}, file)
+    return manifestPath
+
+def test_jobs_depending_on_failed_job_are_skipped(tmp_path):
+    (tmp_path / "broken.pdb").write_text("not a structure\n")
+    # Output of an earlier run which must not be used
+    (tmp_path / "broken.unf").write_text("{}")
+    manifestPath = write_manifest(str(tmp_path), [
+        {"type": "pdb", "input": "broken.pdb", "output": "broken.unf"},
+        {"type": "add_pdb", "input": "broken.unf", "pdb": EXAMPLE_PDB, "name": "m", "output": "with_molecule.unf"},
+        {"type": "add_pdb", "input": "with_molecule.unf", "pdb": EXAMPLE_PDB, "name": "m", "output": "with_molecules.unf"}
+    ])
+
+    assert not unf_batch_convert.run_manifest(manifestPath, workers = 1)
+    assert not (tmp_path / "with_molecule.unf").exists()
+    assert not (tmp_path / "with_molecules.unf").exists()
+
+def test_cyclic_dependency_raises():
+    jobs = [
+        {"type": "add_pdb", "input": "b.unf", "pdb": EXAMPLE_PDB, "name": "m", "output": "a.unf"},
+        {"type": "add_pdb", "input": "a.unf", "pdb": EXAMPLE_PDB, "name": "m", "output": "b.unf"}
+    ]
+    with pytest.raises(ValueError, match = "Cyclic dependency"):
+        unf_batch_convert.get_job_stages(jobs)
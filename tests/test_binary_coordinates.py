@@ -0,0 +1,120 @@
+import io
+import os
+
+import pytest
+
+import pdb_to_unf
+import unf_add_pdb
+import modules.unf_utils as unfutils
+import modules.unf_reader as unfreader
+
+EXAMPLE_PDB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example-files", "cg_3ugm", "pdb", "3ugm.pdb")
+
+def convert_with_binary_coordinates(tmp_path):
+    unfPath = str(tmp_path / "binary.unf")
+    pdb_to_unf.convert_pdb_to_unf(EXAMPLE_PDB, unfPath, unfutils.ConversionStats("test", unfutils.VERBOSITY_QUIET), binaryCoordinates = True)
+    return unfPath
+
+def get_stored_index(unfPath):
+    with unfreader.UnfReader(unfPath) as reader:
+        entries = reader.get_core()["misc"][unfreader.INCLUDED_FILES_INDEX_KEY]
+        assert unfreader.is_included_files_index_valid(reader.data, reader.includedStart, entries)
+        return entries
+
+def get_first_coordinates(unfPath):
+    with unfreader.UnfReader(unfPath) as reader:
+        ref = next(unfreader.find_binary_coordinates_owners(reader.get_core()))[unfreader.BINARY_COORDINATES_KEY][0]
+        return reader.get_binary_coordinates(ref).copy()
+
+def test_file_ends_with_line_break_and_stored_index_is_valid(tmp_path):
+    unfPath = convert_with_binary_coordinates(tmp_path)
+    with open(unfPath, "rb") as file:
+        assert file.read().endswith(b"\n")
+    entries = get_stored_index(unfPath)
+    assert entries[0]["name"] == unfreader.BINARY_COORDINATES_FILE_NAME
+
+def test_text_loading_keeps_binary_data(tmp_path):
+    unfPath = convert_with_binary_coordinates(tmp_path)
+    with open(unfPath, "r") as file:
+        parsedData, includedFiles = unfutils.load_unf_input(file)
+    assert parsedData == unfreader.load_unf_core(unfPath)
+
+    outputPath = str(tmp_path / "copy.unf")
+    with open(outputPath, "w") as outfile:
+        unf_add_pdb.write_unf(outfile, parsedData, includedFiles)
+    includedBytes = includedFiles.encode("utf-8", unfutils.INCLUDED_FILES_ERRORS)
+    assert includedBytes.startswith(unfutils.INCLUDED_FILE_TAG_BYTES)
+    with open(unfPath, "rb") as original, open(outputPath, "rb") as copy:
+        assert original.read().endswith(includedBytes)
+        assert copy.read().endswith(includedBytes)
+
+def test_pdb_is_added_after_binary_coordinates(tmp_path):
+    unfPath = convert_with_binary_coordinates(tmp_path)
+    coordinates = get_first_coordinates(unfPath)
+
+    streamedPath = str(tmp_path / "streamed.unf")
+    unf_add_pdb.add_pdb_to_unf(unfPath, EXAMPLE_PDB, "m", [0, 0, 0], [0, 0, 0], streamedPath)
+    parsedData, includedFiles = unf_add_pdb.add_pdb_to_unf(unfPath, EXAMPLE_PDB, "m", [0, 0, 0], [0, 0, 0])
+    inMemoryPath = str(tmp_path / "in_memory.unf")
+    with open(inMemoryPath, "w") as outfile:
+        unf_add_pdb.write_unf(outfile, parsedData, includedFiles)
+
+    with open(streamedPath, "rb") as streamed, open(inMemoryPath, "rb") as inMemory:
+        assert streamed.read() == inMemory.read()
+    entries = get_stored_index(streamedPath)
+    assert [entry["name"] for entry in entries] == [unfreader.BINARY_COORDINATES_FILE_NAME, EXAMPLE_PDB.replace("\\", "/")]
+    assert (get_first_coordinates(streamedPath) == coordinates).all()
+
+def test_index_placeholder_fits_any_length():
+    writer = unfreader.BinaryCoordinatesWriter(1)
+    writer.length = 2 ** 40
+    output = io.StringIO()
+    document = {"misc": {unfreader.INCLUDED_FILES_INDEX_KEY: unfutils.DeferredValue(writer.get_included_files_index,
+        writer.get_included_files_index_width())}}
+    unfutils.JsonStreamWriter(output).write_document(document)
+    writer.close()
+    assert unfutils.json_loads(output.getvalue())["misc"][unfreader.INCLUDED_FILES_INDEX_KEY][0]["length"] == 2 ** 40
+
+def remove_stored_index(unfPath, outputPath):
+    with unfreader.UnfReader(unfPath) as reader:
+        core = reader.get_core()
+        del core["misc"][unfreader.INCLUDED_FILES_INDEX_KEY]
+        with open(outputPath, "wb") as outfile:
+            outfile.write(unfutils.json_dumps(core).encode("utf-8") + b"\n")
+            outfile.write(reader.data[reader.includedStart:])
+
+@pytest.mark.parametrize("withPdb", [False, True])
+def test_rebuilt_index_matches_stored_index(tmp_path, withPdb):
+    unfPath = convert_with_binary_coordinates(tmp_path)
+    if withPdb:
+        unf_add_pdb.add_pdb_to_unf(unfPath, EXAMPLE_PDB, "m", [0, 0, 0], [0, 0, 0], unfPath)
+    storedEntries = get_stored_index(unfPath)
+
+    scannedPath = str(tmp_path / "scanned.unf")
+    remove_stored_index(unfPath, scannedPath)
+    with unfreader.UnfReader(scannedPath) as reader:
+        assert unfreader.INCLUDED_FILES_INDEX_KEY not in reader.get_core()["misc"]
+        assert reader.get_included_files_index() == storedEntries
+        for includedFile in reader.get_included_files():
+            assert includedFile.verify()
+
+def expand(reader, document):
+    unfreader.expand_binary_coordinates(document, reader.get_binary_coordinates)
+    return document
+
+def write_expanded(document):
+    output = io.StringIO()
+    unfutils.JsonStreamWriter(output).write_document(unfreader.stream_object_arrays(document))
+    return output.getvalue()
+
+def test_expanded_coordinates_outlive_the_reader(tmp_path):
+    unfPath = convert_with_binary_coordinates(tmp_path)
+    with unfreader.UnfReader(unfPath) as reader:
+        expected = write_expanded(expand(reader, reader.get_core()))
+    with unfreader.UnfReader(unfPath) as reader:
+        document = expand(reader, reader.get_core())
+
+    # Generators of the expanded items are consumed after the reader is closed
+    text = write_expanded(document)
+    assert text == expected
+    assert unfreader.BINARY_COORDINATES_KEY not in text
@@ -0,0 +1,115 @@
+import io
+
+import cadnano_to_unf
+from synthetic_cadnano import make_design, load_parts, get_scaffold_path, get_staple_paths, get_part_positions
+
+# Traversal used before the single-pass component detection (linking by a linear search included)
+def create_strand_components_reference(strandArray):
+    for i, strandPart in enumerate(strandArray):
+        prevIdx = next((j for j, x in enumerate(strandArray) if x.vhelixId == strandPart.prevVid and x.baseId == strandPart.prevBid), None)
+        nextIdx = next((j for j, x in enumerate(strandArray) if x.vhelixId == strandPart.nextVid and x.baseId == strandPart.nextBid), None)
+        strandPart.set_prev_next(strandArray[prevIdx] if prevIdx != None else None, strandArray[nextIdx] if nextIdx != None else None)
+        strandPart.set_arr_pos(i)
+
+    def generate_component(startPart):
+        partsProcessed[startPart.arrPos] = True
+        newComponent = [startPart]
+        currPart = startPart
+        while currPart.nextPart != None:
+            currPart = currPart.nextPart
+            partsProcessed[currPart.arrPos] = True
+            newComponent.append(currPart)
+        components.append(newComponent)
+
+    circCount = 0
+    components = []
+    partsProcessed = [False] * len(strandArray)
+    for strandPart in strandArray:
+        if partsProcessed[strandPart.arrPos]:
+            continue
+        if strandPart.prevPart == None:
+            generate_component(strandPart)
+            continue
+        start = strandPart
+        currPart = start
+        isCirc = False
+        while currPart.prevPart != None:
+            currPart = currPart.prevPart
+            if currPart == start:
+                isCirc = True
+                break
+            elif currPart.prevPart == None:
+                generate_component(currPart)
+        if isCirc:
+            newComponent = [start]
+            partsProcessed[start.arrPos] = True
+            currPart = start
+            while currPart.nextPart != start:
+                currPart = currPart.nextPart
+                partsProcessed[currPart.arrPos] = True
+                newComponent.append(currPart)
+            components.append(newComponent)
+            circCount += 1
+    return (components, circCount)
+
+def test_long_scaffold_is_one_component():
+    # 1000 helices of 300 bases, i.e., a 300k bases long scaffold
+    vstrandsCount = 1000
+    length = 300
+    scaffoldParts, stapleParts = load_parts(make_design(vstrandsCount, length, 50))
+
+    scaffolds, circCount = cadnano_to_unf.create_strand_components(scaffoldParts)
+    assert circCount == 0
+    assert len(scaffolds) == 1
+    assert len(scaffolds[0]) == vstrandsCount * length
+    assert scaffolds[0][0].prevPart == None
+    assert scaffolds[0][-1].nextPart == None
+    assert get_part_positions(scaffolds[0]) == get_scaffold_path(vstrandsCount, length)
+
+def test_long_scaffold_is_converted_in_worker_processes():
+    # Strand components are pickled when sent from the worker processes
+    output = io.StringIO()
+    cadnano_to_unf.convert_cadnano_to_unf([(make_design(1000, 300, 50), cadnano_to_unf.LATTICE_SQUARE)], output, jobs = 2)
+    assert len(output.getvalue()) > 0
+
+def test_circular_staple_is_one_component():
+    design = make_design(4, 16, 8, circularStaples = 1)
+    circularPath = get_staple_paths(4, 16, 8)[0]
+    scaffoldParts, stapleParts = load_parts(design)
+
+    staples, circCount = cadnano_to_unf.create_strand_components(stapleParts)
+    assert circCount == 1
+    circularStaples = [staple for staple in staples if staple[-1].nextPart is staple[0]]
+    assert len(circularStaples) == 1
+    staple = circularStaples[0]
+    assert sorted(get_part_positions(staple)) == sorted(circularPath)
+    # The component follows the strand direction
+    for part, nextPart in zip(staple, staple[1:] + staple[:1]):
+        assert part.nextPart is nextPart
+        assert nextPart.prevPart is part
+
+def test_circular_staple_in_unf_closes_the_loop():
+    unf = cadnano_to_unf.convert_cadnano_to_unf([(make_design(4, 16, 8, circularStaples = 1), cadnano_to_unf.LATTICE_SQUARE)])
+    staples = [strand for strand in unf["structures"][0]["naStrands"] if not strand["isScaffold"]]
+    circularStaples = [strand for strand in staples if strand["nucleotides"][0]["prev"] != -1]
+    assert len(staples) == 8
+    assert len(circularStaples) == 1
+
+    nucleotides = circularStaples[0]["nucleotides"]
+    assert circularStaples[0]["fivePrimeId"] == nucleotides[0]["id"]
+    assert circularStaples[0]["threePrimeId"] == nucleotides[-1]["id"]
+    assert nucleotides[0]["prev"] == nucleotides[-1]["id"]
+    assert nucleotides[-1]["next"] == nucleotides[0]["id"]
+    for strand in staples:
+        if strand is not circularStaples[0]:
+            assert strand["nucleotides"][0]["prev"] == -1
+            assert strand["nucleotides"][-1]["next"] == -1
+
+def test_components_match_reference_traversal():
+    design = make_design(6, 24, 6, circularStaples = 3)
+    for parts, referenceParts in zip(load_parts(design), load_parts(design)):
+        components, circCount = cadnano_to_unf.create_strand_components(parts)
+        referenceComponents, referenceCircCount = create_strand_components_reference(referenceParts)
+        assert circCount == referenceCircCount
+        assert [get_part_positions(component) for component in components] == \
+            [get_part_positions(component) for component in referenceComponents]
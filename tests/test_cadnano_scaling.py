@@ -0,0 +1,59 @@
+import cadnano_to_unf
+from synthetic_cadnano import make_design, load_parts, get_scaffold_path, get_staple_paths, get_part_positions
+
+LENGTH = 32
+STAPLE_LENGTH = 8
+
+def load_design_parts(vstrandsCount):
+    return load_parts(make_design(vstrandsCount, LENGTH, STAPLE_LENGTH))
+
+# Counts the reads of the given StrandPart slots (attributes) by replacing them with counting properties
+def count_attribute_reads(monkeypatch, names):
+    counter = {"reads": 0}
+    for name in names:
+        slot = getattr(cadnano_to_unf.StrandPart, name)
+        def get(part, slot = slot):
+            counter["reads"] += 1
+            return slot.__get__(part, cadnano_to_unf.StrandPart)
+        monkeypatch.setattr(cadnano_to_unf.StrandPart, name, property(get, slot.__set__))
+    return counter
+
+# Number of reads of the linking-related attributes per strand part during the linking
+def get_linking_reads_per_part(monkeypatch, strandArray):
+    with monkeypatch.context() as patch:
+        counter = count_attribute_reads(patch, ["vhelixId", "baseId", "prevPart", "nextPart"])
+        cadnano_to_unf.create_strand_components(strandArray)
+    return counter["reads"] / len(strandArray)
+
+def test_strand_part_index_maps_every_cell():
+    scaffoldParts, stapleParts = load_design_parts(100)
+    posToIdx = cadnano_to_unf.create_strand_part_index(scaffoldParts)
+    assert len(posToIdx) == len(scaffoldParts)
+    for i, part in enumerate(scaffoldParts):
+        assert posToIdx[(part.vhelixId, part.baseId)] == i
+
+def test_large_design_is_linked_correctly():
+    vstrandsCount = 4000
+    scaffoldParts, stapleParts = load_design_parts(vstrandsCount)
+
+    scaffolds, scaffoldCircCount = cadnano_to_unf.create_strand_components(scaffoldParts)
+    assert scaffoldCircCount == 0
+    assert len(scaffolds) == 1
+    assert get_part_positions(scaffolds[0]) == get_scaffold_path(vstrandsCount, LENGTH)
+
+    staples, stapleCircCount = cadnano_to_unf.create_strand_components(stapleParts)
+    assert stapleCircCount == 0
+    assert sorted(get_part_positions(staple) for staple in staples) == sorted(get_staple_paths(vstrandsCount, LENGTH, STAPLE_LENGTH))
+
+    for part in scaffoldParts:
+        if part.nextPart != None:
+            assert part.nextPart.prevPart is part
+            assert (part.nextPart.vhelixId, part.nextPart.baseId) == (part.nextVid, part.nextBid)
+
+def test_linking_work_grows_linearly(monkeypatch):
+    # Linking by a linear search would read the attributes of all parts for each part,
+    # so the reads per part would grow with the design size
+    smallReads = get_linking_reads_per_part(monkeypatch, load_design_parts(500)[0])
+    largeReads = get_linking_reads_per_part(monkeypatch, load_design_parts(4000)[0])
+    assert largeReads <= 10
+    assert abs(largeReads - smallReads) < 0.01
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+import pdb_to_unf
+import unf_add_pdb
+import unf_binary_coordinates_to_json
+import modules.unf_utils as unfutils
+import modules.unf_reader as unfreader
+
+EXAMPLE_PDB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example-files", "cg_3ugm", "pdb", "3ugm.pdb")
+
+# UNF with binary coordinates followed by an included PDB file
+@pytest.fixture(scope = "module")
+def unfPath(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("compression") / "structure.unf")
+    pdb_to_unf.convert_pdb_to_unf(EXAMPLE_PDB, path, binaryCoordinates = True)
+    unf_add_pdb.add_pdb_to_unf(path, EXAMPLE_PDB, "m", [0, 0, 0], [0, 0, 0], path)
+    return path
+
+def convert_to_json(path, outputPath):
+    unf_binary_coordinates_to_json.convert_binary_coordinates_to_json(path, outputPath)
+    with open(outputPath, "rb") as file:
+        return file.read()
+
+def compress(unfPath, tmp_path, compression, withExtension):
+    compressedPath = unfutils.get_compressed_file_name(str(tmp_path / "structure.unf"), compression)
+    assert compressedPath.endswith(".unf" + unfutils.COMPRESSION_FORMATS[compression][1])
+    with open(unfPath, "rb") as infile:
+        unfutils.compress_stream(infile, compressedPath, compression)
+    if withExtension:
+        return compressedPath
+    # The compression is detected by the magic bytes only
+    renamedPath = str(tmp_path / "structure")
+    os.rename(compressedPath, renamedPath)
+    return renamedPath
+
+@pytest.mark.parametrize("compression", list(unfutils.COMPRESSION_FORMATS))
+@pytest.mark.parametrize("withExtension", [True, False], ids = ["extension", "no-extension"])
+def test_compressed_file_reads_as_uncompressed(unfPath, tmp_path, compression, withExtension):
+    compressedPath = compress(unfPath, tmp_path, compression, withExtension)
+    assert unfutils.get_file_compression(compressedPath) == compression
+    assert unfutils.get_file_compression(unfPath) == None
+
+    with open(unfPath, "rb") as file:
+        content = file.read()
+    with unfutils.open_binary_input(compressedPath) as infile:
+        assert infile.read() == content
+    with open(compressedPath, "rb") as file, unfutils.open_binary_input(file) as infile:
+        assert infile.read() == content
+
+    with unfreader.UnfReader(unfPath) as reader, unfreader.UnfReader(compressedPath) as compressedReader:
+        assert compressedReader.get_core() == reader.get_core()
+        assert compressedReader.get_included_files_index() == reader.get_included_files_index()
+        assert all(includedFile.verify() for includedFile in compressedReader.get_included_files())
+
+    expected = convert_to_json(unfPath, str(tmp_path / "expected.unf"))
+    assert convert_to_json(compressedPath, str(tmp_path / "converted.unf")) == expected
+
+def test_unknown_compression_is_rejected():
+    assert unfutils.get_compressed_file_name("output.unf", None) == "output.unf"
+    with pytest.raises(ValueError):
+        unfutils.get_compressed_file_name("output.unf", "zip")
@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import pytest
+
+import pdb_to_unf
+
+EXAMPLE_PDB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example-files", "cg_rna_2jyh", "pdb", "2jyh.pdb")
+MODELS_COUNT = 3
+RESIDUES_COUNT = 3
+
+# Returns the ATOM records of the first residues of chain A in each of the first models of the example file
+def read_example_models():
+    models = []
+    with open(EXAMPLE_PDB, "r") as file:
+        for line in file:
+            if line.startswith("MODEL"):
+                models.append([])
+            elif line.startswith("ATOM") and line[21] == "A" and int(line[22:26]) <= RESIDUES_COUNT:
+                models[-1].append(line.rstrip("\n"))
+    return models[:MODELS_COUNT]
+
+# Ligand with two atoms moving with the model
+def get_ligand_lines(modelIdx):
+    return ["HETATM 9001  C1  LIG A 101    %8.3f%8.3f%8.3f  1.00  0.00           C" % (modelIdx, 2.0 * modelIdx, 1.0),
+        "HETATM 9002  O1  LIG A 101    %8.3f%8.3f%8.3f  1.00  0.00           O" % (1.5, modelIdx, -modelIdx)]
+
+def get_model_lines(models, modelIdx):
+    return models[modelIdx] + ["TER"] + get_ligand_lines(modelIdx)
+
+def write_pdb(path, models, modelIndices):
+    lines = ["HEADER    TEST                                    01-JAN-00   1TST", "TITLE     FRAMES TEST"]
+    for number, modelIdx in enumerate(modelIndices):
+        lines += ["MODEL     %4d" % (number + 1)] + get_model_lines(models, modelIdx) + ["ENDMDL"]
+    with open(path, "w") as file:
+        file.write("\n".join(lines + ["END", ""]))
+    return path
+
+# Nucleotide positions are dictionaries of vectors
+def get_position_values(position):
+    return [position[key] for key in sorted(position)] if isinstance(position, dict) else position
+
+# Per-frame positions of all residues, nucleotides, ligands and ligand atoms in the order of the document
+def collect_positions(value, positions):
+    if isinstance(value, dict):
+        for key, member in value.items():
+            if key in ["altPositions", "positions"]:
+                positions.append([get_position_values(position) for position in member])
+            else:
+                collect_positions(member, positions)
+    elif isinstance(value, list):
+        for member in value:
+            collect_positions(member, positions)
+    return positions
+
+def convert(path, frameRange = None):
+    return collect_positions(pdb_to_unf.convert_pdb_to_unf(path, frameRange = frameRange), [])
+
+@pytest.mark.parametrize("rangeText, modelIndices", [("all", [0, 1, 2]), ("1:3", [1, 2]), ("1", [1]), (":2", [0, 1])])
+def test_frames_match_single_model_conversions(tmp_path, rangeText, modelIndices):
+    models = read_example_models()
+    assert len(models) == MODELS_COUNT
+    path = write_pdb(str(tmp_path / "frames.pdb"), models, range(MODELS_COUNT))
+    framesPositions = convert(path, pdb_to_unf.parse_frame_range(rangeText))
+
+    for frameIdx, modelIdx in enumerate(modelIndices):
+        modelPositions = convert(write_pdb(str(tmp_path / ("model" + str(modelIdx) + ".pdb")), models, [modelIdx]))
+        # Nucleotides, ligand and its atoms
+        assert len(modelPositions) == len(framesPositions) == RESIDUES_COUNT + 3
+        for positions, singlePositions in zip(framesPositions, modelPositions):
+            assert len(positions) == len(modelIndices)
+            assert np.allclose(positions[frameIdx], singlePositions[0])
+
+@pytest.mark.parametrize("rangeText", ["3:", "5:7"])
+def test_range_without_frames_fails(tmp_path, rangeText):
+    path = write_pdb(str(tmp_path / "frames.pdb"), read_example_models(), range(MODELS_COUNT))
+    with pytest.raises(ValueError, match = "No frames found"):
+        pdb_to_unf.convert_pdb_to_unf(path, frameRange = pdb_to_unf.parse_frame_range(rangeText))
+
+def test_models_with_different_atoms_fail(tmp_path):
+    models = read_example_models()
+    models[1] = models[1][:-1]
+    path = write_pdb(str(tmp_path / "frames.pdb"), models, range(MODELS_COUNT))
+    # The memory-mapped file is closed cleanly after the failure
+    with pytest.raises(ValueError, match = "Model 2 has different number of atoms"):
+        pdb_to_unf.convert_pdb_to_unf(path, frameRange = pdb_to_unf.parse_frame_range("all"))
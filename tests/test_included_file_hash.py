@@ -0,0 +1,41 @@
+import re
+import hashlib
+
+import pytest
+
+import modules.unf_utils as unfutils
+
+TEXT = "HEADER    TEST\r\nREMARK   1 ÅNGSTRÖM\rATOM      1  CA  ALA A   1\nEND\r\n"
+
+# Hash of the whole content as computed before the streaming hasher
+def get_whole_string_hash(text):
+    return hashlib.md5(re.sub("\r\n|\n|\r", "", text).encode("utf-8")).hexdigest()
+
+def hash_chunks(chunks):
+    hasher = unfutils.IncludedFileHasher()
+    for chunk in chunks:
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+@pytest.mark.parametrize("encode", [False, True], ids = ["text", "bytes"])
+def test_streaming_hash_matches_whole_string_hash(encode):
+    content = TEXT.encode("utf-8") if encode else TEXT
+    expected = get_whole_string_hash(TEXT)
+    crlfEnd = TEXT.index("\r\n") + 1
+    if encode:
+        crlfEnd = len(TEXT[:crlfEnd].encode("utf-8"))
+    assert content[crlfEnd - 1:crlfEnd + 1] in ["\r\n", b"\r\n"]
+
+    # Every split position, including the one between '\r' and '\n' of a line ending
+    for splitPos in range(len(content) + 1):
+        assert hash_chunks([content[:splitPos], content[splitPos:]]) == expected
+    assert hash_chunks([content[i:i + 1] for i in range(len(content))]) == expected
+
+def test_file_hash_is_read_in_chunks(tmp_path, monkeypatch):
+    path = tmp_path / "molecule.pdb"
+    path.write_bytes(TEXT.encode("utf-8"))
+    # Chunks end between '\r' and '\n' of the first line ending
+    monkeypatch.setattr(unfutils, "READ_CHUNK_SIZE", TEXT.index("\r\n") + 1)
+    assert unfutils.get_included_file_hash(str(path)) == get_whole_string_hash(TEXT)
+    with open(str(path), "rb") as file:
+        assert unfutils.get_included_file_hash(file) == get_whole_string_hash(TEXT)
@@ -0,0 +1,29 @@
+import math
+
+import numpy as np
+import pytest
+
+import modules.unf_utils as unfutils
+
+VALUES = [
+    {"a": math.nan},
+    {"positions": [[1.5, -math.inf, 0.0], [math.inf, 2.0, None]]},
+    {"id": 1, "name": "strand", "next": None, "values": [0.1, 1e-7, 123456789.125]},
+    {"array": np.array([[1.0, np.nan], [2.5, 3.0]]), "scalar": np.float64(0.5), "count": np.int64(3)},
+    [math.nan, {"nested": [math.nan]}]
+]
+
+@pytest.mark.skipif("orjson" not in unfutils.JSON_BACKENDS, reason = "orjson is not installed")
+@pytest.mark.parametrize("value", VALUES)
+def test_backends_write_the_same_values(value):
+    stdlibLoads, stdlibDumps = unfutils.JSON_BACKENDS["json"]
+    orjsonLoads, orjsonDumps = unfutils.JSON_BACKENDS["orjson"]
+    # Texts may differ in the number formatting (e.g., 1e-07 and 1e-7) but not in the values
+    # (repr is compared as NaN is not equal to itself)
+    expected = repr(stdlibLoads(stdlibDumps(value)))
+    assert repr(stdlibLoads(orjsonDumps(value))) == expected
+    assert repr(orjsonLoads(orjsonDumps(value))) == expected
+
+def test_non_finite_floats_are_written_as_by_stdlib():
+    assert unfutils.stdlib_json_dumps({"a": math.nan, "b": [math.inf]}) == '{"a":NaN,"b":[Infinity]}'
+    assert unfutils.json_dumps({"a": math.nan}) == '{"a":NaN}'
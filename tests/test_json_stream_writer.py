@@ -0,0 +1,35 @@
+import io
+import json
+
+import pytest
+
+import modules.unf_utils as unfutils
+
+# Text stream which cannot seek back, as pipes or sys.stdout
+class NonSeekableStream(io.StringIO):
+    def seekable(self):
+        return False
+
+    def seek(self, *args):
+        raise io.UnsupportedOperation("seek")
+
+    def tell(self):
+        raise io.UnsupportedOperation("tell")
+
+def test_deferred_values_are_patched():
+    counter = [0]
+    output = io.StringIO()
+    document = {"count": unfutils.DeferredValue(lambda: counter[0]), "items": (counter.__setitem__(0, i + 1) or i for i in range(5))}
+    unfutils.JsonStreamWriter(output).write_document(document)
+    assert json.loads(output.getvalue()) == {"count": 5, "items": [0, 1, 2, 3, 4]}
+
+def test_non_seekable_output_is_written_via_temporary_file():
+    output = NonSeekableStream()
+    document = {"count": unfutils.DeferredValue(lambda: 42), "items": iter([{"id": 1}, {"id": 2}])}
+    unfutils.JsonStreamWriter(output).write_document(document)
+    assert json.loads(output.getvalue()) == {"count": 42, "items": [{"id": 1}, {"id": 2}]}
+
+def test_deferred_value_exceeding_placeholder_raises():
+    document = {"value": unfutils.DeferredValue(lambda: "x" * 10, width = 5), "next": 1}
+    with pytest.raises(ValueError, match = "does not fit"):
+        unfutils.JsonStreamWriter(io.StringIO()).write_document(document)
@@ -0,0 +1,54 @@
+import itertools
+import os
+
+import numpy as np
+import pytest
+
+import pdb_to_unf
+import modules.unf_utils as unfutils
+import modules.pdb_reader as pdbreader
+
+atomium = pytest.importorskip("atomium")
+
+EXAMPLE_PDB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example-files", "cg_rna_2jyh", "pdb", "2jyh.pdb")
+RESIDUES_COUNT = 6
+
+# Per-residue computation used before the batched NumPy version
+def get_hydr_face_dir_reference(residue, atNamesMap):
+    if "C" in residue.name or "T" in residue.name or "U" in residue.name:
+        pairs = [["N3", "C6"], ["C2", "N1"], ["C4", "C5"]]
+    else:
+        pairs = [["N1", "C4"], ["C2", "N3"], ["C6", "C5"]]
+    resVector = np.zeros(3)
+    for first, second in pairs:
+        resVector += np.asarray(atNamesMap[first].location) - np.asarray(atNamesMap[second].location)
+    return unfutils.normalize(resVector)
+
+def get_base_normal_reference(atNamesMap, nbCenter):
+    parallelTo = nbCenter - np.asarray(atNamesMap["O4'"].location)
+    res = np.zeros(3)
+    for p, q, r in itertools.permutations(unfutils.NUCLEOBASE_RING_COMMON_ATOMS, 3):
+        p, q, r = (np.asarray(atNamesMap[name].location) for name in (p, q, r))
+        normal = unfutils.normalize(np.cross(unfutils.normalize(p - q), unfutils.normalize(p - r)))
+        res += -normal if np.dot(normal, parallelTo) < 0.0 else normal
+    return unfutils.normalize(res)
+
+def get_nt_frame_reference(residue):
+    atNamesMap = {atom.name: atom for atom in residue.atoms()}
+    backbone = [np.asarray(atom.location) for atom in residue.atoms() if unfutils.is_drna_backbone(atom.name)]
+    nucleobase = [np.asarray(atom.location) for atom in residue.atoms() if not unfutils.is_drna_backbone(atom.name)]
+    nbCenter = np.mean(nucleobase, axis = 0)
+    return (nbCenter, np.mean(backbone, axis = 0), get_base_normal_reference(atNamesMap, nbCenter),
+        get_hydr_face_dir_reference(residue, atNamesMap))
+
+def test_batched_frames_match_per_residue_frames():
+    chains = sorted(atomium.open(EXAMPLE_PDB).model.chains(), key = lambda chain: chain.id)
+    residues = chains[0].residues()[:RESIDUES_COUNT]
+    # Both purines and pyrimidines are compared
+    assert len(residues) == RESIDUES_COUNT
+    assert len(set(pdb_to_unf.is_pyrimidine_res(residue.name) for residue in residues)) == 2
+
+    batched = pdb_to_unf.get_nt_frame(pdbreader.AtomTable.from_residues(residues))
+    for i, residue in enumerate(residues):
+        for batchedVectors, referenceVector in zip(batched, get_nt_frame_reference(residue)):
+            assert np.allclose(batchedVectors[i], referenceVector, atol = 1e-6)
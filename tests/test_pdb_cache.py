@@ -0,0 +1,57 @@
+import os
+import shutil
+
+import modules.pdb_cache as pdbcache
+
+EXAMPLE_PDB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example-files", "cg_3ugm", "pdb", "3ugm.pdb")
+
+def test_bare_id_defaults_to_cif():
+    assert pdbcache.parse_pdb_id("1abc") == ("1ABC", "cif")
+    assert pdbcache.parse_pdb_id("1abc.pdb") == ("1ABC", "pdb")
+    assert not pdbcache.is_cacheable_id("1abc.mmtf")
+    assert not pdbcache.is_cacheable_id("https://files.rcsb.org/download/1abc.pdb")
+
+def test_directories_are_created_on_first_store(tmp_path):
+    mirrorDir = tmp_path / "mirror"
+    mirrorDir.mkdir()
+    shutil.copy(EXAMPLE_PDB, str(mirrorDir / "3UGM.pdb"))
+    cacheDir = tmp_path / "cache"
+
+    cache = pdbcache.PdbCache(str(cacheDir), mirrorUrl = str(mirrorDir))
+    assert not cacheDir.exists()
+    assert cache.lookup("3UGM", "pdb") == None
+
+    path = cache.get_path("3ugm.pdb")
+    assert cacheDir.exists()
+    assert cache.lookup("3UGM", "pdb") == path
+
+def test_failed_download_does_not_stop_others(tmp_path):
+    mirrorDir = tmp_path / "mirror"
+    mirrorDir.mkdir()
+    shutil.copy(EXAMPLE_PDB, str(mirrorDir / "3UGM.pdb"))
+
+    cache = pdbcache.PdbCache(str(tmp_path / "cache"), mirrorUrl = str(mirrorDir))
+    paths, errors = cache.get_paths(["9zzz.pdb", "3ugm.pdb"], jobs = 2)
+    assert paths[0] == None
+    assert os.path.isfile(paths[1])
+    assert [pdbId for pdbId, error in errors] == ["9zzz.pdb"]
+
+def test_lookup_checks_size_without_hashing(tmp_path, monkeypatch):
+    mirrorDir = tmp_path / "mirror"
+    mirrorDir.mkdir()
+    shutil.copy(EXAMPLE_PDB, str(mirrorDir / "3UGM.pdb"))
+    cache = pdbcache.PdbCache(str(tmp_path / "cache"), mirrorUrl = str(mirrorDir))
+    path = cache.get_path("3ugm.pdb")
+
+    def fail_hashing(*args):
+        raise AssertionError("Cached file is hashed on lookup")
+    with monkeypatch.context() as patch:
+        patch.setattr(pdbcache.hashlib, "sha256", fail_hashing)
+        assert cache.get_path("3ugm.pdb") == path
+
+    # Truncated files are downloaded again
+    with open(path, "r+b") as file:
+        file.truncate(100)
+    assert cache.lookup("3UGM", "pdb") == None
+    assert cache.get_path("3ugm.pdb") == path
+    assert os.path.getsize(path) == os.path.getsize(EXAMPLE_PDB)
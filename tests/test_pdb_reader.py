@@ -0,0 +1,155 @@
+import os
+
+import numpy as np
+import pytest
+
+import modules.pdb_reader as pdbreader
+
+EXAMPLE_PDB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example-files", "cg_3ugm", "pdb", "3ugm.pdb")
+
+# Chain B precedes chain A, the second atom of chain A has no element and its third atom
+# has blank element columns, CB of ALA has two alternate locations with partial occupancy
+# and the ligand has atoms with and without alternate location
+PDB_TEXT = """\
+HEADER    TEST                                    01-JAN-00   1TST
+ATOM      1  N   ALA B   1      11.000  12.000  13.000  1.00  0.00           N
+ATOM      2  CA  ALA B   1      12.000  12.500  13.500  1.00  0.00           C
+ATOM      3  CB AALA B   1      13.000  13.000  14.000  0.60  0.00           C
+ATOM      4  CB BALA B   1      13.500  13.500  14.500  0.40  0.00           C
+ATOM      5  N   GLY B   2      14.000  12.000  13.000  1.00  0.00           N
+ATOM      6  CA  GLY B   2      15.000  12.000  13.000  1.00  0.00           C
+ATOM      7  N   GLY A   1       1.000   2.000   3.000  1.00  0.00           N
+ATOM      8  CA  GLY A   1       2.000   2.000   3.000  1.00  0.00
+ATOM      9  C   GLY A   1       3.000   2.500   3.000  1.00  0.00             
+TER      10      GLY A   1
+HETATM   11 ZN    ZN A 101      -1.000  -2.000  -3.000  1.00  0.00          ZN
+HETATM   12  O   HOH A 201       5.000   5.000   5.000  1.00  0.00           O
+HETATM   13  C1  LIG B 301       7.000   8.000   9.000  0.50  0.00           C
+HETATM   14  C1 BLIG B 301       7.500   8.500   9.500  0.50  0.00           C
+END
+"""
+
+# The same structure in mmCIF with unknown and inapplicable element symbols,
+# a quoted value, comments and a multi-line text field
+CIF_TEXT = """\
+data_1TST
+#
+_entry.id 1TST
+_struct.title
+;Test structure with
+a multi-line title
+;
+loop_
+_entity.id
+_entity.type
+1 polymer
+2 non-polymer
+3 water
+#
+loop_
+_struct_asym.id
+_struct_asym.entity_id
+C 1
+D 1
+E 2
+F 3
+G 2
+#
+loop_
+_atom_site.group_PDB
+_atom_site.id
+_atom_site.type_symbol
+_atom_site.label_atom_id
+_atom_site.label_alt_id
+_atom_site.label_comp_id
+_atom_site.label_asym_id
+_atom_site.label_seq_id
+_atom_site.pdbx_PDB_ins_code
+_atom_site.Cartn_x
+_atom_site.Cartn_y
+_atom_site.Cartn_z
+_atom_site.occupancy
+_atom_site.auth_seq_id
+_atom_site.auth_comp_id
+_atom_site.auth_asym_id
+_atom_site.pdbx_PDB_model_num
+ATOM 1 N N . ALA C 1 ? 11.000 12.000 13.000 1.00 1 ALA B 1
+ATOM 2 C CA . ALA C 1 ? 12.000 12.500 13.500 1.00 1 ALA B 1
+ATOM 3 C CB A ALA C 1 ? 13.000 13.000 14.000 0.60 1 ALA B 1
+ATOM 4 C CB B ALA C 1 ? 13.500 13.500 14.500 0.40 1 ALA B 1
+ATOM 5 N N . GLY C 2 ? 14.000 12.000 13.000 1.00 2 GLY B 1
+ATOM 6 C CA . GLY C 2 ? 15.000 12.000 13.000 1.00 2 GLY B 1
+ATOM 7 N N . GLY D 1 ? 1.000 2.000 3.000 1.00 1 GLY A 1
+ATOM 8 ? CA . GLY D 1 ? 2.000 2.000 3.000 1.00 1 GLY A 1
+ATOM 9 . "C" . GLY D 1 ? 3.000 2.500 3.000 1.00 1 GLY A 1
+HETATM 11 ZN ZN . ZN E . ? -1.000 -2.000 -3.000 1.00 101 ZN A 1
+HETATM 12 O O . HOH F . ? 5.000 5.000 5.000 1.00 201 HOH A 1
+HETATM 13 C C1 A LIG G . ? 7.000 8.000 9.000 0.50 301 LIG B 1
+HETATM 14 C C1 B LIG G . ? 7.500 8.500 9.500 0.50 301 LIG B 1
+#
+"""
+
+def create_table(coords, elements, resIdx, resCount):
+    return pdbreader.AtomTable(np.array(coords, dtype = float), np.array(["X"] * len(elements), dtype = str),
+        np.array(elements, dtype = object), np.array(resIdx, dtype = int), ["UNK"] * resCount, list(range(resCount)))
+
+def test_centers_of_mass_are_mass_weighted():
+    table = create_table([[0, 0, 0], [3, 0, 0]], ["C", "H"], [0, 0], 1)
+    expected = 3 * 1.0079 / (12.0107 + 1.0079)
+    assert np.allclose(table.get_residue_centers_of_mass(), [[expected, 0, 0]])
+
+def test_residue_without_known_masses_gets_geometric_center():
+    table = create_table([[0, 0, 0], [2, 4, 0], [1, 1, 1], [3, 1, 1]], ["C", "C", "XX", "YY"], [0, 0, 1, 1], 2)
+    centers = table.get_residue_centers_of_mass()
+    assert np.all(np.isfinite(centers))
+    assert np.allclose(centers, [[1, 2, 0], [2, 1, 1]])
+
+# atomium returns chains, ligands and atoms of residues as sets,
+# so the atoms are compared per residue regardless of their order
+def get_residue_atoms(table):
+    return [sorted((name, str(element), tuple(np.round(coords, 3))) for name, element, coords, resIdx
+        in zip(table.names.tolist(), table.elements.tolist(), table.coords, table.resIdx) if resIdx == idx)
+        for idx in range(table.resCount)]
+
+def assert_tables_equal(table, expected):
+    assert len(table) == len(expected)
+    assert table.resNames == expected.resNames
+    assert table.resIds == expected.resIds
+    assert get_residue_atoms(table) == get_residue_atoms(expected)
+
+def assert_same_as_atomium(path):
+    pytest.importorskip("atomium")
+    structure = pdbreader.read_structure(path)
+    expected = pdbreader.load_with_atomium(path)
+    expectedChains = dict(expected.chains)
+    assert sorted(chainId for chainId, table in structure.chains) == sorted(expectedChains)
+    for chainId, table in structure.chains:
+        assert_tables_equal(table, expectedChains[chainId])
+    assert len(structure.ligands) == len(expected.ligands)
+    expectedLigands = sorted(expected.ligands, key = lambda table: table.resIds)
+    for table, expectedTable in zip(sorted(structure.ligands, key = lambda table: table.resIds), expectedLigands):
+        assert_tables_equal(table, expectedTable)
+    return structure
+
+def test_example_pdb_matches_atomium():
+    structure = assert_same_as_atomium(EXAMPLE_PDB)
+    assert [chainId for chainId, table in structure.chains] == ["A", "B", "C"]
+
+@pytest.mark.parametrize("fileName, text, missingElements", [("test.pdb", PDB_TEXT, [None, None]),
+    ("test.cif", CIF_TEXT, ["?", "."])], ids = ["pdb", "cif"])
+def test_structure_matches_atomium(tmp_path, fileName, text, missingElements):
+    path = str(tmp_path / fileName)
+    with open(path, "w") as file:
+        file.write(text)
+    structure = assert_same_as_atomium(path)
+
+    # Chains and atoms keep the order of the file
+    assert [(chainId, len(table), table.resCount) for chainId, table in structure.chains] == [("B", 5, 2), ("A", 3, 1)]
+    chainB = structure.chains[0][1]
+    assert chainB.names.tolist() == ["N", "CA", "CB", "N", "CA"]
+    assert structure.chains[1][1].elements.tolist() == ["N"] + missingElements
+    # Only the first alternate location of CB is kept
+    assert np.allclose(chainB.coords[chainB.names == "CB"], [[13, 13, 14]])
+    # Waters are omitted
+    assert [table.resNames for table in structure.ligands] == [["ZN"], ["LIG"]]
+    assert structure.recordsCount == 13
@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+import modules.unf_reader as unfreader
+
+EXAMPLE_FILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example-files")
+# Two structures without included files and one structure with an included PDB file
+EXAMPLE_UNFS = [
+    os.path.join(EXAMPLE_FILES_DIR, "hextube_cuboid", "unf", "hextube_cuboid.unf"),
+    os.path.join(EXAMPLE_FILES_DIR, "smiley_6ji1", "unf", "smiley_6ji1.unf")
+]
+
+@pytest.mark.parametrize("unfPath", EXAMPLE_UNFS)
+def test_iterators_yield_core_structures_and_strands(unfPath):
+    with unfreader.UnfReader(unfPath) as reader:
+        structures = reader.get_core()["structures"]
+        assert list(reader.iter_structures()) == structures
+        assert list(reader.iter_na_strands()) == [strand for structure in structures for strand in structure["naStrands"]]
+
+def test_included_files_are_found():
+    with unfreader.UnfReader(EXAMPLE_UNFS[0]) as reader:
+        assert reader.includedStart == None
+        assert reader.get_included_files() == []
+    with unfreader.UnfReader(EXAMPLE_UNFS[1]) as reader:
+        assert reader.includedStart != None
+        assert len(reader.get_included_files()) == 1